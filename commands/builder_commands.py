@@ -2,10 +2,17 @@
 This file will contain the set of commands reserved for use by builders/devs
 for the MUD.
 """
-from evennia import Command
 from evennia import CmdSet
-from evennia import default_cmds, utils
+from evennia import default_cmds
+from evennia import utils
 from evennia.utils.logger import log_file
+from commands.command import Command, MuxCommand
+from typeclasses.moving_spotlight import start_zone_weather
+from world.stats_index import STATS_INDEX
+from world.capabilities import is_combatant, is_npc
+from world.command_stats import COMMAND_STATS, format_summary
+from world.metrics import METRICS, format_snapshot, DEFAULT_SNAPSHOT_SECONDS, \
+                          METRICS_WATCH_INTERVAL, METRICS_WATCH_UPDATES
 import random
 
 class CmdHeal(Command):
@@ -94,7 +101,7 @@ class CmdSetBasePower(Command):
         if not npc:
             self.caller.msg("Please choose a valid NPC to set the base power for.")
         else:
-            if utils.inherits_from(npc, 'typeclasses.npcs.NPC'):
+            if is_npc(npc):
                 if ability_name == None:
                     # set all scores at once
                     npc.set_base_power(number)
@@ -131,7 +138,7 @@ class CmdReroll(Command):
             return
         else:
             target = self.caller.search(self.args)
-            if utils.inherits_from(target, 'typeclasses.npcs.NPC') or utils.inherits_from(target, 'typeclasses.characters.Character'):
+            if is_combatant(target):
                 target.reroll()
                 self.caller.msg(f"All ability scores and other attributes rerolled for {target.name}.")
             else:
@@ -168,6 +175,216 @@ class CmdShowColors(Command):
 
 
 
+class CmdSetZone(Command):
+    """
+    Moves the room you are standing in into a zone. Rooms in a zone share
+    weather, which is run for the whole zone by a single heartbeat script.
+    The zone's heartbeat is started if it isn't running yet.
+
+    Usage:
+        setzone <zone name>
+        setzone none
+    """
+    key = "setzone"
+    locks = "cmd: perm(Builders)"
+    help_category = "Building"
+
+    def func(self):
+        "Set the zone of the current room"
+        if not self.args:
+            self.caller.execute_cmd("help setzone")
+            return
+        room = self.caller.location
+        zone = self.args.strip()
+        if zone.lower() == 'none':
+            room.set_zone(None)
+            self.caller.msg(f"{room.name} is no longer part of a zone.")
+            return
+        room.set_zone(zone)
+        start_zone_weather(zone)
+        self.caller.msg(f"{room.name} is now part of the zone: {zone}.")
+
+
+class CmdLeaderboard(MuxCommand):
+    """
+    Shows server-wide rankings of character stats, served from the stats
+    index. Stats are named <handler>.<trait key>, e.g. talents.sneak, but
+    the bare trait key works too if it is unique.
+
+    The index holds every character loaded since the server started, and
+    results say so when that isn't everyone. /rebuild indexes every
+    character in the game, which loads all of them.
+
+    Usage:
+        leaderboard <stat> [= <number to show>]
+        leaderboard/pct <stat>
+        leaderboard/hist <stat>
+        leaderboard/stats
+        leaderboard/rebuild
+
+    Switches:
+        npcs - include NPCs in the results
+    """
+    key = "leaderboard"
+    aliases = ["lb"]
+    locks = "cmd: perm(Admin)"
+    help_category = "Admin"
+
+    def func(self):
+        "Show the leaderboard"
+        if 'rebuild' in self.switches:
+            STATS_INDEX.rebuild()
+            self.caller.msg(f"Stats index rebuilt with {len(STATS_INDEX)} characters.")
+            return
+        if 'stats' in self.switches:
+            self.caller.msg("Indexed stats: " + ", ".join(STATS_INDEX.stats()))
+            return
+        if not self.lhs:
+            self.caller.execute_cmd("help leaderboard")
+            return
+        stat = self.find_stat(self.lhs)
+        if stat is None:
+            self.caller.msg(f"No stat called {self.lhs}. Use leaderboard/stats to see them all.")
+            return
+        include_npcs = 'npcs' in self.switches
+        if 'pct' in self.switches:
+            percentiles = STATS_INDEX.percentile(stat, [10, 25, 50, 75, 90, 99], \
+                                                 include_npcs=include_npcs)
+            if percentiles is None:
+                self.caller.msg(f"Nobody has {stat} yet.")
+                return
+            self.caller.msg(f"|wPercentiles for {stat}|n: 10%: {percentiles[0]:.1f}  " \
+                            f"25%: {percentiles[1]:.1f}  50%: {percentiles[2]:.1f}  " \
+                            f"75%: {percentiles[3]:.1f}  90%: {percentiles[4]:.1f}  " \
+                            f"99%: {percentiles[5]:.1f}" + self.partial_note())
+        elif 'hist' in self.switches:
+            histogram = STATS_INDEX.histogram(stat, include_npcs=include_npcs)
+            if histogram is None:
+                self.caller.msg(f"Nobody has {stat} yet.")
+                return
+            counts, edges = histogram
+            lines = [f"|wHistogram for {stat}|n"]
+            for count, low, high in zip(counts, edges[:-1], edges[1:]):
+                lines.append(f"{low:8.1f} - {high:8.1f} | {'*' * min(count, 50)} {count}")
+            self.caller.msg("\n".join(lines) + self.partial_note())
+        else:
+            number = int(self.rhs) if self.rhs and self.rhs.isdigit() else 10
+            top = STATS_INDEX.top_k(stat, number, include_npcs=include_npcs)
+            if not top:
+                self.caller.msg(f"Nobody has {stat} yet.")
+                return
+            lines = [f"|wTop {len(top)} for {stat}|n"]
+            for rank, (name, dbref, value) in enumerate(top, 1):
+                lines.append(f"{rank:3}. {name} (#{dbref}) - {value:g}")
+            self.caller.msg("\n".join(lines) + self.partial_note())
+
+    def partial_note(self):
+        "Returns a note for results that don't cover every character"
+        indexed, total = STATS_INDEX.coverage()
+        if indexed >= total:
+            return ""
+        return f"\n|yPartial: {indexed} of {total} characters indexed. " \
+               "Use leaderboard/rebuild to index them all.|n"
+
+    def find_stat(self, name):
+        "Returns the full stat name for a stat or bare trait key"
+        stats = STATS_INDEX.stats()
+        if name in stats:
+            return name
+        matches = [stat for stat in stats if stat.split('.', 1)[1] == name]
+        return matches[0] if len(matches) == 1 else None
+
+
+class CmdCommandStats(MuxCommand):
+    """
+    Shows how long commands take to run, slowest first, along with the db
+    queries and messages they cause. See world/command_stats.py.
+
+    Usage:
+        cmdstats
+        cmdstats <number>
+        cmdstats/json
+        cmdstats/reset
+
+    With a number, only shows that many commands. /json writes every
+    command's stats to a json file, /reset forgets everything recorded.
+    """
+    key = "cmdstats"
+    locks = "cmd: perm(Admin)"
+    help_category = "Admin"
+
+    def func(self):
+        "Show the command stats"
+        if 'reset' in self.switches:
+            COMMAND_STATS.reset()
+            self.caller.msg("Command stats reset.")
+            return
+        if 'json' in self.switches:
+            path = COMMAND_STATS.dump()
+            if path:
+                self.caller.msg(f"Command stats written to {path}.")
+            else:
+                self.caller.msg("Could not write the command stats, see error.log.")
+            return
+        limit = None
+        if self.args:
+            if not self.args.strip().isdigit():
+                self.caller.msg("Usage: cmdstats [<number>]")
+                return
+            limit = int(self.args.strip())
+        summary = COMMAND_STATS.summary()
+        if not summary:
+            self.caller.msg("No commands have been timed yet.")
+            return
+        self.caller.msg(format_summary(summary, limit=limit))
+
+
+class CmdMetrics(MuxCommand):
+    """
+    Shows the game-wide metrics: how often combat rounds, action scripts, dice
+    rolls, combat messages and heartbeat ticks ran, and how much of the
+    server's time they took. See world/metrics.py.
+
+    Usage:
+        metrics
+        metrics <seconds>
+        metrics/watch
+        metrics/reset
+
+    Shows the last 10 seconds unless given a number of seconds. /watch sends
+    an update every 5 seconds for a minute. /reset forgets everything
+    recorded.
+    """
+    key = "metrics"
+    locks = "cmd: perm(Admin)"
+    help_category = "Admin"
+
+    def func(self):
+        "Show the metrics"
+        if 'reset' in self.switches:
+            METRICS.reset()
+            self.caller.msg("Metrics reset.")
+            return
+        seconds = DEFAULT_SNAPSHOT_SECONDS
+        if self.args:
+            if not self.args.strip().isdigit():
+                self.caller.msg("Usage: metrics [<seconds>]")
+                return
+            seconds = int(self.args.strip())
+        if 'watch' in self.switches:
+            seconds = METRICS_WATCH_INTERVAL
+            self.caller.msg(f"Sending metrics every {METRICS_WATCH_INTERVAL} seconds.")
+            utils.delay(METRICS_WATCH_INTERVAL, self.send_update, seconds, METRICS_WATCH_UPDATES)
+            return
+        self.caller.msg(format_snapshot(METRICS.snapshot(seconds)))
+
+    def send_update(self, seconds, updates_left):
+        "Sends one update of the live view and schedules the next one."
+        self.caller.msg(format_snapshot(METRICS.snapshot(seconds)))
+        if updates_left > 1:
+            utils.delay(METRICS_WATCH_INTERVAL, self.send_update, seconds, updates_left - 1)
+
+
 class BuilderCmdSet(CmdSet):
     """
     Adds the set of commands a player or NPC object that are related to combat,
@@ -182,3 +399,7 @@ class BuilderCmdSet(CmdSet):
         self.add(CmdSetBasePower())
         self.add(CmdReroll())
         self.add(CmdShowColors())
+        self.add(CmdSetZone())
+        self.add(CmdLeaderboard())
+        self.add(CmdCommandStats())
+        self.add(CmdMetrics())
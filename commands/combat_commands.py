@@ -3,15 +3,15 @@ This file will contain the commands used by players and NPC to initiate and/or
 take actions during combat.
 """
 # imports
-from evennia import Command
+from commands.command import Command
 from evennia import CmdSet
 from evennia import default_cmds
-from evennia import create_script
-from evennia import utils
 import random
 from evennia import search_object
 from evennia.utils.logger import log_file
 from evennia import gametime
+from typeclasses.combat_scheduler import get_combat_scheduler
+from world.capabilities import is_combatant
 
 class CmdAttack(Command):
     """
@@ -44,7 +44,7 @@ class CmdAttack(Command):
         if not target:
             return
         else:
-            self.caller.db.info['Target'] = target
+            self.caller.info['Target'] = target
         # set up combat
         if target.ndb.combat_handler:
             # target is already in combat - join it
@@ -55,33 +55,33 @@ class CmdAttack(Command):
             target.ndb.combat_handler.msg_all("%s joins combat!" % self.caller)
         else:
             # create a new combat handler
-            log_file("New combat. creating handler script", \
+            log_file("New combat. starting a fight on the combat scheduler", \
                      filename='combat_step.log')
             # set range per preferred attack
-            if self.caller.db.info['Default Attack'] in ['unarmed_strike', \
+            if self.caller.info['Default Attack'] in ['unarmed_strike', \
                               'melee_weapon_strike', 'bash', 'grapple',]:
-                self.caller.ndb.range = 'melee'
-            elif self.caller.db.info['Default Attack'] in ['ranged_weapon_strike', \
+                self.caller.combat_state.range = 'melee'
+            elif self.caller.info['Default Attack'] in ['ranged_weapon_strike', \
                               'mental_attack', 'taunt', 'defend']:
-                self.caller.ndb.range = 'ranged'
+                self.caller.combat_state.range = 'ranged'
             else:
-                self.caller.ndb.range = 'out_of_range'
+                self.caller.combat_state.range = 'out_of_range'
             # set target if not set
-            if self.caller.db.info['Target'] == None:
-                self.caller.db.info['Target'] = target
+            if self.caller.info['Target'] == None:
+                self.caller.info['Target'] = target
             # matching target range with caller since they weren't in combat
-            target.ndb.range = self.caller.ndb.range
+            target.combat_state.range = self.caller.combat_state.range
             # matching target's target to caller
-            target.db.info['Target'] = self.caller
-            # make combat handler
-            chandler = create_script("combat_handler.CombatHandler")
+            target.info['Target'] = self.caller
+            # start a new fight on the combat scheduler
+            chandler = get_combat_scheduler().start_fight(self.caller.location)
             chandler.add_character(self.caller)
             chandler.add_character(target)
             self.caller.msg("You attack %s! You are in combat." % target)
             target.msg("%s attacks you! You are in combat." % self.caller)
-            log_file(f"New handler script: {chandler.name}", \
+            log_file(f"New combat handler: {chandler.name}", \
                      filename='combat_step.log')
-            log_file(f"Script created. Chars add: {chandler.db.characters}.", \
+            log_file(f"Fight started. Chars add: {chandler.characters}.", \
                      filename='combat_step.log')
 
 COMBAT_ACTIONS = ('unarmed_strike', 'melee_weapon_strike', 'bash', 'grapple', \
@@ -103,7 +103,7 @@ class CmdDisengage(Command):
     def func(self):
         "Implements the command"
         caller = self.caller
-        # self.caller.db.info['In Combat'] = False
+        # self.caller.info['In Combat'] = False
         self.caller.msg("You try to disengage from combat.")
         log_file(f"Attempting to add disengage to {self.caller.ndb.combat_handler} for {self.caller}",
                  filename='combat_step.log')
@@ -199,8 +199,8 @@ class CmdTarget(Command):
             self.caller.msg('Please input a valid target')
         else:
             if self.caller.search(self.args):
-                self.caller.db.info['Target'] = self.caller.search(self.args)
-                self.caller.msg(f"Target set to: {self.caller.db.info['Target']}")
+                self.caller.info['Target'] = self.caller.search(self.args)
+                self.caller.msg(f"Target set to: {self.caller.info['Target']}")
             else:
                 self.caller.msg("That is not a valid target")
 
@@ -241,7 +241,7 @@ class CmdDefaultAttack(Command):
 
         if self.args:
             self.caller.msg(f"You set your default attack as:{self.args}")
-            self.caller.db.info['Default Attack'] = self.args.lstrip()
+            self.caller.info['Default Attack'] = self.args.lstrip()
         else:
             self.caller.msg('Please input a valid default attack. See help default')
             self.caller.msg(f'You tried default{self.args}')
@@ -279,9 +279,7 @@ class CmdConsider(Command):
                 self.caller.msg("Target not in room. Usage: consider <valid target>")
                 return
             # check to ensure target inherits from character class
-            if not utils.inherits_from(target, 'typeclasses.npcs.NPC') and \
-               not utils.inherits_from(target, 'typeclasses.characters.Character') and \
-               not utils.inherits_from(target, 'typeclasses.npcs.Humanoid_NPC'):
+            if not is_combatant(target):
                 self.caller.msg("You can only compare yourself to other character or NPCs.")
                 log_file(f"Consider command failed. {target.name} checked as non \
                          character/non-NPC. type: {type(target)}", \
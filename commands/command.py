@@ -6,13 +6,90 @@ Commands describe the input the account can do to the game.
 
 """
 
+from functools import wraps
 from evennia.commands.command import Command as BaseCommand
 from evennia import default_cmds
+from world import command_stats
 
 # from evennia import default_cmds
 
 
-class Command(BaseCommand):
+def _finish_on_error(method):
+    """
+    Wraps a command's parse or func so that a run that raises is still
+    recorded by CommandStatsMixin, since at_post_cmd is never called for it.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            self.finish_stats()
+            raise
+    return wrapper
+
+
+def _finish_on_abort(method):
+    """
+    Wraps a command's at_pre_cmd so that a run it aborts (or that raises in
+    it) is still recorded by CommandStatsMixin.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            abort = method(self, *args, **kwargs)
+        except Exception:
+            self.finish_stats()
+            raise
+        if abort:
+            self.finish_stats()
+        return abort
+    return wrapper
+
+
+class CommandStatsMixin(object):
+    """
+    Times every run of a command from at_pre_cmd to at_post_cmd and counts
+    the db queries and messages it caused, see world/command_stats.py. Use
+    the `cmdstats` command to see the results.
+
+    Runs aborted by at_pre_cmd are recorded when at_pre_cmd returns, and runs
+    that raise in at_pre_cmd, parse or func are recorded when the exception
+    is raised. Commands of their own get those methods wrapped for this when
+    the class is created.
+    """
+    stats_sample = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, wrapper in (('at_pre_cmd', _finish_on_abort), ('parse', _finish_on_error), \
+                              ('func', _finish_on_error)):
+            if name in cls.__dict__:
+                setattr(cls, name, wrapper(cls.__dict__[name]))
+
+    def at_pre_cmd(self):
+        """Starts timing the command."""
+        if command_stats.COMMAND_STATS_ENABLED:
+            self.stats_sample = command_stats.COMMAND_STATS.start(self.key)
+        abort = super().at_pre_cmd()
+        if abort:
+            self.finish_stats()
+        return abort
+
+    def at_post_cmd(self):
+        """Records the command's time, queries and messages."""
+        super().at_post_cmd()
+        self.finish_stats()
+
+    def finish_stats(self):
+        """Records the run being timed, if there is one."""
+        sample = self.stats_sample
+        if sample is not None:
+            self.stats_sample = None
+            command_stats.COMMAND_STATS.finish(sample)
+
+
+class Command(CommandStatsMixin, BaseCommand):
     """
     Inherit from this if you want to create your own command styles
     from scratch.  Note that Evennia's default commands inherits from
@@ -31,6 +108,9 @@ class Command(BaseCommand):
         - at_post_cmd(): Extra actions, often things done after
             every command, like prompts.
 
+    Every run is timed by CommandStatsMixin, so commands overriding
+    at_pre_cmd or at_post_cmd should call super() in them.
+
     """
 
     pass
@@ -189,7 +269,7 @@ class Command(BaseCommand):
 #             else:
 #                 self.character = None
 
-class MuxCommand(default_cmds.MuxCommand):
+class MuxCommand(CommandStatsMixin, default_cmds.MuxCommand):
     """
     This sets up the basis for Evennia's 'MUX-like' command style.
     The idea is that most other Mux-related commands should
@@ -281,21 +361,21 @@ class CmdPrompt(Command):
         hp = caller.traits.hp.percent_bar()
         sp = caller.traits.sp.percent_bar()
         cp = caller.traits.cp.percent_bar()
-        position = self.caller.db.info['Position']
+        position = self.caller.info['Position']
         prompt= "<%s> Health:%s Stamina:%s Conviction:%s" % (position,hp,sp,cp)
         if None in (hp, sp, cp):
                 # Attributes not defined
                 self.caller.msg("No attributes defined! Update character!")
                 return
-        if self.caller.db.info['In Combat'] == True:
-            if self.caller.db.info['Target'] != None:
+        if self.caller.info['In Combat'] == True:
+            if self.caller.info['Target'] != None:
                 # caller is in combat and targeting a foe, return status for target
-                tar_name = self.caller.db.info['Target'].name
-                tar_hp = self.caller.db.info['Target'].traits.hp.percent_bar()
-                tar_sp = self.caller.db.info['Target'].traits.sp.percent_bar()
-                tar_position = self.caller.db.info['Target'].db.info['Position']
-                if self.caller.ndb.range:
-                    range = self.caller.ndb.range
+                tar_name = self.caller.info['Target'].name
+                tar_hp = self.caller.info['Target'].traits.hp.percent_bar()
+                tar_sp = self.caller.info['Target'].traits.sp.percent_bar()
+                tar_position = self.caller.info['Target'].info['Position']
+                if self.caller.combat_state.range:
+                    range = self.caller.combat_state.range
                     prompt = "<%s> Health:%s Stamina:%s Conviction:%s  Range: %s   |r>>>|n |h%s|n |r>>>|n   Health: %s Stamina: %s <%s>" % (position,hp,sp,cp,range,tar_name,tar_hp,tar_sp, tar_position)
                 else:
                     prompt = "<%s> Health:%s Stamina:%s Conviction:%s     |r>>>|n |h%s|n |r>>>|n   Health: %s Stamina: %s <%s>" % (position,hp,sp,cp,tar_name,tar_hp,tar_sp, tar_position)
@@ -325,7 +405,5 @@ class CmdDisplayCharacterSheet(Command):
 
     def func(self):
         "display character sheet table"
-        # update the sheet values
-        self.caller.update_character_sheet()
-        # display the sheet
-        self.caller.msg(self.caller.db.charsheet)
+        # display the sheet, rebuilding any parts that changed
+        self.caller.msg(self.caller.update_character_sheet())
@@ -3,7 +3,7 @@ This file will contain the commands that change the position of the character,
 such as stand, sit, rest, etc... All commands except stand will result in
 a command set being applied that prevents movement.
 """
-from evennia import Command
+from commands.command import Command
 from evennia import CmdSet
 from evennia import default_cmds
 from evennia import search_object
@@ -23,7 +23,7 @@ class CmdStand(Command):
     def func(self):
         "Implements the command"
         self.caller.msg("You stand to your feet.")
-        self.caller.db.info['Position'] = 'standing'
+        self.caller.info['Position'] = 'standing'
 
 
 class CmdCollapse(Command):
@@ -34,7 +34,7 @@ class CmdCollapse(Command):
     def func(self):
         "Implements the command"
         self.caller.msg("You collapse to the floor from exhaustion.")
-        self.caller.db.info['Position'] = 'prone'
+        self.caller.info['Position'] = 'prone'
 
 
 class CmdSit(Command):
@@ -45,7 +45,7 @@ class CmdSit(Command):
     def func(self):
         "Implements the command"
         self.caller.msg("You sit down.")
-        self.caller.db.info['Position'] = 'sitting'
+        self.caller.info['Position'] = 'sitting'
 
 
 class CmdRest(Command):
@@ -59,7 +59,7 @@ class CmdRest(Command):
     def func(self):
         "Implements the command"
         self.caller.msg("You get comfortable and rest.")
-        self.caller.db.info['Position'] = 'resting'
+        self.caller.info['Position'] = 'resting'
 
 
 class CmdSleep(Command):
@@ -73,7 +73,7 @@ class CmdSleep(Command):
     def func(self):
         "Implements the command"
         self.caller.msg("You lie down and fall into a slumber.")
-        self.caller.db.info['Position'] = 'sleeping'
+        self.caller.info['Position'] = 'sleeping'
 
 
 class CmdBashedToGround(Command):
@@ -86,7 +86,7 @@ class CmdBashedToGround(Command):
     def func(self):
         "Implements the command"
         self.caller.msg("You are propelled onto your back.")
-        self.caller.db.info['Position'] = 'supine'
+        self.caller.info['Position'] = 'supine'
 
 
 class PreventMoveUntilStandCmdSet(CmdSet):
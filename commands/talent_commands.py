@@ -2,13 +2,12 @@
 This file will contain the commands that are related to various talents like
 sneak, track, appraise, etc that have an activated command.
 """
-from evennia import Command
+from commands.command import Command
 from evennia import CmdSet
 from evennia import default_cmds
 from evennia import search_object
 from evennia.utils.logger import log_file
 from world.dice_roller import return_a_roll as roll
-import time
 import random
 
 class TalentCmdSet(CmdSet):
@@ -39,11 +38,11 @@ class CmdSneak(Command):
 
     def func(self):
         "Implements the command"
-        if self.caller.db.info['Sneaking'] == False:
-            self.caller.db.info['Sneaking'] = True
+        if self.caller.info['Sneaking'] == False:
+            self.caller.info['Sneaking'] = True
             self.caller.msg("You start sneaking around.")
         else:
-            self.caller.db.info['Sneaking'] = False
+            self.caller.info['Sneaking'] = False
             self.caller.msg("You stop sneaking around.")
 
 
@@ -83,30 +82,24 @@ class CmdTrack(Command):
         "No target, survey for tracks"
         self.caller.msg("You search the room for tracks.")
         num_of_tracks = random.randrange(3)
-        success = False
-        for timestamp, track_info in self.caller.location.db.tracks.items():
-            # age of track in days. note that game time is twice as fast as
-            # real time.
-            track_age = (int(time.time()) - int(timestamp)) / (60 * 60 * 12)
-            trackee = track_info[0]
-            destination = track_info[1]
-            difficulty_to_track = track_info[2] + (track_age * 10)
+        # age of tracks is in days. note that game time is twice as fast as
+        # real time.
+        found_tracks = self.caller.location.tracks.readable(track_roll, \
+                                                            limit=num_of_tracks)
+        for (timestamp, trackee, destination, depth), track_age, difficulty_to_track in found_tracks:
             # log_file(f"Tracking Rolls - {self.caller.name} - roll: {track_roll} Age: {track_age} trackee: {trackee} destination: {destination} diff: {difficulty_to_track}", \
             #          filename='tracks.log')
-            if track_roll > difficulty_to_track and num_of_tracks > 0:
-                if trackee != self.caller:
-                    if track_age > 1:
-                        self.caller.msg(f"You found some tracks of {trackee} heading to {destination} that are about {round(track_age)} days old.")
-                    elif track_age <= 1:
-                        self.caller.msg(f"You found fresh signs of {trackee} heading to {destination}.")
-                else:
-                    if track_age > 1:
-                        self.caller.msg(f"You find a track you left heading to {destination} that is about {round(track_age)} days old.")
-                    elif track_age <= 1:
-                        self.caller.msg(f"You find fresh tracks you left heading to {destination}.")
-                num_of_tracks -= 1
-                success = True
-        if success == False:
+            if trackee != self.caller:
+                if track_age > 1:
+                    self.caller.msg(f"You found some tracks of {trackee} heading to {destination} that are about {round(track_age)} days old.")
+                elif track_age <= 1:
+                    self.caller.msg(f"You found fresh signs of {trackee} heading to {destination}.")
+            else:
+                if track_age > 1:
+                    self.caller.msg(f"You find a track you left heading to {destination} that is about {round(track_age)} days old.")
+                elif track_age <= 1:
+                    self.caller.msg(f"You find fresh tracks you left heading to {destination}.")
+        if not found_tracks:
             self.caller.msg("You can't make head nor tails of the tracks.")
 
 
@@ -116,22 +109,14 @@ class CmdTrack(Command):
             self.caller.msg(f"You survey the room for tracks of {target}")
         else:
             self.caller.msg("You survey the room for any tracks you left.")
-        success = False
-        for timestamp, track_info in self.caller.location.db.tracks.items():
-            # age of track in days. note that game time is twice as fast as
-            # real time.
-            track_age = (int(time.time()) - int(timestamp)) / (60 * 60 * 12)
-            trackee = track_info[0]
-            destination = track_info[1]
-            difficulty_to_track = track_info[2] + (track_age * 10)
-            # log_file(f"Tracking Rolls - {self.caller.name} - roll: {track_roll} Age: {track_age} trackee: {trackee} destination: {destination} diff: {difficulty_to_track}", \
-            #          filename='tracks.log')
-            if track_roll > difficulty_to_track and trackee == target:
-                if trackee != self.caller:
-                    self.caller.msg(f"You found some tracks of {trackee} heading to {destination} that are about {round(track_age)} days old.")
-                else:
-                    self.caller.msg(f"You find a track you left heading to {destination} that is about {round(track_age)} days old.")
-                # we found a track, break out of Loop
-                return
-        if success == False:
+        # we only need the most recent track of the target we can read
+        found_tracks = self.caller.location.tracks.readable(track_roll, limit=1, \
+                                                            trackee=target)
+        if not found_tracks:
             self.caller.msg("You can't make head nor tails of the tracks.")
+            return
+        (timestamp, trackee, destination, depth), track_age, difficulty_to_track = found_tracks[0]
+        if trackee != self.caller:
+            self.caller.msg(f"You found some tracks of {trackee} heading to {destination} that are about {round(track_age)} days old.")
+        else:
+            self.caller.msg(f"You find a track you left heading to {destination} that is about {round(track_age)} days old.")
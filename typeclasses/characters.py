@@ -12,13 +12,19 @@ from evennia.utils import lazy_property
 from world.equip import EquipHandler
 from world.traits import TraitHandler
 from world.dice_roller import return_a_roll as roll
+from world.dice_roller import roll_many
 from world.dice_roller import return_a_roll_sans_crits as rarsc
 from world import talents, mutations
 from world.progression_rules import control_progression_funcs
 from evennia.utils.logger import log_file
 from evennia import gametime
 from evennia import create_script
-from evennia.utils import evform, evtable
+from world.charsheet import CharSheetHandler
+from world.info import InfoHandler
+from world.stats_index import STATS_INDEX
+from world.combat_rules import POSITION_MODIFIERS
+from world.combatant_state import CombatantState
+from world.command_stats import note_msg
 
 
 class Character(DefaultCharacter):
@@ -67,6 +73,21 @@ class Character(DefaultCharacter):
         """Handler for equipped items."""
         return EquipHandler(self)
 
+    @lazy_property
+    def sheet(self):
+        """Render cache for the character sheet."""
+        return CharSheetHandler(self)
+
+    @lazy_property
+    def info(self):
+        """Handler for position, target and other info fields."""
+        return InfoHandler(self)
+
+    @lazy_property
+    def combat_state(self):
+        """Combat modifiers and state, see world/combatant_state.py."""
+        return CombatantState()
+
     def at_object_creation(self):
         "Called only at object creation and with update command."
         # clear traits, ability_scores, talents, and mutations
@@ -133,10 +154,9 @@ class Character(DefaultCharacter):
             'main hand': None,
             'off hand': None
         }
-        # Add in info db to store other useful tidbits we'll need
-        self.db.info = {'Target': None, 'Mercy': True, 'Default Attack': 'unarmed_strike', \
-                        'In Combat': False, 'Position': 'standing', 'Sneaking' : False, \
-                        'Wimpy': 100, 'Yield': 200, 'Title': None}
+        # Add in info fields to store other useful tidbits we'll need, see
+        # world.info.INFO_DEFAULTS
+        self.info.reset()
         # money
         self.db.wallet = {'GC': 0, 'SC': 0, 'CC': 0}
         # TODO: Add in character sheet
@@ -144,10 +164,34 @@ class Character(DefaultCharacter):
         self.db.moving_spotlight_heartbeat = create_script("typeclasses.moving_spotlight.MovingSpotlightTickCharacter", obj=self)
         # we will use this to stop account from changing sheet
         self.db.sheet_locked = False
-        self.db.charsheet = evform.EvForm("world/charsheetform.py")
         self.update_character_sheet()
 
 
+    def at_init(self):
+        "Called whenever the character is loaded into the cache."
+        super().at_init()
+        # brand new characters get their traits in at_object_creation
+        if self.attributes.has('ability_scores'):
+            STATS_INDEX.index_character(self)
+
+
+    def at_trait_changed(self, handler_name, key):
+        "Called by the trait handlers when a trait changes. Updates the stats index."
+        STATS_INDEX.update(self, handler_name, key)
+
+
+    def at_object_delete(self):
+        "Drop the character from the stats index when it is deleted."
+        STATS_INDEX.remove(self)
+        return super().at_object_delete()
+
+
+    def msg(self, *args, **kwargs):
+        "Counts the message for the command stats, see world/command_stats.py."
+        note_msg()
+        return super().msg(*args, **kwargs)
+
+
     def calculate_encumberance(self):
         """
         This function will determine how encumbered the object is based upon
@@ -168,9 +212,9 @@ class Character(DefaultCharacter):
             else:
                 self.traits.enc.current += item.db.mass
         if self.traits.enc.current == 0:
-            self.ndb.enc_mod = 1
+            self.combat_state.enc_mod = 1
         else:
-            self.ndb.enc_mod = ((self.traits.enc.current / self.traits.enc.max) ** .15)
+            self.combat_state.enc_mod = ((self.traits.enc.current / self.traits.enc.max) ** .15)
         # also calulate total mass
         for item in items:
             self.traits.mass.mod = item.db.mass
@@ -178,61 +222,22 @@ class Character(DefaultCharacter):
 
     def calc_status_modifiers(self):
         """
-        Rerun all the calculations for combat modifiers and store them as temp
-        variables on the character.
+        Rerun all the calculations for combat modifiers and store them on the
+        character's combat state.
         """
         log_file(f"start of status modifiers calc func for {self.name}", \
                  filename='combat_step.log')
+        state = self.combat_state
         # modifiers for health/stamina/conviction
-        self.ndb.hp_mod = ((self.traits.hp.current / self.traits.hp.max) ** .15)
-        self.ndb.sp_mod = ((self.traits.sp.current / self.traits.sp.max) ** .15)
-        self.ndb.cp_mod = ((self.traits.cp.current / self.traits.cp.max) ** .15)
-        position = self.db.info['Position']
-        # ground positions listed from best to worst
-        if position == 'tbmount': # mounted opponent and taken their back
-            self.ndb.position_mod = 1.5
-        elif position == "mount": # mounted opponent, facing them
-            self.ndb.position_mod = 1.4
-        elif position == "side control": # on top, have side control
-            self.ndb.position_mod = 1.2
-        elif position == "top": # on top, in their guard
-            self.ndb.position_mod = 1.05
-        elif position == "in guard": # on bottom, in your guard
-            self.ndb.position_mod = .95
-        elif position == "side controlled": # on bottom, being side controlled
-            self.ndb.position_mod = .85
-        elif position == "mounted": # on bottom, mounted
-            self.ndb.position_mod = .75
-        elif position == "prmounted": # on bottom, face down, back taken
-            self.ndb.position_mod = .5
-        # standing grappling positions from best to worst
-        elif position == "tbstanding": # riding opponent from behind, they're standing
-            self.ndb.position_mod = 1.25
-        elif position == "clinching": # both standing, you have them in a clinch
-            self.ndb.position_mod = 1.05
-        elif position == "clinched": # both standing, they have you in a clinch
-            self.ndb.position_mod = .95
-        elif position == "standingbt": # opponent has taken your back, you're standing
-            self.ndb.position_mod = .85
-        # non grappling positions, normal
-        elif position == "standing":
-            self.ndb.position_mod = 1
-        elif position == "sitting":
-            self.ndb.position_mod = .9
-        elif position == "supine":
-            self.ndb.position_mod = .85
-        elif position == "prone":
-            self.ndb.position_mod = .8
-        elif position == "sleeping":
-            self.ndb.position_mod = .5
-        # other environmentally dependant positions
-        elif position == "floating": # floating in air or water, limited control
-            self.ndb.position_mod = 1
-        elif position == "flying": # flying through air under your own power
-            self.ndb.position_mod = 1.25
-        # all other cases, log an error
-        else:
-            self.ndb.position_mod = 1
+        state.hp_mod = ((self.traits.hp.current / self.traits.hp.max) ** .15)
+        state.sp_mod = ((self.traits.sp.current / self.traits.sp.max) ** .15)
+        state.cp_mod = ((self.traits.cp.current / self.traits.cp.max) ** .15)
+        position = self.info['Position']
+        # see world.combat_rules.POSITION_MODIFIERS
+        state.position_mod = POSITION_MODIFIERS.get(position)
+        if state.position_mod is None:
+            # all other cases, log an error
+            state.position_mod = 1
             logger.log_trace("Unknown character position. Check the code for \
                               typeclasses.characters.Character.calc_position_modifier()")
 
@@ -240,46 +245,48 @@ class Character(DefaultCharacter):
     def calc_footwork_and_groundwork_mods(self):
         """
         Runs calculations for footwork and groundwork rolls at the start of
-        combat round and applies these to a temp variable on self.
+        combat round and applies these to the character's combat state.
         """
         # checks to ensure temp vars we need have been set. If not, run calcs
         log_file(f"start of foot/groundwork calc func for {self.name}", \
                  filename='combat_step.log')
+        state = self.combat_state
         # calc groundwork ratio
         groundwork_dice = (self.talents.grappling.actual + \
                            self.traits.mass.actual) * \
-                           self.ndb.position_mod * \
-                           self.ndb.hp_mod * \
-                           self.ndb.sp_mod * self.ndb.cp_mod * \
-                           self.ndb.enc_mod
-        self.ndb.groundwork_mod = (roll(groundwork_dice, 'flat', \
-                                  self.ability_scores.Dex, \
-                                  self.talents.grappling)) / 250
+                           state.position_mod * \
+                           state.hp_mod * \
+                           state.sp_mod * state.cp_mod * \
+                           state.enc_mod
+        state.groundwork_mod = (roll(groundwork_dice, 'flat', \
+                                self.ability_scores.Dex, \
+                                self.talents.grappling)) / 250
         # calc footwork ratio
         footwork_dice = self.talents.footwork.actual * \
-                        self.ndb.position_mod * self.ndb.hp_mod * \
-                        self.ndb.sp_mod * self.ndb.cp_mod * \
-                        self.ndb.enc_mod
-        self.ndb.footwork_mod = (roll(footwork_dice, 'flat', \
-                                self.ability_scores.Dex, \
-                                self.talents.footwork)) / 100
+                        state.position_mod * state.hp_mod * \
+                        state.sp_mod * state.cp_mod * \
+                        state.enc_mod
+        state.footwork_mod = (roll(footwork_dice, 'flat', \
+                              self.ability_scores.Dex, \
+                              self.talents.footwork)) / 100
 
 
     def calculate_equipment_bonuses(self):
         """
         Runs calculations for bonuses due to equipped items.
         """
-        self.ndb.eq_damage = 1
-        self.ndb.eq_phy_arm = 1
-        self.ndb.eq_men_arm = 1
+        state = self.combat_state
+        state.eq_damage = 1
+        state.eq_phy_arm = 1
+        state.eq_men_arm = 1
         for slot, item in self.db.slots.items():
             if item != None:
                 if item.attributes.has('physical_armor_value'):
-                    self.ndb.eq_phy_arm *= item.db.physical_armor_value
+                    state.eq_phy_arm *= item.db.physical_armor_value
                 if item.attributes.has('mental_armor_value'):
-                    self.ndb.eq_men_arm *= item.db.mental_armor_value
+                    state.eq_men_arm *= item.db.mental_armor_value
                 if item.attributes.has('damage'):
-                    self.ndb.eq_damage *= item.db.damage
+                    state.eq_damage *= item.db.damage
 
 
     def populate_num_combat_actions(self):
@@ -292,13 +299,13 @@ class Character(DefaultCharacter):
         # listing out modifiers for readbility
         actions_roll = ((self.ability_scores.Dex.actual + \
                          self.ability_scores.Vit.actual) * \
-                         self.ndb.enc_mod)
+                         self.combat_state.enc_mod)
         log_file(f"{self.name} rolling {actions_roll} for actions. This \
                  will be divided by 100 and then rounded.", filename='combat_step.log')
-        self.ndb.num_of_actions = round((roll(actions_roll, 'very flat', \
+        self.combat_state.num_of_actions = round((roll(actions_roll, 'very flat', \
                                        self.ability_scores.Dex, \
                                        self.ability_scores.Vit)) / 100)
-        log_file(f"{self.name} gets {self.ndb.num_of_actions} actions.", \
+        log_file(f"{self.name} gets {self.combat_state.num_of_actions} actions.", \
                  filename='combat.log')
 
 
@@ -308,22 +315,22 @@ class Character(DefaultCharacter):
         they have, change next combat action to the appropriate action.
         """
         log_file(f"start of wimpy/yield check for {self.name}.", filename='combat_step.log')
-        if self.traits.hp.current <= self.db.info['Wimpy']:
+        if self.traits.hp.current <= self.info['Wimpy']:
             self.execute_cmd('flee')
             log_file(f"{self.name} is fleeing (hps).", filename='combat.log')
-        elif self.traits.hp.current <= self.db.info['Yield']:
+        elif self.traits.hp.current <= self.info['Yield']:
             self.execute_cmd('yield')
             log_file(f"{self.name} is yielding (hps).", filename='combat.log')
-        elif self.traits.sp.current <= self.db.info['Wimpy']:
+        elif self.traits.sp.current <= self.info['Wimpy']:
             self.execute_cmd('flee')
             log_file(f"{self.name} is fleeing(sps).", filename='combat.log')
-        elif self.traits.sp.current <= self.db.info['Yield']:
+        elif self.traits.sp.current <= self.info['Yield']:
             self.execute_cmd('yield')
             log_file(f"{self.name} is yielding (sps).", filename='combat.log')
-        elif self.traits.hp.current <= self.db.info['Wimpy']:
+        elif self.traits.hp.current <= self.info['Wimpy']:
             self.execute_cmd('flee')
             log_file(f"{self.name} is fleeing(cps).", filename='combat.log')
-        elif self.traits.hp.current <= self.db.info['Yield']:
+        elif self.traits.hp.current <= self.info['Yield']:
             self.execute_cmd('yield')
             log_file(f"{self.name} is yielding (cps).", filename='combat.log')
         else:
@@ -341,21 +348,21 @@ class Character(DefaultCharacter):
         log_file(f"start of regen tick function for {self.name}.", \
                  filename='time_tick.log')
         # first, check if we're in combat
-        if self.db.info['In Combat']:
+        if self.info['In Combat']:
             combat_mod = .25
         else:
             combat_mod = 1
         # next, check position
         pos_mod = 1
-        if self.db.info['Position'] == "resting":
+        if self.info['Position'] == "resting":
             pos_mod = 1.1
-        elif self.db.info['Position'] == "sitting":
+        elif self.info['Position'] == "sitting":
             pos_mod = 1.1
-        elif self.db.info['Position'] == "supine":
+        elif self.info['Position'] == "supine":
             pos_mod = 1.2
-        elif self.db.info['Position'] == "prone":
+        elif self.info['Position'] == "prone":
             pos_mod = 1.2
-        elif self.db.info['Position'] == "sleeping":
+        elif self.info['Position'] == "sleeping":
             pos_mod = 1.5
         # TODO: implement moon phase modifier when we have that
         # TODO: Add a multiplier for wounds once we implment those
@@ -363,17 +370,16 @@ class Character(DefaultCharacter):
         hp_regen_dice = self.ability_scores.Vit.actual * combat_mod * pos_mod * 2
         sp_regen_dice = self.ability_scores.Vit.actual * combat_mod * pos_mod * 2
         cp_regen_dice = self.ability_scores.Cha.actual * combat_mod * pos_mod
-        hp_regen_roll = round(roll(hp_regen_dice, 'normal', \
-                        self.ability_scores.Vit, self.traits.hp))
-        sp_regen_roll = round(roll(sp_regen_dice, 'normal', \
-                        self.ability_scores.Vit, self.traits.sp))
-        cp_regen_roll = round(roll(cp_regen_dice, 'normal', \
-                        self.ability_scores.Cha, self.traits.cp))
+        regen_rolls, crits, crit_fails = roll_many( \
+                        [hp_regen_dice, sp_regen_dice, cp_regen_dice], 'normal', \
+                        [(self.ability_scores.Vit, self.traits.hp), \
+                         (self.ability_scores.Vit, self.traits.sp), \
+                         (self.ability_scores.Cha, self.traits.cp)])
+        hp_regen_roll, sp_regen_roll, cp_regen_roll = (int(regen_roll) for regen_roll in regen_rolls)
         log_file(f"{self.name} regen tick - HP: {hp_regen_roll} SP: {sp_regen_roll} CP: {cp_regen_roll}", \
                  filename='time_tick.log')
-        self.traits.hp.current += hp_regen_roll
-        self.traits.sp.current += sp_regen_roll
-        self.traits.cp.current += cp_regen_roll
+        self.traits.apply_current_deltas({'hp': hp_regen_roll, 'sp': sp_regen_roll, \
+                                          'cp': cp_regen_roll})
 
 
     def at_heartbeat_tick_do_progression_checks(self):
@@ -382,10 +388,34 @@ class Character(DefaultCharacter):
         learns anything on this heartbeat tick. We will prevent learning
         while in combat.
         """
-        if self.db.info['In Combat']:
+        if self.info['In Combat']:
             return
         else:
             control_progression_funcs(self)
+        self.flush_learning()
+
+
+    def flush_learning(self):
+        """
+        Saves the learn counters that critical rolls have bumped since the
+        last flush. Called once per combat round, heartbeat tick and before
+        a reload or shutdown.
+        """
+        for handler in (self.ability_scores, self.traits, self.talents, \
+                        self.mutations):
+            handler.flush_learn()
+
+
+    def at_server_reload(self):
+        "Save any pending learn counters before a reload."
+        super().at_server_reload()
+        self.flush_learning()
+
+
+    def at_server_shutdown(self):
+        "Save any pending learn counters before a shutdown."
+        super().at_server_shutdown()
+        self.flush_learning()
 
 
     def exhaustion_check(self):
@@ -395,7 +425,7 @@ class Character(DefaultCharacter):
         """
         if self.traits.sp.current < 1:
             self.caller.msg("You collapse to the floor from exhaustion.")
-            self.caller.db.info['Position'] = 'prone'
+            self.caller.info['Position'] = 'prone'
 
 
     def reroll(self):
@@ -471,10 +501,9 @@ class Character(DefaultCharacter):
             'wield1': None,
             'wield2': None
         }
-        # Add in info db to store other useful tidbits we'll need
-        self.db.info = {'Target': None, 'Mercy': True, 'Default Attack': 'unarmed_strike', \
-                        'In Combat': False, 'Position': 'standing', 'Sneaking' : False, \
-                        'Wimpy': 100, 'Yield': 200, 'Title': None}
+        # Add in info fields to store other useful tidbits we'll need, see
+        # world.info.INFO_DEFAULTS
+        self.info.reset()
         # money
         self.db.wallet = {'GC': 0, 'SC': 0, 'CC': 0}
         self.update_character_sheet()
@@ -540,92 +569,37 @@ class Character(DefaultCharacter):
 
     def update_character_sheet(self):
         """
-        This function is called to update the character sheet when the command
-        to display the character sheet is run.
+        Returns the character sheet. Only the sections of the sheet whose data
+        changed since it was last shown are rebuilt. See world.charsheet.
         """
-        if self.db.info['Title'] is not None:
-            if len(self.db.info['Title']) < 25:
-                name_and_title = "\t" + str(self.name) + self.db.info['Title']
-        else:
-            name_and_title = "\t\t\t\t" + str(self.name)
-        name_and_title = f"|h|w{name_and_title}|n"
-        funds = f"|551Gold:|n {self.db.wallet['GC']}    |445Silver:|n {self.db.wallet['SC']}    |530Copper:|n {self.db.wallet['CC']}"
-        # NOTE: money stored in self.db.wallet
-        att_table = evtable.EvTable("|035Attribute|n", "|wValue|n",
-                        table = [
-                            ["Health", "Stamina", "Conviction", "Dexterity", \
-                             "Strength", "Vitality", "Perception", "Charisma", \
-                             "Weight"],
-                            [(str(int(self.traits.hp.current)) + " / " + str(self.traits.hp.max) ), \
-                             (str(int(self.traits.sp.current)) + " / " + str(self.traits.sp.max) ), \
-                             (str(int(self.traits.cp.current)) + " / " + str(self.traits.cp.max ) ), \
-                             self.ability_scores.Dex.current, self.ability_scores.Str.current, \
-                             self.ability_scores.Vit.current, self.ability_scores.Per.current, \
-                             self.ability_scores.Cha.current, self.traits.mass.current]],
-                             align='c', border="incols")
-        # get top talents in a simplified dictionary converted to a list of
-        # names and a list of scores
-        talent_names, talent_scores = self.get_top_talents()
-        talent_table = evtable.EvTable("|530Talent|n", "|wValue|n",
-                        table = [
-                            talent_names,
-                            talent_scores],
-                            align='c', border="incols")
-        # reformat default attack names so they're friendlier for the character
-        # sheet
-        if self.db.info["Default Attack"] == "unarmed_strike":
-            datt = 'Strikes'
-        elif self.db.info["Default Attack"] == "melee_weapon_strike":
-            datt = 'Melee Weapon'
-        elif self.db.info["Default Attack"] == "ranged_weapon_strike":
-            datt = 'Ranged Weapon'
-        elif self.db.info["Default Attack"] == "mental_attack":
-            datt = 'Psi'
-        else:
-            datt = self.db.info["Default Attack"].capitalize()
-        info_table = evtable.EvTable("|530Info|n", "|wValue|n",
-                        table = [
-                                ["Default Attack", "Mercy", "Wimpy", "Yield", \
-                                 "Sneaking"], \
-                                [datt, self.db.info["Mercy"], \
-                                 self.db.info["Wimpy"], self.db.info["Yield"], \
-                                 self.db.info["Sneaking"]]],
-                                 align='c', border="incols")
-        # get the top mutations in a simplified dictionary converted to a list of
-        # names and a list of scores
-        mut_names, mut_scores = self.get_top_mutations()
-        mutations_table = evtable.EvTable("|035Mutation|n", "|wValue|n",
-                        table = [
-                            mut_names,
-                            mut_scores],
-                            align='c', border="incols")
-        self.db.charsheet.map(tables={2: att_table, 3: talent_table, \
-                                      4: info_table, 5: mutations_table},
-                              cells= {1: name_and_title, 6: funds})
+        return self.sheet.render()
 
 
     def get_top_talents(self):
         """
-        Loops through all of the character's talents and returns the top 10
-        talents in their list by current score.
+        Returns the names and scores of the character's top 12 talents by
+        current score.
         """
-        top_talents_list = list(self.talents.all_dict.items())[:12]
-        top_talents_dict = {v['name']: (v['base'] + v['mod']) for k, v in top_talents_list}
-        talent_names = list(top_talents_dict.keys())
-        talent_scores = list(top_talents_dict.values())
-        return talent_names, talent_scores
+        return self._top_trait_names_and_scores(self.talents, 12)
 
 
     def get_top_mutations(self):
         """
-        Loops through all of the character's mutations and returns the top 5
-        mutations in their list by current score.
+        Returns the names and scores of the character's top 5 mutations by
+        current score.
+        """
+        return self._top_trait_names_and_scores(self.mutations, 5)
+
+
+    def _top_trait_names_and_scores(self, handler, n):
+        """
+        Returns a list of names and a list of scores for the top n traits of
+        a trait handler, served from the handler's ranking.
         """
-        top_mutations_list = list(self.mutations.all_dict.items())[:5]
-        top_mutations_dict = {v['name']: (v['base'] + v['mod']) for k, v in top_mutations_list}
-        mut_names = list(top_mutations_dict.keys())
-        mut_scores = list(top_mutations_dict.values())
-        return mut_names, mut_scores
+        top_traits = handler.top(n)
+        names = [handler.attr_dict[key]['name'] for key, score in top_traits]
+        scores = [score for key, score in top_traits]
+        return names, scores
 
 
     # prevent movement into a room if the room is full. This is done using an
@@ -26,8 +26,16 @@ from world.combat_messaging import build_msgs_for_grappling_unarmed_strikes_norm
 from world.combat_messaging import build_msgs_for_grappling_submission as msg_grappling_sub
 from world.combat_messaging import build_msgs_for_grappling_escape as msg_grappling_escape
 from world.combat_messaging import build_msgs_for_melee_weapon_strikes as msg_melee_weapons
-from world.combat_rules import apply_damage as apply_dam
+from world.combat_rules import Hit, apply_damage_batch
 from world.combat_rules import check_shield_block_multiplier as check_sbm
+from world.combat_rules import opposed_check, TAKEDOWN_BANDS, IMPROVE_POSITION_BANDS, \
+                               ESCAPE_BANDS, SUBMISSION_BANDS
+from world import grappling_rules as gr
+from world.metrics import METRICS
+from world.room_graph import ROOM_GRAPH
+
+# how many rooms away fleeing combatants look for a non-combat room
+FLEE_SEARCH_DEPTH = 3
 
 # # actions
 # actions_dict = {
@@ -121,6 +129,46 @@ class CombatActionObject(DefaultScript):
         "Executes the combat action"
         pass
 
+    def spend(self, character, gauge, amount):
+        """
+        Charges a cost to one of a character's gauges. In a combat round the
+        cost goes on the round's resource ledger and is committed with the
+        rest of the round's costs by the combat handler.
+        """
+        handler = self.obj.ndb.combat_handler
+        if handler:
+            handler.ledger.charge(character, gauge, amount)
+        else:
+            character.traits.apply_current_deltas({gauge: -amount})
+
+    def queue_hit(self, defender, attack_type, critical_hit, msg_func, *args):
+        """
+        Queues a hit on the defender for the round's damage batch (see
+        combat_rules.apply_damage_batch). Once the damage is worked out, the
+        messaging is sent with msg_func(attacker, defender, damage, *args).
+        """
+        character = self.obj
+        hit = Hit(character, defender, attack_type, critical_hit)
+        callback = lambda damage: msg_func(character, defender, damage, *args)
+        handler = character.ndb.combat_handler
+        if handler:
+            handler.queue_round_event(callback, hit)
+        else:
+            # not in a combat round, apply the hit right away
+            callback(apply_damage_batch([hit])[0])
+
+    def queue_msg(self, msg_func, *args):
+        """
+        Queues messaging so that it is sent in order with the messaging for
+        the hits of the round.
+        """
+        callback = lambda: msg_func(*args)
+        handler = self.obj.ndb.combat_handler
+        if handler:
+            handler.queue_round_event(callback)
+        else:
+            callback()
+
 
 
 class CAOUnarmedStrikesNormal(CombatActionObject):
@@ -132,46 +180,38 @@ class CAOUnarmedStrikesNormal(CombatActionObject):
         log_file(f"{self.key} start of unarmed strikes normal action execution.", filename='combat_step.log')
         character = self.obj
         # loop through attacks
-        for i in range(character.ndb.num_of_actions):
+        for i in range(character.combat_state.num_of_actions):
             log_file(f"Executing unarmed strike normal number: {i+1} for {character.name}", \
                      filename='combat_step.log')
             attack_hit = round(roll((character.talents.unarmed_striking.actual * \
-                              character.ndb.footwork_mod), 'flat', \
+                              character.combat_state.footwork_mod), 'flat', \
                               character.ability_scores.Dex, character.talents.unarmed_striking))
             log_file(f"{character.name} attack roll: {attack_hit}", filename='combat.log')
             # use up stamina to attack
-            character.traits.sp.current -= (12 / character.ndb.enc_mod)
+            self.spend(character, 'sp', (12 / character.combat_state.enc_mod))
             # get defender rolls
-            defender = character.db.info['Target']
+            defender = character.info['Target']
             log_file(f"doing defensive rolls for {defender.name}.", \
                      filename='combat_step.log')
             dodge_roll = round(roll((defender.ability_scores.Dex.actual * \
-                               defender.ndb.footwork_mod) * .95, 'flat', \
+                               defender.combat_state.footwork_mod) * .95, 'flat', \
                                defender.ability_scores.Dex))
 
             block_roll = round(roll((defender.ability_scores.Str.actual * \
-                               defender.ndb.footwork_mod) * .9, 'flat', \
+                               defender.combat_state.footwork_mod) * .9, 'flat', \
                                defender.ability_scores.Str))
             log_file(f"{defender.name} Dodge: {dodge_roll}\tBlock: {block_roll}", \
                      filename='combat.log')
             # use up some stamina to defend
-            defender.traits.sp.current -= (5 / defender.ndb.enc_mod)
+            self.spend(defender, 'sp', (5 / defender.combat_state.enc_mod))
             if dodge_roll > attack_hit:
-                msg_dodge(character, defender)
+                self.queue_msg(msg_dodge, character, defender)
             elif block_roll > attack_hit:
-                msg_block(character, defender)
+                self.queue_msg(msg_block, character, defender)
             else:
-                # TODO: Move this to apply damage function!
-                damage = roll(character.ability_scores.Str.actual / 2, 'very flat', character.ability_scores.Str)
-                defender.traits.hp.current -= damage
-                log_file(f"{character.name} hit {defender.name} for {damage} damage. \
-                         They have {defender.traits.hp.actual} hps left.", \
-                         filename='combat.log')
-                log_file("calling combat msging for unarmed attacks", filename='combat_step.log')
-                msg_unarmed_normal(character, defender, damage)
-                if defender.traits.hp.actual < 1:
-                    # TODO: Implement death - for now we'll just flee
-                    defender.execute_cmd('flee')
+                critical_hit = attack_hit > dodge_roll + block_roll
+                log_file("queueing unarmed strike for the round's damage batch", filename='combat_step.log')
+                self.queue_hit(defender, 'unarmed', critical_hit, msg_unarmed_normal)
         log_file(f"Unarmed Strikes normal complete for {character.name}.", \
                  filename='combat_step.log')
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
@@ -189,8 +229,8 @@ class CAOYield(CombatActionObject):
         log_file(f"{self.key} start of yield action execution.", filename='combat_step.log')
         character = self.obj
         # check if the defender is the merciful type
-        defender = character.db.info['Target']
-        if defender.db.info['Mercy'] == True:
+        defender = character.info['Target']
+        if defender.info['Mercy'] == True:
             character.location.msg_contents(f"{character.name} yields to {defender.name}, who is merciful.")
             log_file(f"{character.name} is yielding. killing combat handler: {character.ndb.combat_handler}", \
                      filename='combat_step.log')
@@ -204,17 +244,31 @@ class CAOYield(CombatActionObject):
 
 class CAOFlee(CombatActionObject):
     """
-    Combat action script that carries out the action of yielding.
+    Combat action script that carries out the action of fleeing. Combatants
+    head for the nearest non-combat room if there is one close by, and
+    through a random exit otherwise.
     """
+    def flee_exit(self, character):
+        "Returns the key of the exit to flee through, or None if there's none."
+        route = ROOM_GRAPH.nearest_safe_room(character.location, FLEE_SEARCH_DEPTH)
+        if route and route.path:
+            return route.path[0]
+        exits = ROOM_GRAPH.neighbors(character.location)
+        if not exits:
+            return None
+        return random.choice(exits).key
+
     def execute_purpose(self):
         "Executes the combat action"
         log_file(f"{self.key} start of flee action execution.", filename='combat_step.log')
         character = self.obj
-        exits = []
-        for exit in character.location.exits:
-            exits.append(exit)
+        exit_key = self.flee_exit(character)
+        if exit_key is None:
+            character.msg("There is nowhere to flee to!")
+            self.stop()
+            return
         character.cmdset.delete("commands.combat_commands.CombatCmdSet")
-        utils.delay(1,character.execute_cmd(f"{random.choice(exits)}"))
+        utils.delay(1, character.execute_cmd, exit_key)
         log_file(f"{character.name} is fleeing. killing combat handler: {character.ndb.combat_handler}", \
                      filename='combat_step.log')
         character.ndb.combat_handler.stop()
@@ -231,57 +285,30 @@ class CAOGrapplingTakedown(CombatActionObject):
         "Executes the combat action"
         log_file(f"{self.key} - start of grappling takedown action execution.", filename='combat_step.log')
         character = self.obj
-        target = character.db.info['Target']
-        character.traits.sp.current -= (20 / character.ndb.enc_mod)
-        target.traits.sp.current -= (12 / target.ndb.enc_mod)
-        # re-using groundwork rolls for determining success
-        if character.ndb.groundwork_mod > target.ndb.groundwork_mod:
-            log_file(f"{target.name} taken down by {character.name}.", filename='combat.log')
-            character.ndb.range = 'grapple'
-            target.ndb.range = 'grapple'
-            if character.ndb.groundwork_mod > target.ndb.groundwork_mod * 3:
-                # massive success, takedown directly to mount
-                character.db.info['Position'] = 'mount'
-                target.db.info['Position'] = 'mounted'
-                success_lvl = 'mount'
-            elif character.ndb.groundwork_mod > target.ndb.groundwork_mod * 1.75:
-                # huge success, takedown directly to side control
-                character.db.info['Position'] = 'side control'
-                target.db.info['Position'] = 'side controlled'
-                success_lvl = 'side control'
-            elif character.ndb.groundwork_mod > target.ndb.groundwork_mod * 1.25:
-                # great success, takedown directly to top
-                log_file(f"{character.name} changing position from {character.db.info['Position']} to top.", \
-                         filename='combat.log')
-                character.db.info['Position'] = 'top'
-                target.db.info['Position'] = 'in guard'
-                success_lvl = 'top'
-            else:
-                # able to grapple, but in a clinch, no takedown
-                character.db.info['Position'] = 'clinching'
-                target.db.info['Position'] = 'clinched'
-                success_lvl ='clinching'
-        elif character.ndb.groundwork_mod * 4 < target.ndb.groundwork_mod:
-            # massive failure
-            log_file(f"{target.name} clowns takedown by {character.name}.", filename='combat.log')
-            character.ndb.range = 'grapple'
-            target.ndb.range = 'grapple'
-            character.db.info['Position'] = 'mounted'
-            target.db.info['Position'] = 'mount'
-            success_lvl = 'mounted'
-        elif character.ndb.groundwork_mod * 2.5 < target.ndb.groundwork_mod:
-            # huge failure
-            log_file(f"{target.name} easily avoids takedown by {character.name}.", filename='combat.log')
-            character.ndb.range = 'grapple'
-            target.ndb.range = 'grapple'
-            character.db.info['Position'] = 'side controlled'
-            target.db.info['Position'] = 'side control'
-            success_lvl = 'side controlled'
-        else:
-            # failure to even close the distance
-            log_file(f"{target.name} avoids takedown by {character.name}.", filename='combat.log')
+        target = character.info['Target']
+        self.spend(character, 'sp', (20 / character.combat_state.enc_mod))
+        self.spend(target, 'sp', (12 / target.combat_state.enc_mod))
+        # re-using groundwork rolls for determining success. massive success
+        # takes down directly to mount, massive failure gets the attacker
+        # reversed and mounted. see world.combat_rules.TAKEDOWN_BANDS
+        band = opposed_check(character.combat_state.groundwork_mod, target.combat_state.groundwork_mod, \
+                             TAKEDOWN_BANDS)
+        log_file(f"Takedown by {character.name} on {target.name}: {gr.OUTCOME_BANDS[band]}.", \
+                 filename='combat.log')
+        if band == gr.FAILURE:
             success_lvl = 'normal_failure'
-        msg_takedown(character, target, success_lvl)
+        else:
+            new_c_position, new_t_position = gr.resolve_positions(gr.TAKEDOWN, \
+                                             character.info['Position'], \
+                                             target.info['Position'], band)
+            log_file(f"{character.name} changing position from {character.info['Position']} to {new_c_position}.", \
+                     filename='combat.log')
+            character.combat_state.range = 'grapple'
+            target.combat_state.range = 'grapple'
+            character.info['Position'] = new_c_position
+            target.info['Position'] = new_t_position
+            success_lvl = new_c_position
+        self.queue_msg(msg_takedown, character, target, success_lvl)
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
                  filename='combat_step.log')
         self.stop()
@@ -295,28 +322,18 @@ class CAOGrapplingImprovePosition(CombatActionObject):
         "Executes the combat action"
         log_file(f"{self.key} start of grappling improve position action execution.", \
                  filename='combat_step.log')
-        ground_grappling_position_index = {
-        1 : 'tbmount',
-        2 : 'mount',
-        3 : 'side control',
-        4 : 'top',
-        5 : 'in guard',
-        6 : 'side controlled',
-        7 : 'mounted',
-        8 : 'prmounted'
-        }
-        standing_grappling_position_index = {
-        1 : 'tbstanding',
-        2 : 'clinching',
-        3 : 'clinched',
-        4 : 'standingbt'
-        }
         character = self.obj
-        target = character.db.info['Target']
-        character.traits.sp.current -= (18 / character.ndb.enc_mod)
-        target.traits.sp.current -= (15 / target.ndb.enc_mod)
-        grappling_attack_dice = character.talents.grappling.actual * character.ndb.groundwork_mod
-        grappling_block_dice = target.talents.grappling.actual * target.ndb.groundwork_mod
+        target = character.info['Target']
+        # make sure attacker and defender are actually grappling each other
+        if gr.mirror(character.info['Position']) != target.info['Position']:
+            log_file(f"Error in grappling improve position combat action. Positions don't match up. Attacker: {character.info['Position']} Defender: {target.info['Position']}", \
+                     filename='error.log')
+            self.stop()
+            return
+        self.spend(character, 'sp', (18 / character.combat_state.enc_mod))
+        self.spend(target, 'sp', (15 / target.combat_state.enc_mod))
+        grappling_attack_dice = character.talents.grappling.actual * character.combat_state.groundwork_mod
+        grappling_block_dice = target.talents.grappling.actual * target.combat_state.groundwork_mod
         grappling_attack_roll = round(roll(grappling_attack_dice, 'flat', \
                                 character.ability_scores.Str, character.ability_scores.Dex, \
                                 character.talents.grappling))
@@ -325,88 +342,22 @@ class CAOGrapplingImprovePosition(CombatActionObject):
                                 target.talents.grappling))
         log_file(f"Improve grappling pos. Attack Roll: {grappling_attack_roll} Block Roll: {grappling_block_roll}", \
                  filename='combat.log')
-        # determine which index to use
-        if character.db.info['Position'] in ground_grappling_position_index.values():
-            c_grappling_status_list = [ground_grappling_position_index, 0]
-        elif character.db.info['Position'] in standing_grappling_position_index.values():
-            c_grappling_status_list = [standing_grappling_position_index, 0]
-        else:
-            log_file(f"Error in grappling improve position combat action. Attacker is not in a grappling position. Pos: {character.db.info['Position']}", \
-                     filename='error.log')
-        if target.db.info['Position'] in ground_grappling_position_index.values():
-            t_grappling_status_list = [ground_grappling_position_index, 0]
-        elif target.db.info['Position'] in standing_grappling_position_index.values():
-            t_grappling_status_list = [standing_grappling_position_index, 0]
-        else:
-            log_file(f"Error in grappling improve position combat action. Attacker is not in a grappling position. Pos: {character.db.info['Position']}", \
-                     filename='error.log')
-        # make sure attacker and defender are actually in the same position indexes
-        if c_grappling_status_list[0] != t_grappling_status_list[0]:
-            log_file("Killing grappling improve position script. attacker and defender in wildly different positions.", \
-                     filename='error.log')
-            self.stop()
-        # determine which index we're currently at
-        for key, position in c_grappling_status_list[0].items():
-            log_file(f"debug loop - checking {key} {position} against {character.db.info['Position']} {target.db.info['Position']}. ", \
-                     filename='combat_step.log')
-            if position == character.db.info['Position']:
-                c_grappling_status_list[1] = key
-            if position == target.db.info['Position']:
-                t_grappling_status_list[1] = key
-        log_file(f"Attacker grappling status initial: {c_grappling_status_list} Defender grappling status: {t_grappling_status_list}", \
-                 filename='combat_step.log')
-        # go through successes and failures
-        if grappling_attack_roll * 3 < grappling_block_roll:
-            # massive failure
-            c_grappling_status_list[1] += 2
-            t_grappling_status_list[1] -= 2
-        elif grappling_attack_roll * 1.5 < grappling_block_roll:
-            # critical failure
-            c_grappling_status_list[1] += 1
-            t_grappling_status_list[1] -= 1
-        elif grappling_attack_roll * 1.5 >= grappling_block_roll and \
-            grappling_attack_roll <= grappling_block_roll:
-                # fail
-                pass
-        elif grappling_attack_roll > grappling_block_roll * 4:
-            # massive success
-            # if we were in a standing grappling position, we drag defender to
-            # the ground. Otherwise, greatly improve position
-            if c_grappling_status_list[0] == standing_grappling_position_index:
-                c_grappling_status_list[0] = ground_grappling_position_index
-                t_grappling_status_list[0] = ground_grappling_position_index
-            else:
-                c_grappling_status_list[1] -= 3
-                t_grappling_status_list[1] -= 3
-        elif grappling_attack_roll > grappling_block_roll * 3:
-            # crit success
-            c_grappling_status_list[1] -= 2
-            t_grappling_status_list[1] += 2
-        elif grappling_attack_roll > grappling_block_roll:
-            # success
-            c_grappling_status_list[1] -= 1
-            t_grappling_status_list[1] += 1
-        else:
-            log_file("Error in determining grappling status for improve position.", \
-                     filename='error.log')
-        log_file(f"Attacker grappling status initial: {c_grappling_status_list} Defender grappling status: {t_grappling_status_list}", \
-                 filename='combat_step.log')
-        # Make sure we don't go out of list range
-        if c_grappling_status_list[1] > len(c_grappling_status_list[0].keys()):
-            c_grappling_status_list[1] = len(c_grappling_status_list[0].keys())
-            t_grappling_status_list[1] = 1 + (len(c_grappling_status_list[0].keys()) - \
-                                          c_grappling_status_list[1])
-        elif c_grappling_status_list[1] < 1:
-            c_grappling_status_list[1] = 1
-            t_grappling_status_list[1] = len(c_grappling_status_list[0].keys())
-        else:
-            pass
+        # go through successes and failures. if we were in a standing grappling
+        # position, a massive success drags the defender to the ground
+        band = opposed_check(grappling_attack_roll, grappling_block_roll, \
+                             IMPROVE_POSITION_BANDS)
         # apply the position changes
-        character.db.info['Position'] = c_grappling_status_list[0][c_grappling_status_list[1]]
-        target.db.info['Position'] = t_grappling_status_list[0][t_grappling_status_list[1]]
+        character.info['Position'], target.info['Position'] = \
+            gr.resolve_positions(gr.IMPROVE_POSITION, character.info['Position'], \
+                                 target.info['Position'], band)
+        log_file(f"Improve grappling pos result: {gr.OUTCOME_BANDS[band]} Attacker: {character.info['Position']} Defender: {target.info['Position']}", \
+                 filename='combat_step.log')
         log_file("calling msg func for improve grappling position", \
                  filename='combat_step.log')
-        msg_grap_improve_pos(character, target)
+        # the positions can change again before the round's messaging goes
+        # out, so send the ones this action ended with
+        self.queue_msg(msg_grap_improve_pos, character, target, \
+                       character.info['Position'], target.info['Position'])
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
                  filename='combat_step.log')
         self.stop()
@@ -421,45 +372,37 @@ class CAOGrapplingUnarmedStrikesNormal(CombatActionObject):
         log_file(f"{self.key} start of grappling unarmed strikes normal action execution.", filename='combat_step.log')
         character = self.obj
         # loop through attacks
-        for i in range(character.ndb.num_of_actions):
+        for i in range(character.combat_state.num_of_actions):
             log_file(f"Executing grappling unarmed strike normal number: {i+1} for {character.name}", \
                      filename='combat_step.log')
             attack_hit = round(roll((character.talents.unarmed_striking.actual * \
-                              character.ndb.groundwork_mod), 'flat', \
+                              character.combat_state.groundwork_mod), 'flat', \
                               character.ability_scores.Dex, character.talents.unarmed_striking))
             log_file(f"{character.name} attack roll: {attack_hit}", filename='combat.log')
             # use up stamina to attack
-            character.traits.sp.current -= (12 / character.ndb.enc_mod)
+            self.spend(character, 'sp', (12 / character.combat_state.enc_mod))
             # get defender rolls
-            defender = character.db.info['Target']
+            defender = character.info['Target']
             log_file(f"doing defensive rolls for {defender.name}.", \
                      filename='combat_step.log')
             dodge_roll = round(roll((defender.ability_scores.Dex.actual * \
-                               defender.ndb.groundwork_mod) * .9, 'flat', \
+                               defender.combat_state.groundwork_mod) * .9, 'flat', \
                                defender.ability_scores.Dex))
             block_roll = round(roll((defender.ability_scores.Str.actual * \
-                               defender.ndb.groundwork_mod) * .9, 'flat', \
+                               defender.combat_state.groundwork_mod) * .9, 'flat', \
                                defender.ability_scores.Str))
             log_file(f"{defender.name} Dodge: {dodge_roll}\tBlock: {block_roll}", \
                      filename='combat.log')
             # use up some stamina to defend
-            defender.traits.sp.current -= (5 / defender.ndb.enc_mod)
+            self.spend(defender, 'sp', (5 / defender.combat_state.enc_mod))
             if dodge_roll > attack_hit:
-                msg_dodge(character, defender)
+                self.queue_msg(msg_dodge, character, defender)
             elif block_roll > attack_hit:
-                msg_block(character, defender)
+                self.queue_msg(msg_block, character, defender)
             else:
-                # TODO: Move this to apply damage function!
-                damage = roll(character.ability_scores.Str.actual / 2, 'very flat', character.ability_scores.Str)
-                defender.traits.hp.current -= damage
-                log_file(f"{character.name} hit {defender.name} for {damage} damage. \
-                         They have {defender.traits.hp.actual} hps left.", \
-                         filename='combat.log')
-                log_file("calling combat msging for unarmed attacks", filename='combat_step.log')
-                msg_grappling_unarmed_normal(character, defender, damage)
-                if defender.traits.hp.actual < 1:
-                    # TODO: Implement death - for now we'll just flee
-                    defender.execute_cmd('flee')
+                critical_hit = attack_hit > dodge_roll + block_roll
+                log_file("queueing unarmed strike for the round's damage batch", filename='combat_step.log')
+                self.queue_hit(defender, 'unarmed', critical_hit, msg_grappling_unarmed_normal)
         log_file(f"Grappling Unarmed Strikes normal complete for {character.name}.", \
                  filename='combat_step.log')
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
@@ -475,11 +418,11 @@ class CAOGrapplingSubmission(CombatActionObject):
         "Executes the combat action"
         log_file(f"{self.key} start of grappling submission action execution.", filename='combat_step.log')
         character = self.obj
-        target = character.db.info['Target']
-        character.traits.sp.current -= (15 / character.ndb.enc_mod)
-        target.traits.sp.current -= (12 / target.ndb.enc_mod)
-        grappling_attack_dice = character.talents.grappling.actual * character.ndb.groundwork_mod
-        grappling_block_dice = target.talents.grappling.actual * target.ndb.groundwork_mod
+        target = character.info['Target']
+        self.spend(character, 'sp', (15 / character.combat_state.enc_mod))
+        self.spend(target, 'sp', (12 / target.combat_state.enc_mod))
+        grappling_attack_dice = character.talents.grappling.actual * character.combat_state.groundwork_mod
+        grappling_block_dice = target.talents.grappling.actual * target.combat_state.groundwork_mod
         grappling_attack_roll = round(roll(grappling_attack_dice, 'flat', \
                                 character.ability_scores.Str, character.ability_scores.Dex, \
                                 character.talents.grappling))
@@ -488,24 +431,16 @@ class CAOGrapplingSubmission(CombatActionObject):
                                 target.talents.grappling))
         log_file(f"Grappling submission. Attack Roll: {grappling_attack_roll} Block Roll: {grappling_block_roll}", \
                  filename='combat.log')
-        if grappling_attack_roll > grappling_block_roll:
-            # TODO: Move this to apply damage function!
-            damage = roll(character.ability_scores.Str.actual / 2, 'very flat', character.ability_scores.Str)
+        if opposed_check(grappling_attack_roll, grappling_block_roll, \
+                         SUBMISSION_BANDS) == gr.SUCCESS:
             # note that submission damage is primarily to stamina. Attacker
             # will 'submit' the defender if they deplete their stamina
-            target.traits.sp.current -= damage * .75
-            target.traits.hp.current -= damage * .25
-            log_file(f"{character.name} did a submission on {target.name}. \
-                     They have {target.traits.sp.actual} sps left. \
-                     They have {target.traits.hp.actual} hps left.", \
+            log_file(f"{character.name} did a submission on {target.name}.", \
                      filename='combat.log')
-            success = True
+            self.queue_hit(target, 'submission', False, msg_grappling_sub, True)
         else:
             # failed submision attempt
-            success = False
-            damage = 0
-        log_file("calling combat msging for grappling submission attacks", filename='combat_step.log')
-        msg_grappling_sub(character, target, damage, success)
+            self.queue_msg(msg_grappling_sub, character, target, 0, False)
         log_file(f"Grappling submission attempt complete for {character.name}.", \
                  filename='combat_step.log')
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
@@ -524,24 +459,26 @@ class CAOGrapplingEscape(CombatActionObject):
         character = self.obj
         # figure out who we're escaping from
         targeted_by_list = []
-        log_file(f"Checking combatant list: {character.ndb.combat_handler.db.characters}", \
+        log_file(f"Checking combatant list: {character.ndb.combat_handler.characters}", \
                  filename='combat_step.log')
-        for combatant in character.ndb.combat_handler.db.characters.values():
-            if combatant != character and combatant.db.info['Target'] == character:
+        for combatant in character.ndb.combat_handler.characters.values():
+            if combatant != character and combatant.info['Target'] == character:
                 targeted_by_list.append(combatant)
         if len(targeted_by_list) == 0:
             # no one is targeting character, easy escape to the feet
             success = 'default'
             defender = None
+            character.info['Position'] = 'standing'
+            character.combat_state.range = 'melee'
         elif len(targeted_by_list) == 1:
             # we're grappling with just the one person
             defender = targeted_by_list[0]
             log_file(f"defender: {defender.name} will try top prevent escape.", \
                      filename='combat_step.log')
-            escape_roll = round(roll((character.talents.grappling.actual * character.ndb.groundwork_mod), \
+            escape_roll = round(roll((character.talents.grappling.actual * character.combat_state.groundwork_mod), \
                           'flat', character.talents.grappling, \
                           character.ability_scores.Str, character.ability_scores.Dex))
-            escape_defense = round(roll((defender.ndb.groundwork_mod * 100), \
+            escape_defense = round(roll((defender.combat_state.groundwork_mod * 100), \
                              'flat', defender.talents.grappling, \
                              defender.ability_scores.Str, defender.ability_scores.Dex))
         else:
@@ -549,29 +486,30 @@ class CAOGrapplingEscape(CombatActionObject):
             defender = targeted_by_list[0] # TODO: Make this smarter for multi-combat
             log_file(f"defender: {defender.name} will try top prevent escape.", \
                      filename='combat_step.log')
-            escape_roll = round(roll((character.talents.grappling.actual * character.ndb.groundwork_mod), \
+            escape_roll = round(roll((character.talents.grappling.actual * character.combat_state.groundwork_mod), \
                           'flat', character.talents.grappling, \
                           character.ability_scores.Str, character.ability_scores.Dex))
             escape_def_bonus = 1 + (.2 * len(targeted_by_list))
             for combatant in targeted_by_list:
-                escape_def_bonus *= combatant.ndb.groundwork_mod
+                escape_def_bonus *= combatant.combat_state.groundwork_mod
             escape_defense = round(roll((escape_def_bonus * 100), \
                              'flat'))
         # determine outcome, apply position and range changes
-        log_file(f"Grappling escape rolls - Escaper: {character.name} {escape_roll} Defending: {defender.name} {escape_defense}", \
-                 filename='combat.log')
-        if escape_roll > escape_defense:
-            success = 'success'
-            character.db.info['Position'] = 'standing'
-            character.ndb.range = 'melee'
-            for combatant in targeted_by_list:
-                combatant.db.info['Position'] = 'standing'
-                if combatant.ndb.range == 'grapple':
-                    combatant.ndb.range = 'melee'
-        else:
-            success = 'fail'
+        if defender is not None:
+            log_file(f"Grappling escape rolls - Escaper: {character.name} {escape_roll} Defending: {defender.name} {escape_defense}", \
+                     filename='combat.log')
+            if opposed_check(escape_roll, escape_defense, ESCAPE_BANDS) == gr.SUCCESS:
+                success = 'success'
+                character.info['Position'] = 'standing'
+                character.combat_state.range = 'melee'
+                for combatant in targeted_by_list:
+                    combatant.info['Position'] = 'standing'
+                    if combatant.combat_state.range == 'grapple':
+                        combatant.combat_state.range = 'melee'
+            else:
+                success = 'fail'
         log_file("calling combat msging for grappling escape", filename='combat_step.log')
-        msg_grappling_escape(character, defender, success)
+        self.queue_msg(msg_grappling_escape, character, defender, success)
         log_file(f"Grappling escape attempt complete for {character.name}.", \
                  filename='combat_step.log')
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
@@ -588,46 +526,42 @@ class CAOGrapplingMeleeWeaponStrike(CombatActionObject):
         log_file(f"{self.key} start of grappling melee weapon strike action execution.", \
                  filename='combat_step.log')
         character = self.obj
-        defender = character.db.info['Target']
+        defender = character.info['Target']
         shield_block_multiplier = check_sbm(defender)
         # loop through attacks
-        for i in range(character.ndb.num_of_actions):
+        for i in range(character.combat_state.num_of_actions):
             log_file(f"Executing grappling melee weapon strike number: {i+1} for {character.name}", \
                      filename='combat_step.log')
             attack_hit = round(roll((character.talents.melee_weapons.actual * \
-                              character.ndb.groundwork_mod), 'flat', \
+                              character.combat_state.groundwork_mod), 'flat', \
                               character.ability_scores.Dex, character.talents.melee_weapons))
             log_file(f"{character.name} attack roll: {attack_hit}", filename='combat.log')
             # use up stamina to attack
-            character.traits.sp.current -= (12 / character.ndb.enc_mod)
+            self.spend(character, 'sp', (12 / character.combat_state.enc_mod))
             # get defender rolls
-            defender = character.db.info['Target']
+            defender = character.info['Target']
             log_file(f"doing defensive rolls for {defender.name}.", \
                      filename='combat_step.log')
             dodge_roll = round(roll((defender.ability_scores.Dex.actual * \
-                               defender.ndb.groundwork_mod) * .9, 'flat', \
+                               defender.combat_state.groundwork_mod) * .9, 'flat', \
                                defender.ability_scores.Dex))
             block_roll = round(roll((defender.ability_scores.Str.actual * \
-                               defender.ndb.groundwork_mod) * .9 * \
+                               defender.combat_state.groundwork_mod) * .9 * \
                                shield_block_multiplier, 'flat', \
                                defender.ability_scores.Str))
             log_file(f"{defender.name} Dodge: {dodge_roll}\tBlock: {block_roll}", \
                      filename='combat.log')
             # use up some stamina to defend
-            defender.traits.sp.current -= (5 / defender.ndb.enc_mod)
+            self.spend(defender, 'sp', (5 / defender.combat_state.enc_mod))
             if dodge_roll > attack_hit:
-                msg_dodge(character, defender)
+                self.queue_msg(msg_dodge, character, defender)
             elif block_roll > attack_hit:
-                msg_block(character, defender)
+                self.queue_msg(msg_block, character, defender)
             else:
-                if attack_hit > dodge_roll + block_roll:
-                    critical_hit = True
-                else:
-                    critical_hit = False
-                # call damage func here
-                damage = apply_dam(character, defender, attack_type, critical_hit)
-                log_file("calling combat msging for melee weapon attacks", filename='combat_step.log')
-                msg_melee_weapons(character, defender, damage)
+                critical_hit = attack_hit > dodge_roll + block_roll
+                log_file("queueing grappling melee weapon strike for the round's damage batch", \
+                         filename='combat_step.log')
+                self.queue_hit(defender, 'melee_weapons', critical_hit, msg_melee_weapons)
         log_file(f"Grappling melee weapon strikes complete for {character.name}.", \
                  filename='combat_step.log')
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
@@ -644,48 +578,42 @@ class CAOMeleeWeaponStrike(CombatActionObject):
         log_file(f"{self.key} start of melee weapon strike action execution.", \
                  filename='combat_step.log')
         character = self.obj
-        defender = character.db.info['Target']
+        defender = character.info['Target']
         shield_block_multiplier = check_sbm(defender)
         # loop through attacks
-        for i in range(character.ndb.num_of_actions):
+        for i in range(character.combat_state.num_of_actions):
             log_file(f"Executing melee weapon strike number: {i+1} for {character.name}", \
                      filename='combat_step.log')
             attack_hit = round(roll((character.talents.melee_weapons.actual * \
-                              character.ndb.footwork_mod), 'flat', \
+                              character.combat_state.footwork_mod), 'flat', \
                               character.ability_scores.Dex, character.talents.melee_weapons))
             log_file(f"{character.name} attack roll: {attack_hit}", filename='combat.log')
             # use up stamina to attack
-            character.traits.sp.current -= (12 / character.ndb.enc_mod)
+            self.spend(character, 'sp', (12 / character.combat_state.enc_mod))
             # get defender rolls
-            defender = character.db.info['Target']
+            defender = character.info['Target']
             log_file(f"doing defensive rolls for {defender.name}.", \
                      filename='combat_step.log')
             dodge_roll = round(roll((defender.ability_scores.Dex.actual * \
-                               defender.ndb.footwork_mod) * .9, 'flat', \
+                               defender.combat_state.footwork_mod) * .9, 'flat', \
                                defender.ability_scores.Dex))
             block_roll = round(roll((defender.ability_scores.Str.actual * \
-                               defender.ndb.footwork_mod) * .9 * \
+                               defender.combat_state.footwork_mod) * .9 * \
                                shield_block_multiplier, 'flat', \
                                defender.ability_scores.Str))
             log_file(f"{defender.name} Dodge: {dodge_roll}\tBlock: {block_roll}", \
                      filename='combat.log')
             # use up some stamina to defend
-            defender.traits.sp.current -= (5 / defender.ndb.enc_mod)
+            self.spend(defender, 'sp', (5 / defender.combat_state.enc_mod))
             if dodge_roll > attack_hit:
-                msg_dodge(character, defender)
+                self.queue_msg(msg_dodge, character, defender)
             elif block_roll > attack_hit:
-                msg_block(character, defender)
+                self.queue_msg(msg_block, character, defender)
             else:
-                if attack_hit > dodge_roll + block_roll:
-                    critical_hit = True
-                else:
-                    critical_hit = False
-                # call damage func here
-                attack_type = 'melee_weapons'
-                log_file("calling apply damage for melee weapon strike", filename='combat_step.log')
-                damage = apply_dam(character, defender, attack_type, critical_hit)
-                log_file("calling combat msging for melee weapon attacks", filename='combat_step.log')
-                msg_melee_weapons(character, defender, damage)
+                critical_hit = attack_hit > dodge_roll + block_roll
+                log_file("queueing melee weapon strike for the round's damage batch", \
+                         filename='combat_step.log')
+                self.queue_hit(defender, 'melee_weapons', critical_hit, msg_melee_weapons)
         log_file(f"Grappling melee weapon strikes complete for {character.name}.", \
                  filename='combat_step.log')
         log_file(f"end of attacks - Combat action Script {self.key} deleting self", \
@@ -694,6 +622,22 @@ class CAOMeleeWeaponStrike(CombatActionObject):
 
 
 # spawner func to instantiate the correct action type
+# curated action: combat action object typeclass that carries it out
+CAO_TYPECLASSES = {
+    'unarmed_strike_normal': "typeclasses.combat_actions.CAOUnarmedStrikesNormal",
+    'yield': "typeclasses.combat_actions.CAOYield",
+    'flee': "typeclasses.combat_actions.CAOFlee",
+    'grapple_takedown': "typeclasses.combat_actions.CAOGrapplingTakedown",
+    'grapple_improve_position': "typeclasses.combat_actions.CAOGrapplingImprovePosition",
+    'grapple_unarmed_strike_normal': "typeclasses.combat_actions.CAOGrapplingUnarmedStrikesNormal",
+    'grapple_attempt_submission': "typeclasses.combat_actions.CAOGrapplingSubmission",
+    'grapple_escape': "typeclasses.combat_actions.CAOGrapplingEscape",
+    'grapple_melee_weapon_strike': "typeclasses.combat_actions.CAOGrapplingMeleeWeaponStrike",
+    'melee_weapon_strike': "typeclasses.combat_actions.CAOMeleeWeaponStrike",
+}
+
+
+@METRICS.timed('combat.spawn_action')
 def spawn_combat_action_object(character, action_curated):
     """
     This function chooses which combat action object type to spawn based upon
@@ -702,26 +646,10 @@ def spawn_combat_action_object(character, action_curated):
     """
     log_file(f"Start of spawn_combat_action_object func for {character.name}", \
              filename='combat_step.log')
-    if action_curated == 'unarmed_strike_normal':
-        cao = create_script("typeclasses.combat_actions.CAOUnarmedStrikesNormal", obj=character)
-    elif action_curated == 'yield':
-        cao = create_script("typeclasses.combat_actions.CAOYield", obj=character)
-    elif action_curated == 'flee':
-        cao = create_script("typeclasses.combat_actions.CAOFlee", obj=character)
-    elif action_curated == 'grapple_takedown':
-        cao = create_script("typeclasses.combat_actions.CAOGrapplingTakedown", obj=character)
-    elif action_curated == 'grapple_improve_position':
-        cao = create_script("typeclasses.combat_actions.CAOGrapplingImprovePosition", obj=character)
-    elif action_curated == 'grapple_unarmed_strike_normal':
-        cao = create_script("typeclasses.combat_actions.CAOGrapplingUnarmedStrikesNormal", obj=character)
-    elif action_curated == 'grapple_attempt_submission':
-        cao = create_script("typeclasses.combat_actions.CAOGrapplingSubmission", obj=character)
-    elif action_curated == 'grapple_escape':
-        cao = create_script("typeclasses.combat_actions.CAOGrapplingEscape", obj=character)
-    elif action_curated == 'grapple_melee_weapon_strike':
-        cao = create_script("typeclasses.combat_actions.CAOGrapplingMeleeWeaponStrike", obj=character)
-    elif action_curated == 'melee_weapon_strike':
-        cao = create_script("typeclasses.combat_actions.CAOMeleeWeaponStrike", obj=character)
+    typeclass = CAO_TYPECLASSES.get(action_curated)
+    if typeclass:
+        create_script(typeclass, obj=character)
+        METRICS.incr('scripts.created')
     else:
         log_file(f"Error in spawn_combat_action_object func. \
                  character: {character.name} action: {action_curated}. ", \
@@ -1,49 +1,171 @@
 """
-This script will orchastrate combat for any number of participants that are
-co-located in a single room. Most of the combat logic will be located elsewhere
-in different files. The script will mostly just hold info about the combatants'
-combat modifiers and call the functions for moving through combat.
+The combat handler will orchastrate a fight between any number of participants
+that are co-located in a single room. Most of the combat logic will be located
+elsewhere in different files. The handler will mostly just hold info about the
+combatants' combat modifiers and call the functions for moving through combat.
+
+Combat handlers are plain in-memory objects. Their rounds are run by the global
+combat scheduler (see typeclasses/combat_scheduler.py), which also snapshots
+them over a server reload.
+
+Each fight draws its random numbers from its own seeded streams (see
+world/rng.py) and records its rounds (see world/combat_recorder.py), so any
+fight can be replayed later with world/combat_replay.py.
 """
-import random
-from evennia import DefaultScript
+from collections import deque
+from evennia.utils import lazy_property
 from evennia.utils.logger import log_file
-from world.combat_rules import combat_action_picker
+from world.combat_rules import combat_action_picker, apply_damage_batch, \
+                               check_for_fallen
 from typeclasses.combat_actions import spawn_combat_action_object
 from world.dice_roller import return_a_roll as roll
-
-class CombatHandler(DefaultScript):
-    """
-    This implements the combat handler.
+from world.resource_ledger import ResourceLedger
+from world.rng import FightRandom, RESOLVE_STEP
+from world.combat_recorder import CombatRecorder, COMBAT_RECORDING
+from world.metrics import METRICS
+
+# actions that stay at the front of a combatant's queue until they succeed
+PRIORITY_ACTIONS = ('flee', 'yield', 'disengage')
+
+
+class ActionQueue(object):
+    """In-memory queue of a combatant's combat actions.
+    Priority actions (see PRIORITY_ACTIONS) are kept ahead of every other
+    action and are not popped off, so they are tried again every round until
+    they succeed and end the fight for the combatant.
+    Methods:
+        push(action): queue an action to be taken next
+        push_back(action): queue an action to be taken after all others
+        next(default): returns the action for the round
+        snapshot(): list of the queued actions, in order
     """
-    # standard script hooks
-    def at_script_creation(self):
-        "Called when script is first created"
+    __slots__ = ('priority', 'actions')
+
+    def __init__(self, actions=()):
+        self.priority = deque()
+        self.actions = deque()
+        for action in actions:
+            self.push_back(action)
+
+    def __len__(self):
+        """Return number of queued actions."""
+        return len(self.priority) + len(self.actions)
+
+    def __iter__(self):
+        """Iterate over the queued actions, in order."""
+        yield from self.priority
+        yield from self.actions
+
+    def __repr__(self):
+        return f"ActionQueue({list(self)})"
+
+    def push(self, action):
+        """Queue an action to be taken before the other queued actions."""
+        if action in PRIORITY_ACTIONS:
+            if action not in self.priority:
+                self.priority.appendleft(action)
+        else:
+            self.actions.appendleft(action)
+
+    def push_back(self, action):
+        """Queue an action to be taken after the other queued actions."""
+        if action in PRIORITY_ACTIONS:
+            if action not in self.priority:
+                self.priority.append(action)
+        else:
+            self.actions.append(action)
+
+    def next(self, default):
+        """Returns the action for the round, or `default` if none are queued."""
+        if self.priority:
+            # for flee type actions, we won't pop it off. keep trying until we succeed
+            return self.priority[0]
+        if self.actions:
+            return self.actions.popleft()
+        return default
+
+    def snapshot(self):
+        """Returns the queued actions as a list, in order."""
+        return list(self)
 
-        self.key = "combat_handler_%i" % random.randint(1, 1000000)
-        self.desc = "handles combat"
-        self.interval = 5  # five second timeout
-        self.start_delay = False
-        self.persistent = False
 
+class CombatHandler(object):
+    """
+    This implements the combat handler for a single fight.
+    Args:
+        scheduler (CombatScheduler): the scheduler running this fight's rounds
+        key (str): unique key of the fight
+        room (Room): where the fight is happening
+        seed (int, optional): seed of the fight's random streams
+    """
+    def __init__(self, scheduler, key, room, seed=None):
+        self.scheduler = scheduler
+        self.key = key
+        self.room = room
+        self.active = True
         # store all combatants
-        self.db.characters = {}
+        self.characters = {}
         # store all actions for each turn
-        self.db.turn_actions = {}
-        # store all temp vars for the characters
-        # NOTE: to begin with, these will be stored on the character, but
-        # later we will move these to the handler or to the mini-script
-        # for carrying out each attack.
-        self.db.char_temp_vars = {}
+        self.turn_actions = {}
+        # combat state of each combatant, see world/combatant_state.py
+        self.states = {}
         # keep track of round # so it is easier to debug
-        self.db.round_count = 1
+        self.round_count = 1
+        # messaging and hits queued up during the round
+        self.round_events = []
+        # seeded random streams and the recording of the fight
+        self.random = FightRandom(seed)
+        self.recorder = CombatRecorder(self.random.seed) if COMBAT_RECORDING else None
+        self.in_round = False
+
+    def __str__(self):
+        return self.key
+
+    @property
+    def name(self):
+        return self.key
+
+    @lazy_property
+    def ledger(self):
+        """Costs to the combatants' gauges for the current round."""
+        return ResourceLedger()
+
+    def snapshot(self):
+        """Returns the fight's state in a form that can be saved to the db."""
+        return {'key': self.key, 'room': self.room, \
+                'characters': list(self.characters.values()), \
+                'turn_actions': {dbref: queue.snapshot() for dbref, queue \
+                                 in self.turn_actions.items()}, \
+                'round_count': self.round_count, 'seed': self.random.seed}
+
+    @classmethod
+    def from_snapshot(cls, scheduler, snapshot):
+        """
+        Rebuilds a fight from a snapshot after a server reload, and re-assigns
+        it to all of its characters. Returns None if the fight is over.
+        """
+        characters = [character for character in snapshot['characters'] \
+                      if character and character.pk]
+        if len(characters) < 2:
+            return None
+        fight = cls(scheduler, snapshot['key'], snapshot['room'], \
+                    seed=snapshot.get('seed'))
+        fight.round_count = snapshot['round_count']
+        for character in characters:
+            dbref = character.id
+            fight.characters[dbref] = character
+            fight.turn_actions[dbref] = ActionQueue(snapshot['turn_actions'].get(dbref, ()))
+            fight._init_character(character)
+        return fight
 
 
     def _init_character(self, character):
         """
-        This initializes handler back-reference
+        This initializes handler back-reference, combat state
         and combat cmdset on a character
         """
         character.ndb.combat_handler = self
+        self.states[character.id] = character.combat_state
         character.cmdset.add("commands.combat_commands.CombatCmdSet")
         log_file(f"Added backref for {self.name} to {character.name}.", \
                  filename='combat_step.log')
@@ -52,62 +174,65 @@ class CombatHandler(DefaultScript):
         character.calc_status_modifiers()
         character.calc_footwork_and_groundwork_mods()
         character.calculate_equipment_bonuses()
+        if self.recorder:
+            self.recorder.add_combatant(character)
 
 
     def _cleanup_character(self, character):
         """
         Remove character from handler and clean
-        it of the back-reference and cmdset
+        it of the back-reference, combat state and cmdset
         """
         log_file(f"Starting cleanup for {character.name}.", \
                  filename='combat_step.log')
         dbref = character.id
         del character.ndb.combat_handler
-        del character.ndb.hp_mod
-        del character.ndb.sp_mod
-        del character.ndb.cp_mod
-        del character.ndb.enc_mod
-        del character.ndb.groundwork_mod
-        del character.ndb.footwork_mod
-        del character.ndb.range
-        del character.ndb.position_mod
-        del character.ndb.num_of_actions
-        del self.ndb.eq_damage_bonus
-        del self.ndb.eq_phy_arm
-        del self.ndb.eq_men_arm
+        character.combat_state.reset()
+        self.states.pop(dbref, None)
         character.cmdset.delete("commands.combat_commands.CombatCmdSet")
-        character.db.info['In Combat'] = False
-        character.db.info['Position'] = 'standing'
+        character.flush_learning()
+        character.info['In Combat'] = False
+        character.info['Position'] = 'standing'
         character.execute_cmd("rprom")
         log_file(f"Cleanup for {character.name} is complete.", \
                  filename='combat_step.log')
 
 
-    def at_start(self):
-        """
-        This is called on first start but also when the script is restarted
-        after a server reboot. We need to re-assign this combat handler to
-        all characters as well as re-assign the cmdset.
-        """
-        for character in self.db.characters.values():
-            self._init_character(character)
-
-
-    def at_stop(self):
-        "Called just before the script is stopped/destroyed."
+    def stop(self):
+        "Ends the fight and cleans up all of its characters."
+        if not self.active:
+            return
+        self.active = False
+        self.scheduler.remove_fight(self)
         log_file("start of char cleanup func", filename='combat_step.log')
-        for character in list(self.db.characters.values()):
-            # note: the list() call above disconnects list from database
+        for character in list(self.characters.values()):
             self._cleanup_character(character)
-        del self.db.characters[dbref]
-        del self.db.turn_actions[dbref]
-        del self.db.char_temp_vars[dbref]
+        self.characters = {}
+        self.turn_actions = {}
+        self.states = {}
+        if not self.in_round:
+            # otherwise saved at the end of the round
+            self.save_recording()
+
+
+    def save_recording(self):
+        "Writes the fight's recording to disk, see world/combat_recorder.py."
+        if not self.recorder or self.recorder.first_round is None:
+            return
+        path = self.recorder.save(f"{self.key}-{self.random.seed:016x}-r{self.recorder.first_round}")
+        if path:
+            log_file(f"Saved recording of {self.key} to {path}.", filename='combat_step.log')
+
+
+    def spawn_action(self, character, action_curated):
+        "Spawns the combat action object that carries out a curated action."
+        spawn_combat_action_object(character, action_curated)
 
 
+    @METRICS.timed('combat.round')
     def at_repeat(self):
         """
-        This is called every self.interval seconds (turn timeout) or
-        when force_repeat is called.
+        Called by the combat scheduler once every combat round.
 
         At repeat, the plan is to use up an action from the queue of actions
         for each character. The action will then be converted into a smaller
@@ -115,15 +240,26 @@ class CombatHandler(DefaultScript):
         a character wanting to grapple will create a grapple action script,
         which will then carry out the action and self delete.
 
+        Every character's action is picked and carried out with the fight's
+        random streams for that step of the round, and recorded.
         """
-        for character in self.db.characters.values():
-            dbref = character.id
+        self.in_round = True
+        fighters = list(self.characters.values())
+        for step, character in enumerate(fighters):
+            if not self.active:
+                # the fight was ended during the round
+                break
+            if character.id not in self.characters:
+                # removed from the fight earlier in the round
+                continue
             # update the char variables
             log_file("*********************************************************************", \
                      filename='combat.log')
-            log_file(f"START OF ROUND: {self.db.round_count} FOR {character.name}", \
+            log_file(f"START OF ROUND: {self.round_count} FOR {character.name}", \
                      filename='combat_step.log')
             self.reconcile_range_and_position(character)
+            if not self.active:
+                break
             self._refresh_combat_temp_vars(character)
             log_file(f"calling combat_validity func for {character.name}", \
                      filename='combat_step.log')
@@ -133,43 +269,58 @@ class CombatHandler(DefaultScript):
             if combat_valid == False:
                 log_file(f"combat validity checks failed for {character.name}.", \
                          filename='combat_step.log')
-                self._cleanup_character(self, character)
+                self.remove_character(character)
+                continue
             else:
                 log_file(f"combat validity checks passed for {character.name}.", \
                          filename='combat_step.log')
             log_file("calling combat action picker func", filename='combat_step.log')
             round_action = self.remove_action(character)
-            action_curated = combat_action_picker(character, round_action)
-            log_file(f"{character.name} taking curated action: {action_curated}", \
-                     filename='combat_step.log')
-            spawn_combat_action_object(character, action_curated)
+            if self.recorder:
+                self.recorder.record_step(self.round_count, step, character, \
+                                          round_action, self.characters.values())
+            with self.random.active(self.round_count, step):
+                action_curated = combat_action_picker(character, round_action)
+                log_file(f"{character.name} taking curated action: {action_curated}", \
+                         filename='combat_step.log')
+                self.spawn_action(character, action_curated)
             log_file(f"END OF AT_REPEAT FOR {character.name}.", filename='combat_step.log')
-        self.db.round_count += 1
+        with self.random.active(self.round_count, RESOLVE_STEP):
+            self.resolve_round_events()
+        if self.recorder:
+            self.recorder.record_gauges(self.round_count, fighters)
+        self.round_count += 1
+        self.in_round = False
+        if not self.active:
+            # the fight ended during the round
+            self.save_recording()
 
 
     # combat handler methods
     def add_character(self, character):
         "Add combatant to handler"
         dbref = character.id
-        self.db.characters[dbref] = character
-        self.db.turn_actions[dbref] = [(character.db.info['Default Attack'])]
-        self.db.char_temp_vars[dbref] = [] # to be populated later at tick
+        self.characters[dbref] = character
+        self.turn_actions[dbref] = ActionQueue()
         log_file(f"Added {character.name} to {self.name}", \
                  filename='combat_step.log')
         # set up back-reference
         self._init_character(character)
         # set character to be in combat
-        character.db.info['In Combat'] = True
+        character.info['In Combat'] = True
 
 
     def remove_character(self, character):
         "Remove combatant from handler"
-        if character.id in self.db.characters:
+        dbref = character.id
+        if dbref in self.characters:
             self._cleanup_character(character)
-        if not self.db.characters:
+            del self.characters[dbref]
+            del self.turn_actions[dbref]
+        if not self.characters:
             # if no more characters in battle, kill this handler
             self.stop()
-        elif len(self.db.characters) < 2:
+        elif len(self.characters) < 2:
             # less than 2 chars in combat, ending combat
             log_file("less than 2 characters in combat. killing handler", \
                       filename='combat_step.log')
@@ -178,7 +329,7 @@ class CombatHandler(DefaultScript):
 
     def msg_all(self, message):
         "Send message to all combatants"
-        for character in self.db.characters.values():
+        for character in self.characters.values():
             character.msg(message)
 
 
@@ -190,14 +341,14 @@ class CombatHandler(DefaultScript):
          character - the character performing the action
          target - the target character or None
 
-        actions are stored in a dictionary keyed to each character, each
-        of which holds a list of max 2 actions. An action is stored as
-        a tuple (character, action, target).
+        actions are stored in an in-memory ActionQueue keyed to each
+        character. The newest action is taken first, but priority actions
+        like flee and yield always go ahead of everything else.
         """
         log_file(f"{self.key} - Start of add_action method for {character.name}.",
                  filename='combat_step.log')
         dbref = character.id
-        self.db.turn_actions[dbref].insert(0, action)
+        self.turn_actions[dbref].push(action)
         log_file(f"Added action: {action} for {character.name}", \
                  filename='combat_step.log')
         return
@@ -205,27 +356,56 @@ class CombatHandler(DefaultScript):
 
     def remove_action(self, character):
         """
-        Pops off the action in the zero position if appropriate.
-        Returns the desired action for the round.
+        Pops off the action at the front of the queue if appropriate.
+        Returns the desired action for the round, falling back to the
+        character's default attack when nothing is queued.
         """
         log_file("start of remove action func", filename='combat_step.log')
         dbref = character.id
-        if len(self.db.turn_actions[dbref]) > 0:
-            log_file(f"Action at top of queue: {self.db.turn_actions[dbref][0]}", \
+        log_file(f"Actions in queue: {self.turn_actions[dbref]}", \
                  filename='combat_step.log')
-        else:
-            log_file(f"No Actions in queue: {self.db.turn_actions[dbref]}", \
+        action = self.turn_actions[dbref].next(character.info['Default Attack'])
+        log_file(f"Returning action: {action}", filename='combat_step.log')
+        return action
+
+
+    def queue_round_event(self, callback, hit=None):
+        """
+        Called by the combat action objects to queue up messaging and hits
+        for the round. Hits are not applied when they land; all of the hits
+        of the round are applied together by resolve_round_events.
+
+         callback - called with the damage done if there is a hit, otherwise
+                    called with no arguments
+         hit - a combat_rules.Hit or None
+        """
+        self.round_events.append((callback, hit))
+
+
+    def resolve_round_events(self):
+        """
+        Works out every hit of the round in one damage batch and commits it
+        with the rest of the round's costs on the ledger, one write per
+        character. Then sends the queued messaging in the order it happened
+        and checks if anyone has fallen.
+        """
+        events = self.round_events
+        self.round_events = []
+        hits = [hit for callback, hit in events if hit is not None]
+        log_file(f"Round: {self.round_count} applying {len(hits)} hits.", \
                  filename='combat_step.log')
-            return character.db.info['Default Attack']
-        if self.db.turn_actions[dbref][0] == character.db.info['Default Attack']:
-            return character.db.info['Default Attack']
-        elif self.db.turn_actions[dbref][0] in ['flee', 'yield', 'disengage']:
-            # for flee type actions, we won't pop it off. keep trying until we succeed
-            return self.db.turn_actions[dbref][0]
-        else:
-            popped_action = self.db.turn_actions[dbref].pop(0)
-            log_file(f"Returning action: {popped_action}", filename='combat_step.log')
-            return popped_action
+        damages = iter(apply_damage_batch(hits, check_health=False, ledger=self.ledger))
+        self.ledger.commit()
+        for callback, hit in events:
+            if hit is None:
+                callback()
+            else:
+                callback(next(damages))
+        # only check for fallen defenders once the messaging is out
+        check_for_fallen(list({hit.defender.id: hit.defender for hit in hits}.values()))
+        # save what everyone learned this round
+        for character in list(self.characters.values()):
+            character.flush_learning()
 
 
     def _refresh_combat_temp_vars(self, character):
@@ -233,36 +413,37 @@ class CombatHandler(DefaultScript):
         Refreshes the temp variables related to combat and/or applies variables on
         a character for the first time.
         """
-        log_file(f"Round: {self.db.round_count} Refreshing temp variables for: {character.name}", \
+        log_file(f"Round: {self.round_count} Refreshing temp variables for: {character.name}", \
                  filename='combat_step.log')
         # check if the action needs to be changed to a flee action
-        log_file(f"Round: {self.db.round_count} checking if attacker wants to flee or yield", filename='combat_step.log')
+        log_file(f"Round: {self.round_count} checking if attacker wants to flee or yield", filename='combat_step.log')
         character.check_wimpyield() # TODO: update wimpyyield to justs end the action to queue
         # refresh the attacker's prompt
         character.execute_cmd('rprom')
         # refresh attacker and defender temp combat calcs
-        log_file(f"Round: {self.db.round_count} refreshing combat calcs", filename='combat_step.log')
+        log_file(f"Round: {self.round_count} refreshing combat calcs", filename='combat_step.log')
         character.calculate_encumberance()
         character.calc_status_modifiers()
         character.calc_footwork_and_groundwork_mods()
         character.calculate_equipment_bonuses()
         # set range if it hasn't been set
-        log_file(f"Round: {self.db.round_count} checking if range is set for {character.name}", filename='combat_step.log')
-        if character.ndb.range in ['out_of_range', 'ranged', 'melee', 'grapple']:
-            log_file(f"Range was set for {character.name} to {character.ndb.range}", \
+        log_file(f"Round: {self.round_count} checking if range is set for {character.name}", filename='combat_step.log')
+        if character.combat_state.range in ['out_of_range', 'ranged', 'melee', 'grapple']:
+            log_file(f"Range was set for {character.name} to {character.combat_state.range}", \
                      filename='combat_step.log')
         else:
-            character.ndb.range = 'out_of_range'
+            character.combat_state.range = 'out_of_range'
         # get num of attacks
         character.populate_num_combat_actions()
-        # character.db.info['Target'].calc_footwork_and_groundwork_mods()
-        log_file(f"Round: {self.db.round_count} {character.name} \n\tEnc: {character.ndb.enc_mod} \
-                 \n\thp_mod: {character.ndb.hp_mod} \tsp_mod: {character.ndb.sp_mod} \
-                 \n\tcp_mod: {character.ndb.cp_mod} \tpos_mod: {character.ndb.pos_mod} \
-                 \n\tfootwork: {character.ndb.footwork_mod} \tgroundwork: {character.ndb.groundwork_mod} \
-                 \n\teq_damage: {character.ndb.eq_damage} \tphy arm: {character.ndb.eq_phy_arm} \
-                 \n\tpsi armor: {character.ndb.eq_men_arm} \
-                 \n\tNum_of_actions: {character.ndb.num_of_actions}", \
+        # character.info['Target'].calc_footwork_and_groundwork_mods()
+        state = character.combat_state
+        log_file(f"Round: {self.round_count} {character.name} \n\tEnc: {state.enc_mod} \
+                 \n\thp_mod: {state.hp_mod} \tsp_mod: {state.sp_mod} \
+                 \n\tcp_mod: {state.cp_mod} \tpos_mod: {state.position_mod} \
+                 \n\tfootwork: {state.footwork_mod} \tgroundwork: {state.groundwork_mod} \
+                 \n\teq_damage: {state.eq_damage} \tphy arm: {state.eq_phy_arm} \
+                 \n\tpsi armor: {state.eq_men_arm} \
+                 \n\tNum_of_actions: {state.num_of_actions}", \
                  filename='combat.log')
 
 
@@ -274,25 +455,25 @@ class CombatHandler(DefaultScript):
         return True if script can move on to spawning combat action script for
         this round.
         """
-        log_file(f"Round: {self.db.round_count} Start of combat_validity func for {character.name}", \
+        log_file(f"Round: {self.round_count} Start of combat_validity func for {character.name}", \
                  filename='combat_step.log')
-        if character.db.info['Target'] == None:
+        if character.info['Target'] == None:
             log_file(f"Combat invalid. {character.name}'s target is None.", \
                      filename='combat_step.log')
             return False
-        elif character.db.info['Target'] not in self.db.characters.values():
+        elif character.info['Target'] not in self.characters.values():
             log_file(f"Combat invalid. {character.name}'s target is not in handler character list.", \
                      filename='combat_step.log')
             return False
-        elif character.db.info['In Combat'] == False:
+        elif character.info['In Combat'] == False:
             log_file(f"Combat invalid. {character.name} not In Combat.", \
                      filename='combat_step.log')
             return False
-        elif character.db.info['Target'].db.info['In Combat'] == False:
-            log_file(f"Combat invalid. {character.db.info['Target'].name} not In Combat.", \
+        elif character.info['Target'].info['In Combat'] == False:
+            log_file(f"Combat invalid. {character.info['Target'].name} not In Combat.", \
                      filename='combat_step.log')
             return False
-        elif character.location != character.db.info['Target'].location:
+        elif character.location != character.info['Target'].location:
             log_file(f"Combat invalid. {character.name} is not in same location as their target.", \
                      filename='combat_step.log')
             return False
@@ -410,13 +591,13 @@ class CombatHandler(DefaultScript):
                 'out_of_range': False,
             },
         }
-        if range_and_position_dict[character.db.info['Position']][character.ndb.range] == True:
+        if range_and_position_dict[character.info['Position']][character.combat_state.range] == True:
             log_file(f"reconcile check for range and positition for {character.name} passed.", \
                      filename='combat_step.log')
             return
         else:
             log_file(f"reconcile check for range and positition for {character.name} failed. See error log", \
                      filename='combat_step.log')
-            log_file(f"Round: {self.db.round_count} Range: {character.ndb.range} and Position: {character.db.info['Position']} for {character.name} do not match up. Killing {self.key}.", \
+            log_file(f"Round: {self.round_count} Range: {character.combat_state.range} and Position: {character.info['Position']} for {character.name} do not match up. Killing {self.key}.", \
                      filename='error.log')
             self.stop()
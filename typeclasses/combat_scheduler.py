@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+The combat scheduler is a single global script that owns the round clock for
+every fight on the server. Fights used to be CombatHandler scripts, each with
+its own timer and with their state saved to the db, which does not hold up
+with hundreds of fights going at once.
+
+Fights (see typeclasses/combat_handler.py) are now plain in-memory objects.
+The scheduler splits each combat round into COMBAT_SUB_TICKS sub-ticks and
+runs a share of the fights on each one so the load is spread out over the
+round. Fights are batched per room: every fight in a room runs on the same
+sub-tick, so a room's combat messaging all arrives together. New rooms are
+put on the sub-tick with the fewest fights.
+
+Fights are held in memory only. On a server reload the scheduler snapshots
+every fight to the db and restores them when it starts back up. On shutdown
+all fights are ended.
+
+**Use**
+    ```python
+    >>> from typeclasses.combat_scheduler import get_combat_scheduler
+    >>> fight = get_combat_scheduler().start_fight(character.location)
+    >>> fight.add_character(character)
+    ```
+"""
+from evennia import DefaultScript
+from evennia import create_script, search_script
+from evennia.utils import logger
+from evennia.utils.logger import log_file
+from typeclasses.combat_handler import CombatHandler
+from world.metrics import METRICS
+
+# key of the global combat scheduler script
+COMBAT_SCHEDULER_KEY = 'combat_scheduler'
+# seconds per combat round
+COMBAT_ROUND_TIME = 5
+# number of sub-ticks each round is split into
+COMBAT_SUB_TICKS = 5
+
+
+class CombatScheduler(DefaultScript):
+    """
+    Global script that runs the combat rounds of every fight on the server.
+    """
+    def at_script_creation(self):
+        "Called when script is first created"
+        self.key = COMBAT_SCHEDULER_KEY
+        self.desc = "Runs the combat rounds of all fights"
+        self.interval = COMBAT_ROUND_TIME / COMBAT_SUB_TICKS
+        self.start_delay = True
+        self.persistent = True # will survive reload
+        # fights saved over a reload
+        self.db.snapshots = []
+
+    def at_start(self):
+        """
+        Called on first start and when the server comes back from a reload.
+        Restores any fights that were snapshotted before the reload.
+        """
+        self._setup()
+        snapshots = self.db.snapshots or []
+        self.db.snapshots = []
+        for snapshot in snapshots:
+            fight = CombatHandler.from_snapshot(self, snapshot)
+            if fight is not None:
+                self._add_fight(fight)
+        if snapshots:
+            log_file(f"Restored {len(self.ndb.fights)} of {len(snapshots)} fights after reload.", \
+                     filename='combat_step.log')
+
+    def _setup(self):
+        "Set up the in-memory fight tables if they don't exist yet."
+        if self.ndb.fights is None:
+            # fight key: CombatHandler
+            self.ndb.fights = {}
+            # room id: {fight key: CombatHandler}
+            self.ndb.rooms = {}
+            # room id: sub-tick the room's fights run on
+            self.ndb.room_slots = {}
+            # number of fights on each sub-tick
+            self.ndb.slot_loads = [0] * COMBAT_SUB_TICKS
+            self.ndb.sub_tick = 0
+            self.ndb.next_fight_id = 1
+
+    def at_server_reload(self):
+        "Snapshot every fight to the db so they survive the reload."
+        self._setup()
+        self.db.snapshots = [fight.snapshot() for fight in self.ndb.fights.values()]
+
+    def at_server_shutdown(self):
+        "End every fight so no one is left stuck in combat."
+        self._setup()
+        for fight in list(self.ndb.fights.values()):
+            fight.stop()
+        self.db.snapshots = []
+
+    def at_repeat(self):
+        """
+        Called every sub-tick. Runs a round for every fight in the rooms on
+        this sub-tick.
+        """
+        self._setup()
+        METRICS.gauge('combat.fights', len(self.ndb.fights))
+        slot = self.ndb.sub_tick
+        self.ndb.sub_tick = (slot + 1) % COMBAT_SUB_TICKS
+        for room_id, slot_of_room in list(self.ndb.room_slots.items()):
+            if slot_of_room != slot:
+                continue
+            for fight in list(self.ndb.rooms.get(room_id, {}).values()):
+                if fight.active:
+                    self._run_round(fight)
+
+    def _run_round(self, fight):
+        """
+        Runs a round of one fight. A fight whose round raises is ended, so it
+        can't hold up the other fights or stop the round clock.
+        """
+        try:
+            fight.at_repeat()
+        except Exception:
+            logger.log_trace(f"Round {fight.round_count} of {fight.key} failed, ending the fight.")
+            fight.in_round = False
+            try:
+                if fight.active:
+                    # saves the recording too, now that the round is over
+                    fight.stop()
+                else:
+                    fight.save_recording()
+            except Exception:
+                logger.log_trace(f"Ending {fight.key} failed.")
+                self.remove_fight(fight)
+
+    # fight management
+    def start_fight(self, room):
+        "Creates a new fight in a room and starts running its rounds."
+        self._setup()
+        key = f"combat_handler_{self.ndb.next_fight_id}"
+        self.ndb.next_fight_id += 1
+        fight = CombatHandler(self, key, room)
+        self._add_fight(fight)
+        log_file(f"Started fight {key} in {room}.", filename='combat_step.log')
+        return fight
+
+    def _add_fight(self, fight):
+        "Adds a fight to its room's batch."
+        room_id = fight.room.id if fight.room else None
+        self.ndb.fights[fight.key] = fight
+        if room_id not in self.ndb.room_slots:
+            loads = self.ndb.slot_loads
+            self.ndb.room_slots[room_id] = loads.index(min(loads))
+        self.ndb.slot_loads[self.ndb.room_slots[room_id]] += 1
+        self.ndb.rooms.setdefault(room_id, {})[fight.key] = fight
+
+    def remove_fight(self, fight):
+        "Stops running a fight's rounds."
+        self._setup()
+        if self.ndb.fights.pop(fight.key, None) is None:
+            return
+        room_id = fight.room.id if fight.room else None
+        self.ndb.slot_loads[self.ndb.room_slots[room_id]] -= 1
+        room_fights = self.ndb.rooms[room_id]
+        del room_fights[fight.key]
+        if not room_fights:
+            del self.ndb.rooms[room_id]
+            del self.ndb.room_slots[room_id]
+        log_file(f"Removed fight {fight.key}.", filename='combat_step.log')
+
+    def fights_in(self, room):
+        "Returns the fights going on in a room."
+        self._setup()
+        return list(self.ndb.rooms.get(room.id, {}).values())
+
+
+def get_combat_scheduler():
+    """
+    Returns the global combat scheduler, creating it if it doesn't exist yet.
+    """
+    existing = search_script(COMBAT_SCHEDULER_KEY)
+    if existing:
+        return existing[0]
+    script = create_script("typeclasses.combat_scheduler.CombatScheduler")
+    log_file("Created the combat scheduler.", filename='combat_step.log')
+    return script
@@ -5,8 +5,11 @@ Exits are connectors between Rooms. An exit always has a destination property
 set and has a single command defined on itself with the same name as its key,
 for allowing Characters to traverse the exit to its destination.
 
+Exits keep the room graph (see world/room_graph.py) up to date as they are
+created, deleted, moved or relinked.
 """
 from evennia import DefaultExit
+from world.room_graph import ROOM_GRAPH
 
 
 class Exit(DefaultExit):
@@ -34,5 +37,36 @@ class Exit(DefaultExit):
                                         not be called if the attribute `err_traverse` is
                                         defined, in which case that will simply be echoed.
     """
+    def at_object_creation(self):
+        "Called once, when the exit is first created."
+        super().at_object_creation()
+        ROOM_GRAPH.add_exit(self)
 
-    pass
+    def at_object_delete(self):
+        "Drop the exit from the room graph when it is deleted."
+        ROOM_GRAPH.remove_exit(self)
+        return super().at_object_delete()
+
+    # moving an exit (move_to, @tel or setting it directly) goes through the
+    # location property and relinking it (like @link and @unlink do) goes
+    # through the destination property, so wrap both to keep the room graph
+    # in step
+    def __location_set(self, location):
+        DefaultExit.location.fset(self, location)
+        ROOM_GRAPH.add_exit(self)
+
+    def __location_del(self):
+        DefaultExit.location.fdel(self)
+        ROOM_GRAPH.add_exit(self)
+
+    location = property(DefaultExit.location.fget, __location_set, __location_del)
+
+    def __destination_set(self, destination):
+        DefaultExit.destination.fset(self, destination)
+        ROOM_GRAPH.add_exit(self)
+
+    def __destination_del(self):
+        DefaultExit.destination.fdel(self)
+        ROOM_GRAPH.add_exit(self)
+
+    destination = property(DefaultExit.destination.fget, __destination_set, __destination_del)
@@ -17,7 +17,10 @@ including:
 """
 import random
 from evennia import DefaultScript
+from evennia import create_script, search_script
 from evennia.utils.logger import log_file
+from world import weather
+from world.metrics import METRICS
 
 
 # superclass
@@ -45,9 +48,51 @@ class MovingSpotlightTickCharacter(MovingSpotlightTick):
     Subclass of time ticker script to be attached to characters or NPC at
     the time of their creation (or if they are updated).
     """
+    @METRICS.timed('heartbeat.character')
     def at_repeat(self):
         "called every self.interval seconds."
         # call regen func
         self.obj.at_heartbeat_tick_regen_me()
         # call progression func
         self.obj.at_heartbeat_tick_do_progression_checks()
+
+
+# subclass for zones
+class MovingSpotlightTickZone(MovingSpotlightTick):
+    """
+    Subclass of time ticker script that runs the weather for a whole zone. One
+    of these is created per zone (see start_zone_weather below) instead of
+    giving every room its own timer. Each tick picks the zone's weather and
+    applies its effects to every room in the zone in one pass.
+    """
+    def at_script_creation(self):
+        super().at_script_creation()
+        self.desc = "Triggers weather and environmental events for a zone"
+        self.db.zone = None
+        self.db.weather = 'clear'
+
+    def at_repeat(self):
+        "called every self.interval seconds."
+        if self.db.zone is None:
+            return
+        self.db.weather = weather.next_weather(self.db.weather)
+        weather.do_zone_weather_tick(self.db.zone, self.db.weather)
+
+
+def start_zone_weather(zone):
+    """
+    Returns the weather heartbeat script for a zone, creating it if the zone
+    doesn't have one yet.
+    """
+    key = f"moving_spotlight_zone_{zone}"
+    existing = search_script(key)
+    if existing:
+        return existing[0]
+    script = create_script("typeclasses.moving_spotlight.MovingSpotlightTickZone", \
+                           autostart=False)
+    # at_script_creation sets the default heartbeat key, so set ours after
+    script.key = key
+    script.db.zone = zone
+    script.start()
+    log_file(f"Started weather heartbeat for zone: {zone}", filename='weather.log')
+    return script
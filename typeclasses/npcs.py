@@ -11,10 +11,14 @@ from world.equip import EquipHandler
 from world.traits import TraitHandler
 from world.dice_roller import return_a_roll_sans_crits as rarsc
 from world import talents, mutations
+from world.npc_reactions import REACTION_SCHEDULER, npc_say, npc_emote
 from typeclasses.characters import Character
 from evennia import utils
 import random
 
+# seconds before an NPC greets someone who entered its room
+GREETING_DELAY = 2
+
 
 class NPC(Character):
     """
@@ -115,29 +119,30 @@ class NPC(Character):
     # patrolling an area, or attacking something that might be food
     def at_char_entered(self, character):
         """
-        Execute a greeting if an NPC or character enters,
-        after a short delay.
+        Queue up a greeting when an NPC or character enters. Greetings go
+        through the reaction scheduler, so a group entering together gets a
+        single greeting and the NPC won't greet the same person over and over.
         """
-        utils.delay(2, self.greetings(character))
+        if self.name != character.name:
+            REACTION_SCHEDULER.schedule(self, 'greet', character, self.greetings, \
+                                        delay=GREETING_DELAY)
 
 
-    def greetings(self, character):
+    def greetings(self, characters):
         """
-        Greets someone when they enter the room after a
-        short delay.
+        Greets someone, or a group, when they enter the room.
         """
         # TODO: Expand this into friendly, neutral, and unfriendly greetings
-        dict_of_greetings = [
-        f'say Greetings, {character}',
-        f'say Good day, {character}',
-        f'emote nods at {character} in greeting.',
-        f'emote waves hello to {character}.',
-        f"say I'm glad to see you, {character}."
+        names = utils.list_to_string([str(character) for character in characters])
+        list_of_greetings = [
+        (npc_say, f'Greetings, {names}'),
+        (npc_say, f'Good day, {names}'),
+        (npc_emote, f'nods at {names} in greeting.'),
+        (npc_emote, f'waves hello to {names}.'),
+        (npc_say, f"I'm glad to see you, {names}.")
         ]
-        if self.name != character.name:
-            self.execute_cmd(random.choice(dict_of_greetings))
-        else:
-            pass
+        greet, text = random.choice(list_of_greetings)
+        greet(self, text)
 
 
 class Humanoid_NPC(NPC):
@@ -4,13 +4,16 @@ Room
 Rooms are simple containers that has no location of their own.
 
 """
-from evennia import utils as utils
 from evennia import DefaultRoom
 from evennia.utils.logger import log_file
 from evennia.utils import lazy_property
 from world.traits import TraitHandler
-import time
+from world.tracks import TrackHandler
+from world.occupants import OccupantHandler
+from world.capabilities import is_combatant, has_capability
+from world import weather
 from world.dice_roller import return_a_roll as roll
+from world.room_graph import ROOM_GRAPH
 
 
 class Room(DefaultRoom):
@@ -28,6 +31,16 @@ class Room(DefaultRoom):
         """TraitHandler that manages room traits."""
         return TraitHandler(self)
 
+    @lazy_property
+    def tracks(self):
+        """TrackHandler that manages the tracks left in the room."""
+        return TrackHandler(self)
+
+    @lazy_property
+    def occupants(self):
+        """OccupantHandler that indexes the characters and NPCs in the room."""
+        return OccupantHandler(self)
+
     def at_object_creation(self):
         "Ran only at object creation"
         super().at_object_creation()
@@ -54,78 +67,122 @@ class Room(DefaultRoom):
         # boolean info attributes of the room
         self.db.info = {'Non-Combat Room': False, 'Outdoor Room': True, \
                         'Zone': None, 'Environment Type': None}
-        # empty db attribute dictionary for storing tracks
-        self.db.tracks = {}
+        # empty db attribute list for storing tracks. see world.tracks
+        self.db.tracks = []
 
 
     def store_tracks(self, character_or_npc, target_location):
         """
         Stores the tracks of a character or NPC moving through the room.
         """
-        timestamp = int(time.time())
-        if character_or_npc.db.info['Sneaking'] == True:
+        if character_or_npc.info['Sneaking'] == True:
             track_depth = round(roll(character_or_npc.talents.sneak.actual, 'normal', \
                             character_or_npc.talents.sneak))
         else:
             track_depth = 100
-        self.db.tracks[timestamp] = (character_or_npc, target_location, track_depth)
-        log_file(f"{timestamp} - Storing tracks for {character_or_npc}. Track depth: {track_depth}", \
+        track = self.tracks.add(character_or_npc, target_location, track_depth)
+        log_file(f"{int(track.timestamp)} - Storing tracks for {character_or_npc}. Track depth: {track_depth}", \
                  filename='tracks.log')
-        if len(self.db.tracks) > self.traits.trackmax.actual:
-            # too many tracks, remove one
-            self.remove_old_tracks()
 
 
     def remove_old_tracks(self):
         """
-        Loops through tracks and removes really old tracks
+        Removes tracks that have gotten too old to read. The track handler
+        also drops the oldest tracks once the room holds trackmax of them.
         """
-        self.db.tracks.popitem()
+        self.tracks.age_out()
 
 
-    def remove_tracks_weather(self):
+    def remove_tracks_weather(self, current_weather):
         """
-        Loops through tracks and removes tracks due to weather events
+        Washes out and weathers the tracks in this room for the given weather.
+        Zones apply weather to all their rooms at once through
+        world.weather.do_zone_weather_tick; this is for one-off events.
         """
-        pass
+        return weather.apply_weather_to_rooms([self], current_weather)
+
+
+    def set_zone(self, zone):
+        """
+        Moves the room into a zone. The zone is stored in the room's info
+        and as a tag so the zone's weather heartbeat can find the room.
+        """
+        old_zone = self.db.info['Zone']
+        if old_zone is not None:
+            self.tags.remove(old_zone, category=weather.ZONE_TAG_CATEGORY)
+        self.db.info['Zone'] = zone
+        if zone is not None:
+            self.tags.add(zone, category=weather.ZONE_TAG_CATEGORY)
+
+
+    def at_object_delete(self):
+        "Drop the room from the room graph when it is deleted."
+        ROOM_GRAPH.remove_room(self)
+        return super().at_object_delete()
+
+
+    def at_server_reload(self):
+        "Write any pending tracks to the db before a reload."
+        super().at_server_reload()
+        self.tracks.flush()
+
+
+    def at_server_shutdown(self):
+        "Write any pending tracks to the db before a shutdown."
+        super().at_server_shutdown()
+        self.tracks.flush()
 
 
     ## Adding custom hook to allow NPCs to "notice" when a character
     ## enters the room they are in.
     def at_object_receive(self, obj, source_location):
-        if utils.inherits_from(obj, 'typeclasses.npcs.NPC') or utils.inherits_from(obj, 'typeclasses.characters.Character'):
+        if self.occupants.add(obj):
             # An NPC has entered or a player has entered.
             ## cause the NPC or player to look around
             # obj.execute_cmd('look')
-            for item in self.contents:
-                # message everyone that is in the room except the one that just entered
-                # TODO: Account for stealth and suppress the message if the movement into
-                #       the room was unnoticed
-                if item != obj:
-                    item.msg(f"{obj} has entered from {source_location}.")
-                if utils.inherits_from(item, 'typeclasses.npcs.NPC'):
-                    # An NPC is in the room
-                    if obj.db.info['Sneaking'] == False:
-                        item.at_char_entered(obj)
-                    else:
-                        sneak_roll = round(roll(obj.talents.sneak.actual, 'flat', \
-                                                obj.talents.sneak, obj.ability_scores.Dex, \
-                                                obj.ability_scores.Per))
-                        notice_roll = round(roll(item.ability_scores.Per.actual, 'flat', \
-                                                item.ability_scores.Per))
-                        if notice_roll <= sneak_roll:
-                            item.at_char_entered(obj)
+            # message everyone that is in the room except the one that just entered
+            # TODO: Account for stealth and suppress the message if the movement into
+            #       the room was unnoticed
+            self.occupants.msg_listeners(f"{obj} has entered from {source_location}.", \
+                                         exclude=obj)
+            self.dispatch_room_event('entered', obj)
         else:
             self.calculate_encumberance()
 
 
+    def dispatch_room_event(self, event, obj):
+        """
+        Passes an event on to the NPCs in the room that notice it. The NPCs
+        queue up their reactions on the reaction scheduler, which delays and
+        batches them (see world/npc_reactions.py).
+        """
+        for npc in self.occupants.npcs(exclude=obj):
+            if event == 'entered' and self.npc_notices_entry(npc, obj):
+                npc.at_char_entered(obj)
+
+
+    def npc_notices_entry(self, npc, obj):
+        """
+        Determines if an NPC notices a character or NPC entering the room.
+        """
+        if obj.info['Sneaking'] == False:
+            return True
+        sneak_roll = round(roll(obj.talents.sneak.actual, 'flat', \
+                                obj.talents.sneak, obj.ability_scores.Dex, \
+                                obj.ability_scores.Per))
+        notice_roll = round(roll(npc.ability_scores.Per.actual, 'flat', \
+                                 npc.ability_scores.Per))
+        return notice_roll <= sneak_roll
+
+
     # apply tracks as character or NPC leaves the room
     def at_object_leave(self, obj, target_location):
-        if utils.inherits_from(obj, 'typeclasses.npcs.NPC') or utils.inherits_from(obj, 'typeclasses.characters.Character'):
+        self.occupants.remove(obj)
+        if is_combatant(obj):
             self.store_tracks(obj, target_location)
             # also, tax the character's stamina for moving through the room
             # sneaking makes this more expensive
-            if obj.db.info['Sneaking'] == True:
+            if obj.info['Sneaking'] == True:
                 obj.traits.sp.current -= (self.traits.rot.actual * self.traits.size.actual / 30)
             else:
                 obj.traits.sp.current -= (self.traits.rot.actual * self.traits.size.actual / 100)
@@ -154,11 +211,11 @@ class Room(DefaultRoom):
         for item in items:
             log_file(f"calculating mass for {item.name}", \
                      filename='room.log')
-            if utils.inherits_from(item, 'typeclasses.npcs.NPC') or utils.inherits_from(item, 'typeclasses.characters.Character'):
+            if is_combatant(item):
                 log_file(f"Item is a char or NPC- mass:{item.traits.mass.actual}", \
                          filename='room.log')
                 self.traits.enc.current += item.traits.mass.actual
-            elif utils.inherits_from(item, 'typeclasses.exits.Exit'):
+            elif has_capability(item, 'exit'):
                 pass
             else:
                 log_file(f"Item is a regular item- mass:{item.db.mass}", \
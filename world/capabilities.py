@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Capabilities module.
+
+Messaging, combat and room code keep asking the same questions about objects:
+is this a character or NPC, is it an exit, is that item a shield or a weapon?
+`utils.inherits_from` answers them by turning the typeclass path into a string
+and walking the object's MRO every time it's called, which adds up when it
+runs for every object in a room for every combat message.
+
+The answers only depend on the object's Python class, so this module works
+them out once per class and keeps them in a registry. After the first object
+of a class has been checked, every check is a dict lookup and a set lookup.
+
+Capabilities are listed in CAPABILITIES as the typeclass paths that grant
+them. An object has a capability if any class in its MRO is one of those
+paths, the same as `inherits_from`.
+
+**Use**
+    ```python
+    >>> from world.capabilities import is_combatant, has_capability
+    >>> is_combatant(character)
+    True
+    >>> is_combatant(sword)
+    False
+    >>> has_capability(sword, 'weapon')
+    True
+    ```
+"""
+
+# capability: typeclass paths that grant it
+CAPABILITIES = {
+    'combatant': ('typeclasses.characters.Character', 'typeclasses.npcs.NPC'),
+    'npc': ('typeclasses.npcs.NPC',),
+    'exit': ('typeclasses.exits.Exit',),
+    'shield': ('typeclasses.armors.Shield',),
+    'weapon': ('typeclasses.weapons.Weapon',),
+}
+
+# python class: frozenset of its capabilities
+_REGISTRY = {}
+
+
+def class_capabilities(cls):
+    """Returns the capabilities of a class, working them out the first time."""
+    capabilities = _REGISTRY.get(cls)
+    if capabilities is None:
+        paths = {f"{klass.__module__}.{klass.__name__}" for klass in cls.__mro__}
+        capabilities = frozenset(capability for capability, typeclasses \
+                                 in CAPABILITIES.items() \
+                                 if not paths.isdisjoint(typeclasses))
+        _REGISTRY[cls] = capabilities
+    return capabilities
+
+
+def capabilities(obj):
+    """Returns the capabilities of an object as a frozenset."""
+    return class_capabilities(type(obj))
+
+
+def has_capability(obj, capability):
+    """Returns True if the object has the capability."""
+    return capability in class_capabilities(type(obj))
+
+
+def is_combatant(obj):
+    """Returns True if the object is a character or NPC."""
+    return 'combatant' in class_capabilities(type(obj))
+
+
+def is_npc(obj):
+    """Returns True if the object is an NPC."""
+    return 'npc' in class_capabilities(type(obj))
+
+
+def clear_registry():
+    """Forgets every class, e.g. after CAPABILITIES has been changed."""
+    _REGISTRY.clear()
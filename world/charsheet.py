@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Character sheet module.
+
+The character sheet (see world/charsheetform.py for the layout) is made up of
+a few tables and cells. The `charsheet` command is one of the most used
+commands in the game, so the sheet is not rebuilt every time it is shown.
+Instead, every section of the sheet remembers a signature of the data it was
+built from:
+
+- Traits, ability scores, talents and mutations use the `version` counter of
+  their TraitHandler, which goes up whenever one of their traits changes.
+- Info and wallet are plain db dicts, so their signature is a tuple of the
+  values shown on the sheet.
+
+Only the sections whose signature changed are rebuilt and re-mapped onto the
+form. The form and the rendered text are held in memory only and never saved
+to the db.
+
+**Setup**
+    ```python
+    from evennia.utils import lazy_property
+    from world.charsheet import CharSheetHandler
+        ...
+    class Character(DefaultCharacter):
+        ...
+        @lazy_property
+        def sheet(self):
+            return CharSheetHandler(self)
+    ```
+
+**Use**
+    ```python
+    >>> character.msg(character.sheet.render())
+    ```
+"""
+from evennia.utils import evform, evtable
+
+# template for the form
+CHARSHEET_FORM = "world/charsheetform.py"
+
+# names for the default attacks on the sheet
+_DEFAULT_ATTACK_NAMES = {
+    'unarmed_strike': 'Strikes',
+    'melee_weapon_strike': 'Melee Weapon',
+    'ranged_weapon_strike': 'Ranged Weapon',
+    'mental_attack': 'Psi',
+}
+
+# info keys shown in the info table of the sheet
+_INFO_KEYS = ('Default Attack', 'Mercy', 'Wimpy', 'Yield', 'Sneaking')
+
+
+class CharSheetHandler(object):
+    """Render cache for a character's sheet.
+    Args:
+        obj (Character): parent character for this CharSheetHandler
+    Methods:
+        render(): returns the sheet, rebuilding only the changed sections
+        invalidate(): forces a full rebuild on the next render
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        self.form = None
+        self.rendered = None
+        # form cell number: signature of the data it was last built from
+        self.signatures = {}
+        # older characters stored the whole form in the db
+        if obj.attributes.has('charsheet'):
+            obj.attributes.remove('charsheet')
+
+    def invalidate(self):
+        """Forget everything so the next render rebuilds the whole sheet."""
+        self.form = None
+        self.rendered = None
+        self.signatures = {}
+
+    def _current_signatures(self):
+        """Returns the signature of the data behind each section of the sheet."""
+        obj = self.obj
+        info = obj.info
+        wallet = obj.db.wallet
+        return {
+            1: (obj.name, info['Title']),
+            2: (obj.traits.version, obj.ability_scores.version),
+            3: obj.talents.version,
+            4: tuple(info[key] for key in _INFO_KEYS),
+            5: obj.mutations.version,
+            6: (wallet['GC'], wallet['SC'], wallet['CC']),
+        }
+
+    def render(self):
+        """Returns the character sheet, rebuilding any sections that changed."""
+        signatures = self._current_signatures()
+        changed = [cell for cell, signature in signatures.items() \
+                   if self.signatures.get(cell) != signature]
+        if not changed and self.rendered is not None:
+            return self.rendered
+        if self.form is None:
+            self.form = evform.EvForm(CHARSHEET_FORM)
+            changed = list(signatures.keys())
+        tables = {}
+        cells = {}
+        for cell in changed:
+            if cell == 1:
+                cells[1] = self._build_name_and_title()
+            elif cell == 2:
+                tables[2] = self._build_attribute_table()
+            elif cell == 3:
+                tables[3] = self._build_talent_table()
+            elif cell == 4:
+                tables[4] = self._build_info_table()
+            elif cell == 5:
+                tables[5] = self._build_mutation_table()
+            elif cell == 6:
+                cells[6] = self._build_funds()
+        self.form.map(tables=tables, cells=cells)
+        self.signatures = signatures
+        self.rendered = str(self.form)
+        return self.rendered
+
+    def _build_name_and_title(self):
+        """Name and title cell."""
+        title = self.obj.info['Title']
+        if title is not None and len(title) < 25:
+            name_and_title = "\t" + str(self.obj.name) + title
+        else:
+            name_and_title = "\t\t\t\t" + str(self.obj.name)
+        return f"|h|w{name_and_title}|n"
+
+    def _build_funds(self):
+        """Money cell. NOTE: money stored in obj.db.wallet"""
+        wallet = self.obj.db.wallet
+        return f"|551Gold:|n {wallet['GC']}    |445Silver:|n {wallet['SC']}    |530Copper:|n {wallet['CC']}"
+
+    def _build_attribute_table(self):
+        """Gauges, ability scores and weight."""
+        traits = self.obj.traits
+        ability_scores = self.obj.ability_scores
+        return evtable.EvTable("|035Attribute|n", "|wValue|n",
+                        table = [
+                            ["Health", "Stamina", "Conviction", "Dexterity", \
+                             "Strength", "Vitality", "Perception", "Charisma", \
+                             "Weight"],
+                            [(str(int(traits.hp.current)) + " / " + str(traits.hp.max) ), \
+                             (str(int(traits.sp.current)) + " / " + str(traits.sp.max) ), \
+                             (str(int(traits.cp.current)) + " / " + str(traits.cp.max ) ), \
+                             ability_scores.Dex.current, ability_scores.Str.current, \
+                             ability_scores.Vit.current, ability_scores.Per.current, \
+                             ability_scores.Cha.current, traits.mass.current]],
+                             align='c', border="incols")
+
+    def _build_talent_table(self):
+        """Top talents by score."""
+        talent_names, talent_scores = self.obj.get_top_talents()
+        return evtable.EvTable("|530Talent|n", "|wValue|n",
+                        table = [
+                            talent_names,
+                            talent_scores],
+                            align='c', border="incols")
+
+    def _build_info_table(self):
+        """Combat preferences and other info."""
+        info = self.obj.info
+        # reformat default attack names so they're friendlier for the character
+        # sheet
+        datt = _DEFAULT_ATTACK_NAMES.get(info["Default Attack"], \
+                                         info["Default Attack"].capitalize())
+        return evtable.EvTable("|530Info|n", "|wValue|n",
+                        table = [
+                                ["Default Attack", "Mercy", "Wimpy", "Yield", \
+                                 "Sneaking"], \
+                                [datt, info["Mercy"], \
+                                 info["Wimpy"], info["Yield"], \
+                                 info["Sneaking"]]],
+                                 align='c', border="incols")
+
+    def _build_mutation_table(self):
+        """Top mutations by score."""
+        mut_names, mut_scores = self.obj.get_top_mutations()
+        return evtable.EvTable("|035Mutation|n", "|wValue|n",
+                        table = [
+                            mut_names,
+                            mut_scores],
+                            align='c', border="incols")
@@ -6,7 +6,7 @@ These functions will be called by functions in the combat_messaging file.
 """
 import random
 from evennia.utils.logger import log_file
-from evennia import utils as utils
+from world.capabilities import has_capability
 
 # general purpose lists and dictionaries
 damage_hit_locations = [
@@ -1202,11 +1202,11 @@ def return_grappling_submission_text(pcs_and_npcs_in_room, damage, success):
     attacker = pcs_and_npcs_in_room['Actor']
     defender = pcs_and_npcs_in_room['Actee']
     damage_text = return_damage_gradient_text((damage * .75)/defender.traits.sp.current * 100)
-    index = random.randrange(len(grappling_submission_dict[attacker.db.info['Position']]['Actor']))
+    index = random.randrange(len(grappling_submission_dict[attacker.info['Position']]['Actor']))
     final_text_dict = {}
-    final_text_dict['Actor'] = grappling_submission_dict[attacker.db.info['Position']]['Actor'][index]
-    final_text_dict['Actee'] = grappling_submission_dict[attacker.db.info['Position']]['Actee'][index]
-    final_text_dict['Observer'] = grappling_submission_dict[attacker.db.info['Position']]['Observer'][index]
+    final_text_dict['Actor'] = grappling_submission_dict[attacker.info['Position']]['Actor'][index]
+    final_text_dict['Actee'] = grappling_submission_dict[attacker.info['Position']]['Actee'][index]
+    final_text_dict['Observer'] = grappling_submission_dict[attacker.info['Position']]['Observer'][index]
     log_file(f"text_dict: {final_text_dict}", filename='combat_step.log')
     return final_text_dict, damage_text
 
@@ -1242,10 +1242,10 @@ def return_melee_weapon_strike_text(pcs_and_npcs_in_room, damage):
     damage_text = return_damage_gradient_text(damage/defender.traits.hp.current * 100)
     weapons = []
     log_file("determining weapon and its text", filename='combat_step.log')
-    if attacker.db.slots['main hand'] != None and utils.inherits_from(attacker.db.slots['main hand'], 'typeclasses.weapons.Weapon'):
+    if attacker.db.slots['main hand'] != None and has_capability(attacker.db.slots['main hand'], 'weapon'):
         weapons.append(attacker.db.slots['main hand'])
     if attacker.db.slots['off hand'] != None and attacker.db.slots['main hand'] != attacker.db.slots['off hand'] \
-     and utils.inherits_from(attacker.db.slots['off hand'], 'typeclasses.weapons.Weapon'):
+     and has_capability(attacker.db.slots['off hand'], 'weapon'):
         weapons.append(attacker.db.slots['off hand'])
     weapon = random.choice(weapons) # in case we're dual wielding
     log_file(f"Weapon doing damage: {weapon.name}", filename='combat_step.log')
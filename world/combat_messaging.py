@@ -24,7 +24,7 @@ for combat action descriptions from a number of sources:
                       a character may fail to close range because of slipping in
                       mud.
 """
-from evennia import utils
+from world.capabilities import is_combatant
 from world.combat_description import return_unarmed_damage_normal_text as rudnt
 from world.combat_description import return_dodge_text as dodgetxt
 from world.combat_description import return_unarmed_block_text as blocktxt
@@ -35,6 +35,7 @@ from world.combat_description import return_grappling_submission_text as rgsat
 from world.combat_description import return_grappling_escape_text as rgeat
 from world.combat_description import return_melee_weapon_strike_text as mwst
 from evennia.utils.logger import log_file
+from world.metrics import METRICS
 
 ## functions for delivering messages
 # what characters and NPCs are in the room?
@@ -44,8 +45,9 @@ def determine_objects_in_room(location, actor, actee):
     contents of the room, and determines which objects should get a message.
     """
     log_file("start of determine objects in room func", filename='combat_step.log')
-    # empty dictionary for use later
-    pcs_and_npcs_in_room = {'Actor': [], 'Actee': [], 'Observers': []}
+    # the actor and actee always get their messages, even if they aren't in
+    # the room's contents (like in a headless replay of a fight)
+    pcs_and_npcs_in_room = {'Actor': actor, 'Actee': actee, 'Observers': []}
     # get room contents
     objects_in_room = location.contents
     log_file(f"Room: {location} contents: {location.contents}", \
@@ -56,13 +58,11 @@ def determine_objects_in_room(location, actor, actee):
         log_file(f"Testing {obj} to see if they are a char or NPC.", \
                  filename='combat_step.log')
         # TODO: Add NPC typeclasses to this when we create them
-        if utils.inherits_from(obj, 'typeclasses.npcs.NPC') or utils.inherits_from(obj, 'typeclasses.characters.Character'):
+        if is_combatant(obj):
             log_file(f"Role assignment for {obj.name}", filename='combat_step.log')
             if obj == actor:
-                pcs_and_npcs_in_room['Actor'] = actor
                 log_file(f"{obj.name} is the actor.", filename='combat_step.log')
             elif obj == actee:
-                pcs_and_npcs_in_room['Actee'] = actee
                 log_file(f"{obj.name} is the actee.", filename='combat_step.log')
             else:
                 pcs_and_npcs_in_room['Observers'].append(obj)
@@ -82,6 +82,7 @@ def send_msg_to_actor(actor, actor_msg_string):
     sends them that message.
     """
     log_file("start of send msg to actor func", filename='combat_step.log')
+    METRICS.incr('combat.msgs')
     actor.msg(f"{actor_msg_string}")
     actor.execute_cmd("rprom")
 
@@ -93,6 +94,7 @@ def send_msg_to_actee(actee, actee_msg_string):
     with their name replaced by 'you'.
     """
     log_file("start of send msg to actee func", filename='combat_step.log')
+    METRICS.incr('combat.msgs')
     actee.msg(f"{actee_msg_string}")
     actee.execute_cmd("rprom")
 
@@ -103,10 +105,12 @@ def send_msg_to_observer(observer, observer_msg_string):
     sent to the attacker. The function then messeages the attacker.
     """
     log_file("start of send msg to observer func", filename='combat_step.log')
+    METRICS.incr('combat.msgs')
     observer.msg(f"{observer_msg_string}")
     observer.execute_cmd("rprom")
 
 
+@METRICS.timed('combat.send_msgs')
 def send_msg_to_objects(pcs_and_npcs_in_room, actor_msg_string, actee_msg_string, observer_msg_string):
     """
     This function gathers in the info to call all three of the functions above
@@ -199,23 +203,31 @@ def build_msgs_for_takedown(attacker, defender, success_lvl):
     send_msg_to_objects(pcs_and_npcs_in_room, actor_msg_string, actee_msg_string, observer_msg_string)
 
 
-def build_msgs_for_grappling_improve_position(attacker, defender):
+def build_msgs_for_grappling_improve_position(attacker, defender, attacker_position=None, \
+                                              defender_position=None):
     """
     This function takes in the necessary args and returns the textual descriptions
     of the grappling attempt, which will include listing out the new positions.
     We'll keep this fairly simple to avoid having to build a dictionary of
     mappings from every possible starting position to every possible ending
     position. The textual description will be tied to the success lvl.
+
+    The positions default to the combatants' current ones. Queued messaging
+    passes the positions the attempt ended with.
     """
+    if attacker_position is None:
+        attacker_position = attacker.info['Position']
+    if defender_position is None:
+        defender_position = defender.info['Position']
     log_file("start of build msgs for grappling improve position func", \
              filename='combat_step.log')
     pcs_and_npcs_in_room = determine_objects_in_room(attacker.location, attacker, defender)
     log_file(f"Room occupants: {pcs_and_npcs_in_room}", filename='combat_step.log')
     final_text_dict = grappling_pos_txt(pcs_and_npcs_in_room)
     log_file(f"text dict: {final_text_dict}", filename='combat_step.log')
-    actor_msg_string = f"You |110{final_text_dict['Actor']}|n {defender.name}, ending with you in {attacker.db.info['Position']}"
-    actee_msg_string = f"{attacker.name} |110{final_text_dict['Actee']}|n, ending with you in {defender.db.info['Position']}"
-    observer_msg_string = f"{attacker.name} |110{final_text_dict['Observer']}|n, ending with {defender.name} in {defender.db.info['Position']}"
+    actor_msg_string = f"You |110{final_text_dict['Actor']}|n {defender.name}, ending with you in {attacker_position}"
+    actee_msg_string = f"{attacker.name} |110{final_text_dict['Actee']}|n, ending with you in {defender_position}"
+    observer_msg_string = f"{attacker.name} |110{final_text_dict['Observer']}|n, ending with {defender.name} in {defender_position}"
     send_msg_to_objects(pcs_and_npcs_in_room, actor_msg_string, actee_msg_string, observer_msg_string)
 
 
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary recordings of fights.
+
+Every fight run by the combat scheduler records what went into each step of
+each round: the seed of the fight (see world/rng.py), the combatants and their
+traits, and before every combatant's action, the combat state of everyone in
+the fight. The gauges of everyone in the fight are recorded again once each
+round's damage batch is committed so a replay can be checked against what
+really happened. world/combat_replay.py re-runs a recording without a server.
+
+Recordings are kept in memory as a bytearray and written out to
+COMBAT_RECORD_DIR when the fight ends. A round of a two person fight costs a
+few hundred bytes.
+
+**Format**
+    The file starts with a header of MAGIC, the format version and the seed
+    of the fight. Every record after that starts with a one byte record type:
+
+    REC_STRING    - code (u16), length (u8), utf-8 text. Names, actions,
+                    positions and ranges are written once and then referred
+                    to by code.
+    REC_COMBATANT - roster index (u8), name code (u16), the ROSTER_TRAITS
+                    (f64 each), default attack code (u16)
+    REC_STATE     - roster index (u8), position code (u16), range code (u16),
+                    target index (u8, NO_TARGET if none), STATE_FLAGS (u8),
+                    the STATE_FIELDS (f64 each), number of actions (u8)
+    REC_STEP      - round (u32), step (u8), roster index (u8), action code (u16)
+    REC_GAUGES    - round (u32), roster index (u8), hp, sp, cp (f64 each)
+
+    The states of everyone in the fight are written right before each step.
+
+**Use**
+    ```python
+    >>> from world.combat_recorder import CombatRecorder, read_records
+    >>> recorder = CombatRecorder(seed)
+    >>> recorder.add_combatant(character)
+    >>> recorder.record_step(round_count, step, character, action, characters)
+    >>> seed, records = read_records(recorder.getvalue())
+    ```
+"""
+import os
+import struct
+from evennia.utils.logger import log_file
+
+# set to False to stop recording fights
+COMBAT_RECORDING = True
+# where recordings are written when a fight ends
+COMBAT_RECORD_DIR = os.path.join('server', 'logs', 'combat_records')
+# file extension of recordings
+RECORD_EXTENSION = '.dogc'
+
+MAGIC = b'DOGC'
+FORMAT_VERSION = 1
+
+# record types
+REC_STRING = 1
+REC_COMBATANT = 2
+REC_STATE = 3
+REC_STEP = 4
+REC_GAUGES = 5
+
+# target index of a combatant without a target
+NO_TARGET = 255
+
+# (trait handler, trait key) recorded for each combatant
+ROSTER_TRAITS = (('ability_scores', 'Dex'), ('ability_scores', 'Str'), \
+                 ('ability_scores', 'Vit'), ('ability_scores', 'Per'), \
+                 ('ability_scores', 'Cha'), ('talents', 'unarmed_striking'), \
+                 ('talents', 'melee_weapons'), ('talents', 'grappling'), \
+                 ('mutations', 'sharp_claws'))
+# gauges and combat modifiers recorded before every step
+STATE_GAUGES = ('hp', 'sp', 'cp')
+STATE_MODS = ('enc_mod', 'footwork_mod', 'groundwork_mod', 'eq_damage', \
+              'eq_phy_arm', 'eq_men_arm')
+STATE_FIELDS = STATE_GAUGES + STATE_MODS
+# bits of the state flags
+FLAG_MERCY = 1
+FLAG_MAIN_HAND = 2
+FLAG_OFF_HAND = 4
+FLAG_TWO_HANDED = 8
+
+_HEADER = struct.Struct('<4sBQ')
+_TYPE = struct.Struct('<B')
+_STRING = struct.Struct('<BHB')
+_COMBATANT = struct.Struct(f'<BBH{len(ROSTER_TRAITS)}dH')
+_STATE = struct.Struct(f'<BBHHBB{len(STATE_FIELDS)}dB')
+_STEP = struct.Struct('<BIBBH')
+_GAUGES = struct.Struct('<BIB3d')
+_RECORD_STRUCTS = {REC_COMBATANT: _COMBATANT, REC_STATE: _STATE, \
+                   REC_STEP: _STEP, REC_GAUGES: _GAUGES}
+
+
+class CombatRecorder(object):
+    """Records the rounds of a single fight.
+    Args:
+        seed (int): seed of the fight's FightRandom
+    Properties:
+        seed (int): seed of the fight
+        first_round (int): first round recorded, None until a step is recorded
+        roster (dict): character id: roster index of each recorded combatant
+    Methods:
+        add_combatant(character): add a combatant to the roster
+        record_step(round_count, step, character, action, characters): record
+            the state of the fight before a combatant's action
+        record_gauges(round_count, characters): record gauges at round end
+        getvalue(): the recording as bytes
+        save(name): write the recording to COMBAT_RECORD_DIR
+    """
+    def __init__(self, seed):
+        self.seed = seed
+        self.first_round = None
+        self.roster = {}
+        self._strings = {}
+        self._buffer = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, seed))
+
+    def __len__(self):
+        """Return size of the recording in bytes."""
+        return len(self._buffer)
+
+    def _code(self, text):
+        """Returns the code of a string, writing it out the first time."""
+        text = str(text)
+        code = self._strings.get(text)
+        if code is None:
+            code = len(self._strings)
+            self._strings[text] = code
+            # at most 255 bytes, cut on a character boundary
+            data = text.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+            self._buffer += _STRING.pack(REC_STRING, code, len(data))
+            self._buffer += data
+        return code
+
+    def _index(self, character):
+        """Returns the roster index of a character, or NO_TARGET."""
+        if character is None:
+            return NO_TARGET
+        return self.roster.get(character.id, NO_TARGET)
+
+    def add_combatant(self, character):
+        """Adds a character to the roster if they aren't on it yet."""
+        if character.id in self.roster or len(self.roster) >= NO_TARGET:
+            return
+        index = len(self.roster)
+        self.roster[character.id] = index
+        traits = [float(getattr(character, handler)[key].actual) \
+                  for handler, key in ROSTER_TRAITS]
+        self._buffer += _COMBATANT.pack(REC_COMBATANT, index, \
+                                        self._code(character.name), *traits, \
+                                        self._code(character.info['Default Attack']))
+
+    def _record_state(self, character):
+        """Records the combat state of a single character."""
+        info = character.info
+        state = character.combat_state
+        flags = FLAG_MERCY if info['Mercy'] else 0
+        slots = character.db.slots or {}
+        main_hand = slots.get('main hand')
+        if main_hand is not None:
+            flags |= FLAG_MAIN_HAND
+            if (main_hand.db.handedness or 1) > 1:
+                flags |= FLAG_TWO_HANDED
+        if slots.get('off hand') is not None:
+            flags |= FLAG_OFF_HAND
+        values = [float(getattr(character.traits, gauge).current) for gauge in STATE_GAUGES]
+        values += [float(getattr(state, mod) or 0) for mod in STATE_MODS]
+        self._buffer += _STATE.pack(REC_STATE, self._index(character), \
+                                    self._code(info['Position']), self._code(state.range), \
+                                    self._index(info['Target']), flags, *values, \
+                                    int(state.num_of_actions or 0))
+
+    def record_step(self, round_count, step, character, action, characters):
+        """
+        Records the state of everyone in the fight, then the action a
+        character is about to take.
+        """
+        if self.first_round is None:
+            self.first_round = round_count
+        for combatant in characters:
+            if combatant.id in self.roster:
+                self._record_state(combatant)
+        self._buffer += _STEP.pack(REC_STEP, round_count, step, \
+                                   self._index(character), self._code(action))
+
+    def record_gauges(self, round_count, characters):
+        """Records the gauges of everyone in the fight at the end of a round."""
+        for character in characters:
+            if character.id in self.roster:
+                traits = character.traits
+                self._buffer += _GAUGES.pack(REC_GAUGES, round_count, \
+                                             self._index(character), \
+                                             float(traits.hp.current), \
+                                             float(traits.sp.current), \
+                                             float(traits.cp.current))
+
+    def getvalue(self):
+        """Returns the recording as bytes."""
+        return bytes(self._buffer)
+
+    def save(self, name):
+        """
+        Writes the recording to COMBAT_RECORD_DIR as `name` + RECORD_EXTENSION.
+        Returns the path, or None if it couldn't be written.
+        """
+        path = os.path.join(COMBAT_RECORD_DIR, name + RECORD_EXTENSION)
+        try:
+            os.makedirs(COMBAT_RECORD_DIR, exist_ok=True)
+            with open(path, 'wb') as record_file:
+                record_file.write(self._buffer)
+        except OSError:
+            log_file(f"Could not write combat recording {path}.", filename='error.log')
+            return None
+        return path
+
+
+def read_records(data):
+    """
+    Reads a recording. Strings are resolved, so action, name, position and
+    range codes come back as text.
+
+    Returns:
+        seed (int): the seed of the fight
+        records (list): (record type, fields) for every record other than
+            strings, in order. Fields are the values of the record, as in
+            the format described above.
+    Raises:
+        ValueError: if the data is not a recording this version can read
+    """
+    data = bytes(data)
+    magic, version, seed = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a combat recording, or recorded with another format version.")
+    strings = {}
+    records = []
+    offset = _HEADER.size
+    while offset < len(data):
+        rec_type, = _TYPE.unpack_from(data, offset)
+        if rec_type == REC_STRING:
+            _, code, length = _STRING.unpack_from(data, offset)
+            offset += _STRING.size
+            strings[code] = data[offset:offset + length].decode('utf-8')
+            offset += length
+            continue
+        record = _RECORD_STRUCTS.get(rec_type)
+        if record is None:
+            raise ValueError(f"Unknown record type {rec_type} at byte {offset}.")
+        fields = record.unpack_from(data, offset)[1:]
+        offset += record.size
+        if rec_type == REC_COMBATANT:
+            index, name = fields[0], strings[fields[1]]
+            traits = dict(zip(ROSTER_TRAITS, fields[2:-1]))
+            fields = (index, name, traits, strings[fields[-1]])
+        elif rec_type == REC_STATE:
+            values = dict(zip(STATE_FIELDS, fields[5:-1]))
+            fields = (fields[0], strings[fields[1]], strings[fields[2]], \
+                      fields[3], fields[4], values, fields[-1])
+        elif rec_type == REC_STEP:
+            fields = fields[:3] + (strings[fields[3]],)
+        records.append((rec_type, fields))
+    return seed, records
+
+
+def load_recording(path):
+    """Reads a recording from a file. See read_records."""
+    with open(path, 'rb') as record_file:
+        return read_records(record_file.read())
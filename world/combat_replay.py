@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Headless replays of recorded fights.
+
+Takes a recording made by world/combat_recorder.py and runs the fight again,
+round by round, without the server, the db or any scripts. Combatants are
+rebuilt from the recording as plain objects, and before every step their
+recorded state is put back. Then the step runs with the same seeded random
+streams (see world/rng.py) as the real fight:
+
+- pick: combat_action_picker turns the queued action into a curated action
+- act: the curated action's combat action object carries it out, headless
+- resolve: the round's damage batch and messaging (resolve_round_events)
+
+Each stage is timed for every round, which makes replays a handy way to
+profile combat changes against real fights. The gauges after each round are
+checked against the recorded ones; any difference means combat no longer
+plays out the way it did when the fight was recorded.
+
+Some things are not recorded and can't be replayed: equipment is only there
+as its combat modifiers and which hands are full, messaging goes nowhere, and
+commands a combatant runs (like fleeing when they fall) are collected instead
+of run.
+
+**Use**
+    From `evennia shell`:
+    ```python
+    >>> from world import combat_replay
+    >>> result = combat_replay.replay_file('server/logs/combat_records/combat_handler_1-....dogc')
+    >>> print(combat_replay.format_replay(result))
+    ```
+    Replays are kept out of the game: a replay runs every round of a fight
+    in one go, and it swaps the shared random streams the live fights use
+    (see world/rng.py), so it can neither block the server nor run beside
+    it in a thread.
+"""
+import random
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+from world.combat_recorder import read_records, REC_COMBATANT, \
+                                  REC_STATE, REC_STEP, REC_GAUGES, STATE_GAUGES, \
+                                  STATE_MODS, FLAG_MERCY, FLAG_MAIN_HAND, \
+                                  FLAG_OFF_HAND, FLAG_TWO_HANDED
+from world.combat_rules import combat_action_picker
+from world.rng import RESOLVE_STEP
+from world.combatant_state import CombatantState
+from world.info import INFO_DEFAULTS
+from typeclasses import combat_actions
+from typeclasses.combat_actions import CombatActionObject, CAO_TYPECLASSES
+from typeclasses.combat_handler import CombatHandler
+
+# stages of a round that are timed
+REPLAY_STAGES = ('pick', 'act', 'resolve')
+# largest difference between a recorded and replayed gauge that still matches
+GAUGE_TOLERANCE = 1e-6
+
+ReplayResult = namedtuple('ReplayResult', ('seed', 'rounds', 'steps', 'timings', \
+                                           'mismatches', 'errors'))
+
+
+class _ReplayTrait(object):
+    """Stands in for a trait with the parts of one that combat uses."""
+    def __init__(self, handler, key, value):
+        self._handler = handler
+        self._key = key
+        self.actual = value
+        self.current = value
+
+    def __gt__(self, other):
+        return self.actual > other
+
+    def __lt__(self, other):
+        return self.actual < other
+
+
+class _ReplayTraits(object):
+    """Stands in for a TraitHandler. Learning is counted but never saved."""
+    def __init__(self, values):
+        self._traits = {key: _ReplayTrait(self, key, value) for key, value in values.items()}
+        self.learned = {}
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__['_traits'][key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __getitem__(self, key):
+        return self._traits[key]
+
+    def apply_current_deltas(self, deltas):
+        """Adds to the current values of gauges, which can't go below 0."""
+        for key, delta in deltas.items():
+            trait = self._traits[key]
+            trait.current = max(0, trait.current + delta)
+
+    def add_learn(self, key, amount=1):
+        """Counts learning from critical rolls."""
+        self.learned[key] = self.learned.get(key, 0) + amount
+
+
+class _ReplayNdb(SimpleNamespace):
+    """Non-db attributes. Missing ones are None, like evennia's ndb."""
+    def __getattr__(self, name):
+        return None
+
+
+class _ReplayCmdSet(object):
+    """Command sets aren't used in replays."""
+    def add(self, *args, **kwargs):
+        pass
+
+    def delete(self, *args, **kwargs):
+        pass
+
+
+class _ReplayItem(object):
+    """Stands in for a wielded item."""
+    def __init__(self, handedness):
+        self.key = self.name = "item"
+        self.db = SimpleNamespace(handedness=handedness, physical_armor_value=1)
+
+
+class _ReplayRoom(object):
+    """Stands in for the room of the fight. Nobody is there to get messages."""
+    def __init__(self):
+        self.id = None
+        self.contents = []
+        self.exits = ['away']
+
+    def msg_contents(self, *args, **kwargs):
+        pass
+
+
+class ReplayCombatant(object):
+    """
+    A combatant rebuilt from a recording.
+    Args:
+        index (int): roster index in the recording
+        name (str): name of the combatant
+        traits (dict): (trait handler, trait key): value, see ROSTER_TRAITS
+        default_attack (str): the combatant's default attack
+        room (_ReplayRoom): where the fight is
+    Properties:
+        commands (list): commands the combatant would have run
+    """
+    def __init__(self, index, name, traits, default_attack, room):
+        self.id = self.pk = index + 1
+        self.key = self.name = name
+        self.location = room
+        self.ndb = _ReplayNdb()
+        self.combat_state = CombatantState()
+        self.info = dict(INFO_DEFAULTS)
+        self.info.update({'Default Attack': default_attack, 'In Combat': True})
+        self.db = SimpleNamespace(slots={'main hand': None, 'off hand': None})
+        handlers = {}
+        for (handler, key), value in traits.items():
+            handlers.setdefault(handler, {})[key] = value
+        self.ability_scores = _ReplayTraits(handlers.get('ability_scores', {}))
+        self.talents = _ReplayTraits(handlers.get('talents', {}))
+        self.mutations = _ReplayTraits(handlers.get('mutations', {}))
+        self.traits = _ReplayTraits({gauge: 0 for gauge in STATE_GAUGES})
+        self.cmdset = _ReplayCmdSet()
+        self.commands = []
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def slots(self):
+        return self.db.slots
+
+    def msg(self, *args, **kwargs):
+        pass
+
+    def execute_cmd(self, raw_string, **kwargs):
+        self.commands.append(raw_string)
+
+    def flush_learning(self):
+        pass
+
+    def apply_state(self, fields, combatants):
+        """Puts back the combat state from a REC_STATE record."""
+        index, position, range_, target, flags, values, num_of_actions = fields
+        info = self.info
+        info['Position'] = position
+        info['Target'] = combatants.get(target)
+        info['Mercy'] = bool(flags & FLAG_MERCY)
+        state = self.combat_state
+        state.range = None if range_ == 'None' else range_
+        state.num_of_actions = num_of_actions
+        for gauge in STATE_GAUGES:
+            self.traits[gauge].current = values[gauge]
+        for mod in STATE_MODS:
+            setattr(state, mod, values[mod])
+        self.db.slots['main hand'] = _ReplayItem(2 if flags & FLAG_TWO_HANDED else 1) \
+                                     if flags & FLAG_MAIN_HAND else None
+        self.db.slots['off hand'] = _ReplayItem(1) if flags & FLAG_OFF_HAND else None
+
+
+class HeadlessAction(object):
+    """
+    Runs a combat action object's execute_purpose without creating a script.
+    Args:
+        character (ReplayCombatant): the combatant taking the action
+        cao_class (class): the CombatActionObject subclass for the action
+    """
+    spend = CombatActionObject.spend
+    queue_hit = CombatActionObject.queue_hit
+    queue_msg = CombatActionObject.queue_msg
+
+    def __init__(self, character, cao_class):
+        self.obj = character
+        self.cao_class = cao_class
+        # same draw as CombatActionObject.at_script_creation keeps the streams in step
+        self.key = "cao_%i" % random.randint(1, 10000)
+
+    def execute_purpose(self):
+        self.cao_class.execute_purpose(self)
+
+    def flee_exit(self, character):
+        "Replays have no room graph, the fight's room has a single way out."
+        return character.location.exits[0]
+
+    def stop(self):
+        pass
+
+
+class ReplayFight(CombatHandler):
+    """
+    A CombatHandler without a scheduler that carries out actions headless.
+    Args:
+        seed (int): seed of the recorded fight
+        room (_ReplayRoom): where the fight is
+    """
+    def __init__(self, seed, room):
+        super().__init__(None, 'replay', room, seed=seed)
+        self.recorder = None
+
+    def stop(self):
+        self.active = False
+
+    def spawn_action(self, character, action_curated):
+        "Carries out a curated action with a HeadlessAction."
+        typeclass = CAO_TYPECLASSES.get(action_curated)
+        if typeclass is None:
+            raise ValueError(f"No combat action object for action {action_curated}.")
+        cao_class = getattr(combat_actions, typeclass.rsplit('.', 1)[1])
+        HeadlessAction(character, cao_class).execute_purpose()
+
+
+def replay(data, timer=time.perf_counter):
+    """
+    Replays a recorded fight.
+
+    Args:
+        data (bytes): the recording
+        timer (callable): clock used to time the stages
+
+    Returns:
+        ReplayResult with
+            seed (int): seed of the fight
+            rounds (list): the rounds that were replayed
+            steps (int): number of steps replayed
+            timings (dict): stage: list of seconds spent per round
+            mismatches (list): (round, name, gauge, recorded, replayed) for
+                every gauge that didn't match the recording
+            errors (list): (round, step, name, error) for every stage that
+                raised an exception
+    """
+    seed, records = read_records(data)
+    room = _ReplayRoom()
+    fight = ReplayFight(seed, room)
+    combatants = {}
+    rounds = []
+    timings = {stage: [] for stage in REPLAY_STAGES}
+    mismatches = []
+    errors = []
+    steps = 0
+    resolved = True
+
+    def start_round(round_count):
+        rounds.append(round_count)
+        fight.round_count = round_count
+        fight.active = True
+        for stage in REPLAY_STAGES:
+            timings[stage].append(0.0)
+
+    def run_stage(stage, round_count, step, character, func, *args):
+        start = timer()
+        try:
+            return func(*args)
+        except Exception as err:
+            errors.append((round_count, step, character.name if character else None, repr(err)))
+        finally:
+            timings[stage][-1] += timer() - start
+
+    def resolve(round_count):
+        with fight.random.active(round_count, RESOLVE_STEP):
+            run_stage('resolve', round_count, RESOLVE_STEP, None, fight.resolve_round_events)
+
+    for rec_type, fields in records:
+        if rec_type == REC_COMBATANT:
+            index, name, traits, default_attack = fields
+            combatant = ReplayCombatant(index, name, traits, default_attack, room)
+            combatant.ndb.combat_handler = fight
+            combatants[index] = combatant
+            fight.characters[combatant.id] = combatant
+        elif rec_type == REC_STATE:
+            combatants[fields[0]].apply_state(fields, combatants)
+        elif rec_type == REC_STEP:
+            round_count, step, index, action = fields
+            if not rounds or rounds[-1] != round_count:
+                if not resolved:
+                    resolve(rounds[-1])
+                start_round(round_count)
+                resolved = False
+            character = combatants[index]
+            steps += 1
+            with fight.random.active(round_count, step):
+                action_curated = run_stage('pick', round_count, step, character, \
+                                           combat_action_picker, character, action)
+                if action_curated is not None:
+                    run_stage('act', round_count, step, character, \
+                              fight.spawn_action, character, action_curated)
+        elif rec_type == REC_GAUGES:
+            round_count, index, hp, sp, cp = fields
+            if not rounds or rounds[-1] != round_count:
+                # nobody acted, but the round was still resolved
+                start_round(round_count)
+                resolved = False
+            if not resolved:
+                resolve(round_count)
+                resolved = True
+            character = combatants[index]
+            for gauge, recorded in zip(STATE_GAUGES, (hp, sp, cp)):
+                replayed = character.traits[gauge].current
+                if abs(replayed - recorded) > GAUGE_TOLERANCE:
+                    mismatches.append((round_count, character.name, gauge, recorded, replayed))
+    if not resolved:
+        resolve(rounds[-1])
+    return ReplayResult(seed, rounds, steps, timings, mismatches, errors)
+
+
+def replay_file(path, timer=time.perf_counter):
+    """Replays a recording from a file. See replay."""
+    with open(path, 'rb') as record_file:
+        return replay(record_file.read(), timer)
+
+
+def format_replay(result):
+    """Returns the results of a replay as text."""
+    lines = [f"Seed {result.seed:016x}: {len(result.rounds)} rounds, {result.steps} steps."]
+    for stage in REPLAY_STAGES:
+        times = result.timings[stage]
+        total = sum(times) * 1000
+        mean = total / len(times) if times else 0
+        lines.append(f"{stage}: {total:.2f} ms total, {mean:.3f} ms per round")
+    if result.mismatches:
+        lines.append(f"|r{len(result.mismatches)} gauges did not match the recording.|n")
+        for round_count, name, gauge, recorded, replayed in result.mismatches[:10]:
+            lines.append(f"  round {round_count} {name} {gauge}: recorded {recorded:.2f}, " \
+                         f"replayed {replayed:.2f}")
+    else:
+        lines.append("|gAll gauges matched the recording.|n")
+    for round_count, step, name, error in result.errors[:10]:
+        lines.append(f"|rround {round_count} step {step} {name}: {error}|n")
+    return "\n".join(lines)
@@ -21,9 +21,14 @@ Please see the combat_handler script file in the typeclasses folder for more
 details.
 """
 import random
+from collections import namedtuple
+import numpy as np
 from evennia.utils.logger import log_file
-from evennia import utils as utils
-from world.dice_roller import return_a_roll as roll
+from world.capabilities import has_capability
+from world.dice_roller import roll_many
+from world.grappling_rules import MASSIVE_FAILURE, CRITICAL_FAILURE, FAILURE, \
+                                  SUCCESS, GREAT_SUCCESS, CRITICAL_SUCCESS, \
+                                  MASSIVE_SUCCESS
 
 # actions
 actions_dict = {
@@ -55,6 +60,99 @@ actions_dict = {
 26 : 'increase_range',
 27 : 'stand'}
 
+# band tables for opposed checks. `edges` are attacker:defender ratios in
+# ascending order and `bands` are the outcome bands between them, so there is
+# always one more band than there are edges. A ratio that lands exactly on an
+# edge falls into the band nearer to 1:1, so to move up from a failure or
+# success band the attacker has to strictly beat the scaled roll of the
+# defender, or the defender the scaled roll of the attacker.
+BandTable = namedtuple('BandTable', ('edges', 'bands'))
+
+# takedowns compare the groundwork modifiers of the combatants
+TAKEDOWN_BANDS = BandTable(edges=(0.25, 0.4, 1, 1.25, 1.75, 3),
+                           bands=(MASSIVE_FAILURE, CRITICAL_FAILURE, FAILURE, \
+                                  SUCCESS, GREAT_SUCCESS, CRITICAL_SUCCESS, \
+                                  MASSIVE_SUCCESS))
+IMPROVE_POSITION_BANDS = BandTable(edges=(1 / 3, 2 / 3, 1, 3, 4),
+                                   bands=(MASSIVE_FAILURE, CRITICAL_FAILURE, \
+                                          FAILURE, SUCCESS, CRITICAL_SUCCESS, \
+                                          MASSIVE_SUCCESS))
+ESCAPE_BANDS = BandTable(edges=(1,), bands=(FAILURE, SUCCESS))
+SUBMISSION_BANDS = BandTable(edges=(1,), bands=(FAILURE, SUCCESS))
+
+# combat modifier for each position, see Character.calc_status_modifiers
+POSITION_MODIFIERS = {
+    # ground positions listed from best to worst
+    'tbmount': 1.5, # mounted opponent and taken their back
+    'mount': 1.4, # mounted opponent, facing them
+    'side control': 1.2, # on top, have side control
+    'top': 1.05, # on top, in their guard
+    'in guard': .95, # on bottom, in your guard
+    'side controlled': .85, # on bottom, being side controlled
+    'mounted': .75, # on bottom, mounted
+    'prmounted': .5, # on bottom, face down, back taken
+    # standing grappling positions from best to worst
+    'tbstanding': 1.25, # riding opponent from behind, they're standing
+    'clinching': 1.05, # both standing, you have them in a clinch
+    'clinched': .95, # both standing, they have you in a clinch
+    'standingbt': .85, # opponent has taken your back, you're standing
+    # non grappling positions, normal
+    'standing': 1,
+    'sitting': .9,
+    'supine': .85,
+    'prone': .8,
+    'sleeping': .5,
+    # other environmentally dependant positions
+    'floating': 1, # floating in air or water, limited control
+    'flying': 1.25, # flying through air under your own power
+}
+
+# grappling actions and how likely they are to be picked in each position,
+# as (weights, weights with natural weapons). See resolve_grappling_action.
+GRAPPLING_ACTIONS = ('takedown', 'improve_position', 'submission', \
+                     'unarmed_strike_normal', 'unarmed_strike_natural_weapons', \
+                     'melee_weapon_strike')
+_GRAPPLING_WEIGHT_GROUPS = (
+    # in a bad position, mostly try to get out of it
+    (('side controlled', 'mounted', 'prmounted', 'standingbt'), \
+     (0, 95, 5, 0, 0, 0), (0, 95, 5, 0, 0, 0)),
+    (('top', 'in guard'), (0, 30, 30, 40, 0, 0), (0, 30, 30, 0, 40, 0)),
+    (('clinching', 'clinched'), (0, 40, 30, 30, 0, 0), (0, 40, 30, 0, 30, 0)),
+    (('tbmount', 'tbstanding'), (0, 0, 70, 30, 0, 0), (0, 0, 70, 0, 30, 0)),
+)
+GRAPPLING_ACTION_WEIGHTS = {position: (weights, natural_weights) \
+                            for positions, weights, natural_weights in _GRAPPLING_WEIGHT_GROUPS \
+                            for position in positions}
+# weights in any other position, like mount or side control
+DEFAULT_GRAPPLING_WEIGHTS = ((0, 10, 25, 65, 0, 0), (0, 10, 25, 0, 65, 0))
+
+
+def opposed_check(attacker_scores, defender_scores, band_table):
+    """
+    Classifies opposed checks into outcome bands by the ratio of the attacker's
+    score to the defender's score. Takes single scores or arrays of scores, so
+    a whole round of checks can be classified at once.
+
+    Returns the outcome band (see world.grappling_rules) of each check, as an
+    int for single scores or an array for arrays.
+    """
+    attacker_scores = np.asarray(attacker_scores, dtype=float)
+    defender_scores = np.asarray(defender_scores, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = attacker_scores / defender_scores
+    # a defender with nothing loses to any attacker with something
+    ratios = np.where(defender_scores > 0, ratios, \
+                      np.where(attacker_scores > 0, np.inf, 1.0))
+    # exact edges below 1:1 go up a band, exact edges from 1:1 up go down
+    indices = np.where(ratios < 1, \
+                       np.searchsorted(band_table.edges, ratios, side='right'), \
+                       np.searchsorted(band_table.edges, ratios, side='left'))
+    bands = np.asarray(band_table.bands)[indices]
+    if bands.ndim == 0:
+        return int(bands)
+    return bands
+
+
 def combat_action_picker(character, action):
     """
     This function takes in a character object from the typeclasses.combat_handler
@@ -90,8 +188,8 @@ def combat_action_picker(character, action):
                      Check code in world.combat_rules.", filename='error.log')
     # check first for flee actions, elminate cases where we're in bad grappling
     # position and not grappling
-    elif character.ndb.range == 'grapple':
-        if character.db.info['Position'] in ['side controlled', 'mounted', \
+    elif character.combat_state.range == 'grapple':
+        if character.info['Position'] in ['side controlled', 'mounted', \
                                              'prmounted','standingbt']:
             # we're grappled and in a really bad position and we con't want to
             # be there. try to escape (regardless of preferred action)
@@ -101,7 +199,7 @@ def combat_action_picker(character, action):
                 return actions_dict[22]
             else:
                 return actions_dict[11]
-        elif character.db.info['Position'] == 'standing':
+        elif character.info['Position'] == 'standing':
             # we're standing. most of the time, we'll want to move back to a
             # more advantageous range
             if action == 'unarmed_strike':
@@ -133,11 +231,11 @@ def combat_action_picker(character, action):
                 return actions_dict[24]
             else:
                 log_file(f"unknown decision tree for {character.name} while in \
-                         range: {character.ndb.range} and \
-                         position: {character.db.info['Position']}. \
+                         range: {character.combat_state.range} and \
+                         position: {character.info['Position']}. \
                          Desired action: {action}",
                          filename='error.log')
-        elif character.db.info['Position'] in ['tbmount', 'mount', 'side control']:
+        elif character.info['Position'] in ['tbmount', 'mount', 'side control']:
             # in a dominate grapplling position, but not choosing to grapple
             if action == 'unarmed_strike':
                 # strike some of the time, but move away most of the time
@@ -163,8 +261,8 @@ def combat_action_picker(character, action):
                 return actions_dict[24]
             else:
                 log_file(f"unknown decision tree for {character.name} while in \
-                         range: {character.ndb.range} and \
-                         position: {character.db.info['Position']}. \
+                         range: {character.combat_state.range} and \
+                         position: {character.info['Position']}. \
                          Desired action: {action}", \
                          filename='error.log')
         else:
@@ -193,12 +291,12 @@ def combat_action_picker(character, action):
                 return actions_dict[24]
             else:
                 log_file(f"unknown decision tree for {character.name} while in \
-                         range: {character.ndb.range} and \
-                         position: {character.db.info['Position']}. \
+                         range: {character.combat_state.range} and \
+                         position: {character.info['Position']}. \
                          Desired action: {action}", \
                          filename='error.log')
-    elif character.ndb.range == 'melee':
-        if character.db.info['Position'] in ['sitting', 'supine', 'prone', \
+    elif character.combat_state.range == 'melee':
+        if character.info['Position'] in ['sitting', 'supine', 'prone', \
                                              'sleeping']:
             return actions_dict[27]
         elif action in ['ranged_weapon_strike', 'mental_attack']:
@@ -224,11 +322,11 @@ def combat_action_picker(character, action):
             return actions_dict[24]
         else:
             log_file(f"unknown decision tree for {character.name} while in \
-                     range: {character.ndb.range} and \
-                     position: {character.db.info['Position']}. \
+                     range: {character.combat_state.range} and \
+                     position: {character.info['Position']}. \
                      Desired action: {action}",
                      filename='error.log')
-    elif character.ndb.range == 'ranged':
+    elif character.combat_state.range == 'ranged':
         if action  == 'ranged_weapon_strike':
             return actions_dict[26]
         elif action == 'mental_attack':
@@ -249,11 +347,11 @@ def combat_action_picker(character, action):
             return actions_dict[25]
         else:
             log_file(f"unknown decision tree for {character.name} while in \
-                     range: {character.ndb.range} and \
-                     position: {character.db.info['Position']}. \
+                     range: {character.combat_state.range} and \
+                     position: {character.info['Position']}. \
                      Desired action: {action}",
                      filename='error.log')
-    elif character.ndb.range == 'out_of_range':
+    elif character.combat_state.range == 'out_of_range':
         if action == 'taunt':
             return actions_dict[17]
         elif action == 'flee':
@@ -266,8 +364,8 @@ def combat_action_picker(character, action):
             return actions_dict[25]
     else:
         log_file(f"unknown decision tree for {character.name} while in \
-                 range: {character.ndb.range} and \
-                 position: {character.db.info['Position']}. \
+                 range: {character.combat_state.range} and \
+                 position: {character.info['Position']}. \
                  Desired action: {action}",
                  filename='error.log')
     log_file(f"Decision tree for curating action failed. Returning None for {character.name} - action: {action}.", \
@@ -282,96 +380,166 @@ def resolve_grappling_action(character, action):
     in affects the liklihood of an character choosing certain actions.
     """
     log_file("start of resolve grappling action func.", filename='combat_step.log')
-    possible_grappling_actions = ['takedown', 'improve_position', 'submission', \
-                                  'unarmed_strike_normal', 'unarmed_strike_natural_weapons', \
-                                  'melee_weapon_strike']
     # if character is standing, we want to improve position (move into a grappling position)
-    if character.db.info['Position'] == 'standing':
+    if character.info['Position'] == 'standing':
         log_file(f"character in position standing. takedown is the action to do.", \
                  filename='combat_step.log')
         grappling_action = ['takedown']
-    elif character.db.info['Position'] in ['side controlled', 'mounted', \
-                                          'prmounted', 'standingbt']:
-        log_file(f"character in position side controlled, mounted, or worse. generating choices", \
-                 filename='combat_step.log')
-        grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 95, 5, 0, 0, 0), k=1)
-    elif character.db.info['Position'] in ['top', 'in guard']:
-        log_file(f"character in position top or guard. generating choices", \
-                 filename='combat_step.log')
-        if character.mutations.sharp_claws.actual > 0:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 30, 30, 0, 40, 0), k=1)
-            # TODO: Add conditional for wielding a small melee weapon
-        else:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 30, 30, 40, 0, 0), k=1)
-    elif character.db.info['Position'] in ['clinching', 'clinched']:
-        log_file(f"character in position clinching or clinched. generating choices", \
+    else:
+        log_file(f"character in position {character.info['Position']}. generating choices", \
                  filename='combat_step.log')
-        if character.mutations.sharp_claws.actual > 0:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 40, 30, 0, 30, 0), k=1)
         # TODO: Add conditional for wielding a small melee weapon
-        else:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 40, 30, 30, 0, 0), k=1)
-    elif character.db.info['Position'] in ['tbmount', 'tbstanding']:
-        log_file(f"character in position tbmount or tbstanding. generating choices", \
-                 filename='combat_step.log')
-        if character.mutations.sharp_claws.actual > 0:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 0, 70, 0, 30, 0), k=1)
-            # TODO: Add conditional for wielding a small melee weapon
-        else:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 0, 70, 30, 0, 0), k=1)
-    else:
-        if character.mutations.sharp_claws.actual > 0:
-            log_file(f"character in position unknown. generating choices", \
-                     filename='combat_step.log')
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 10, 25, 0, 65, 0), k=1)
-            # TODO: Add conditional for wielding a small melee weapon
-        else:
-            grappling_action = random.choices(possible_grappling_actions, \
-                           weights=(0, 10, 25, 65, 0, 0), k=1)
+        natural_weapons = character.mutations.sharp_claws.actual > 0
+        weights = GRAPPLING_ACTION_WEIGHTS.get(character.info['Position'], \
+                                               DEFAULT_GRAPPLING_WEIGHTS)[natural_weapons]
+        grappling_action = random.choices(GRAPPLING_ACTIONS, weights=weights, k=1)
     grappling_action = str(grappling_action[0])
     log_file(f"{character.name} is doing grappling action: {grappling_action}", \
              filename='combat_step.log')
     return grappling_action
 
 
-def apply_damage(attacker, defender, attack_type, critical_hit):
+# a single hit that landed during a round
+Hit = namedtuple('Hit', ('attacker', 'defender', 'attack_type', 'critical_hit'))
+
+# damage types.
+#   ability - the attacker's ability score that drives the damage dice
+#   dice - fraction of the ability score rolled for damage
+#   weapon - True if the attacker's equipment damage multiplier applies
+#   armor - the defender's armor multiplier (see CombatantState) that reduces damage
+#   split - fraction of the damage that goes to each of the defender's gauges
+#   armored - the gauges that the armor protects. critical hits bypass armor.
+DAMAGE_TYPES = {
+    'unarmed': {'ability': 'Str', 'dice': .5, 'weapon': False, \
+                'armor': 'eq_phy_arm', 'split': {'hp': 1}, 'armored': ('hp',)},
+    'melee_weapons': {'ability': 'Str', 'dice': 1, 'weapon': True, \
+                      'armor': 'eq_phy_arm', 'split': {'hp': 1}, 'armored': ('hp',)},
+    # submissions bypass armor for damage to stamina, but armor has an
+    # effect on the damage to health
+    'submission': {'ability': 'Str', 'dice': .5, 'weapon': False, \
+                   'armor': 'eq_phy_arm', 'split': {'sp': .75, 'hp': .25}, \
+                   'armored': ('hp',)},
+    # damage is applied to conviction pool. Psychokinetic attacks are generated
+    # by the mind, but have physical effects (like a hurled projectile or fire)
+    # and should use a physical damage type
+    'mental': {'ability': 'Cha', 'dice': .5, 'weapon': False, \
+               'armor': 'eq_men_arm', 'split': {'cp': 1}, 'armored': ('cp',)},
+}
+GAUGES = ('hp', 'sp', 'cp')
+# DAMAGE_TYPES as rows of the fraction of damage to each gauge, and of the
+# gauges armor protects
+DAMAGE_SPLITS = {attack_type: np.array([damage_type['split'].get(gauge, 0) for gauge in GAUGES]) \
+                 for attack_type, damage_type in DAMAGE_TYPES.items()}
+DAMAGE_ARMORED = {attack_type: np.array([gauge in damage_type['armored'] for gauge in GAUGES]) \
+                  for attack_type, damage_type in DAMAGE_TYPES.items()}
+
+
+def calculate_damage(hits):
     """
-    Master function for applying damage. Damage multipliers from equipment
-    and armor multipliers will be applied to the damage. This function will
-    also do checks to determine if the defender's health, stamina, and
-    conviction pools are above zero. If they are not, the death/exhaustion/
-    ennunu functions will be called.
+    Calculates the damage done to each gauge for a batch of hits.
+
+    The damage dice for every hit are rolled at once with roll_many (the
+    attackers still get a chance to learn from them), then the equipment and
+    armor multipliers are applied to the whole batch.
+
+    Returns an array of shape (number of hits, 3) with the damage done to the
+    hp, sp and cp of the defender of each hit.
     """
-    log_file("start of apply damage func in combat rules", filename='combat_step.log')
-    if attack_type == "submission":
-        # submissions bypass armor for damage to stamina, but armor has an
-        # effect onm the damage to health
-        pass
-    elif attack_type == "mental_attack_non_psychokinetic":
-        # damage is applied to conviction pool. Psychokinetic are generated by
-        # the mind, but have physical effects (like a hurled projectile or fire)
-        pass
-    else:
-        # all damage types that do physical damage are affcted by armor if they
-        # aren't critical hits
-        damage = round(roll( (attacker.ability_scores.Str.actual * attacker.ndb.eq_damage / defender.ndb.eq_phy_arm), \
-                 'very flat', attacker.ability_scores.Str))
-        defender.traits.hp.current -= damage
-        log_file(f"{attacker.name} hit {defender.name} for {damage} damage. \
-                 They have {defender.traits.hp.actual} hps left.", \
+    if not hits:
+        return np.zeros((0, len(GAUGES)))
+    means = np.empty(len(hits))
+    learners = []
+    weapon = np.ones(len(hits))
+    armor = np.ones(len(hits))
+    split = np.zeros((len(hits), len(GAUGES)))
+    armored = np.zeros((len(hits), len(GAUGES)), dtype=bool)
+    for i, hit in enumerate(hits):
+        damage_type = DAMAGE_TYPES[hit.attack_type]
+        ability = hit.attacker.ability_scores[damage_type['ability']]
+        means[i] = ability.actual * damage_type['dice']
+        learners.append((ability,))
+        if damage_type['weapon']:
+            weapon[i] = hit.attacker.combat_state.eq_damage or 1
+        armor[i] = getattr(hit.defender.combat_state, damage_type['armor']) or 1
+        split[i] = DAMAGE_SPLITS[hit.attack_type]
+        armored[i] = DAMAGE_ARMORED[hit.attack_type]
+    base, crits, crit_fails = roll_many(means, 'very flat', learners)
+    critical = np.array([hit.critical_hit for hit in hits], dtype=bool)
+    return scale_damage(base, weapon, armor, critical, split, armored)
+
+
+def scale_damage(base, weapon, armor, critical, split, armored):
+    """
+    Applies the equipment and armor multipliers to rolled damage and splits
+    it between the gauges. All damage to armored gauges is reduced by armor
+    unless it is a critical hit.
+
+    Args:
+        base (array of float): rolled damage of each hit
+        weapon (array of float): attacker's equipment damage multipliers
+        armor (array of float): defender's armor multipliers
+        critical (array of bool): True for critical hits
+        split (array): (number of hits, 3) fraction of the damage that goes
+            to each gauge, see DAMAGE_SPLITS
+        armored (array): (number of hits, 3) True for the gauges armor
+            protects, see DAMAGE_ARMORED
+    Returns an array of shape (number of hits, 3) with the damage to each gauge.
+    """
+    armor = np.where(critical, 1, armor)
+    damage = (base * weapon)[:, None] * split
+    damage = np.where(armored, damage / armor[:, None], damage)
+    return np.round(np.maximum(damage, 0))
+
+
+def apply_damage_batch(hits, check_health=True, ledger=None):
+    """
+    Master function for applying damage. Takes all of the hits of a round,
+    works out their damage with calculate_damage and then applies it with a
+    single write to the gauges of each defender. If a ResourceLedger (see
+    world.resource_ledger) is given, the damage is charged to the ledger
+    instead and applied when the ledger is committed. After the damage is
+    applied, checks if any defender's health is gone unless check_health is
+    False.
+
+    Returns a list with the total damage of each hit.
+    """
+    log_file("start of apply damage batch func in combat rules", filename='combat_step.log')
+    damage = calculate_damage(hits)
+    # total up the damage to each defender
+    defenders = {}
+    for i, hit in enumerate(hits):
+        defenders.setdefault(hit.defender.id, (hit.defender, []))[1].append(i)
+    for defender, indices in defenders.values():
+        # python floats, Trait setters ignore numpy numbers
+        totals = [float(total) for total in damage[indices].sum(axis=0)]
+        log_file(f"{defender.name} took {totals[0]} hp, {totals[1]} sp and {totals[2]} cp damage from {len(indices)} hits.", \
                  filename='combat.log')
+        if ledger is not None:
+            for gauge, total in zip(GAUGES, totals):
+                ledger.charge(defender, gauge, total)
+        else:
+            defender.traits.apply_current_deltas( \
+                {gauge: -total for gauge, total in zip(GAUGES, totals)})
+    if check_health and ledger is None:
+        check_for_fallen([defender for defender, indices in defenders.values()])
+    return [int(total) for total in damage.sum(axis=1)]
+
+
+def check_for_fallen(defenders):
+    """
+    Checks if any of the defenders have run out of health.
+    """
+    for defender in defenders:
         if defender.traits.hp.actual < 1:
             # TODO: Implement death - for now we'll just flee
             defender.execute_cmd('flee')
-        return damage
+
+
+def apply_damage(attacker, defender, attack_type, critical_hit):
+    """
+    Applies the damage of a single hit. See apply_damage_batch.
+    """
+    return apply_damage_batch([Hit(attacker, defender, attack_type, critical_hit)])[0]
 
 
 def check_shield_block_multiplier(defender):
@@ -383,6 +551,6 @@ def check_shield_block_multiplier(defender):
     shield_block_multiplier = 1
     for slot in defender.db.slots:
         if slot != None:
-            if utils.inherits_from(slot, 'typeclasses.armors.Shield'):
+            if has_capability(slot, 'shield'):
                 shield_block_multiplier *= slot.db.physical_armor_value
     return shield_block_multiplier
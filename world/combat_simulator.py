@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo balance simulator for combat.
+
+Balancing combat (talent vs ability weightings, position modifiers, takedown
+thresholds, ...) takes a huge number of fights to see the effect of a change,
+far more than the live combat handler can run. The simulator plays out duels
+between pure-data combatants (SimCombatant) with no db, scripts or messaging,
+thousands of fights at once:
+
+- every fight of a batch is a row of numpy arrays, and each step of a round is
+  worked out for all of the rows together
+- batches are fanned out over a ProcessPoolExecutor, one seeded stream each
+- the results come back as win-rate and round-length tables
+
+The rules are shared with live combat wherever they are data: the dice roller
+(roll_many), opposed checks and their band tables, position modifiers, the
+grappling transition table, the grappling action weights and damage scaling.
+The rest mirrors the combat handler, combat_action_picker and the combat
+action objects in typeclasses/combat_actions.py, in the order they run:
+
+- each combatant steps in turn, refreshing their combat modifiers and rolling
+  their number of actions first
+- a combatant at their wimpy threshold flees and loses. One at their yield
+  threshold yields and loses if the other combatant is merciful, otherwise
+  they do nothing for the rest of the fight
+- costs and damage are committed at the end of the round, like the resource
+  ledger. A combatant whose health runs out flees at their next step
+- actions with no combat action object yet (changing range, standing up,
+  natural weapons, ...) do nothing, same as in live combat
+
+Designers can try out changes without touching the live rules by passing a
+SimRules with new position modifiers, band tables or strike profiles.
+
+**Use**
+    From `evennia shell`:
+    ```python
+    >>> from world import combat_simulator as cs
+    >>> brawler = cs.SimCombatant('brawler', Str=130, unarmed_striking=150)
+    >>> grappler = cs.SimCombatant('grappler', grappling=150, default_attack='grapple')
+    >>> results = cs.run_matchups([brawler, grappler], fights=100000, workers=4)
+    >>> print(cs.win_rate_table(results))
+    >>> print(cs.round_length_table(results))
+    ```
+    or from the game directory:
+        python -m world.combat_simulator roster.json --fights 100000 --workers 4
+    where roster.json is a list of SimCombatant fields for each combatant.
+"""
+import json
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from world.dice_roller import roll_many
+from world import grappling_rules as gr
+from world.combat_rules import opposed_check, scale_damage, POSITION_MODIFIERS, \
+                               TAKEDOWN_BANDS, IMPROVE_POSITION_BANDS, ESCAPE_BANDS, \
+                               SUBMISSION_BANDS, GRAPPLING_ACTION_WEIGHTS, \
+                               DEFAULT_GRAPPLING_WEIGHTS, DAMAGE_TYPES, \
+                               DAMAGE_SPLITS, DAMAGE_ARMORED, GAUGES
+
+# fights per batch sent to a worker process
+SIM_BATCH_SIZE = 5000
+# fights that last longer than this are draws
+SIM_MAX_ROUNDS = 200
+
+# a combatant as plain data. Gauge maximums are worked out from the ability
+# scores the same way Character.at_object_creation does.
+SimCombatant = namedtuple('SimCombatant', \
+    ('name', 'Dex', 'Str', 'Vit', 'Per', 'Cha', 'unarmed_striking', \
+     'melee_weapons', 'grappling', 'footwork', 'mass', 'sharp_claws', \
+     'enc_mod', 'eq_damage', 'eq_phy_arm', 'eq_men_arm', 'default_attack', \
+     'wimpy', 'yield_at', 'mercy'), \
+    defaults=(100, 100, 100, 100, 100, 100, 100, 100, 100, 180, 0, \
+              1, 1, 1, 1, 'unarmed_strike', 100, 200, True))
+
+# attack talent, combat modifier (footwork or groundwork), dodge and block
+# fractions of the defender's Dex and Str, and damage type of each strike
+StrikeProfile = namedtuple('StrikeProfile', ('talent', 'mod', 'dodge', 'block', \
+                                             'attack_type'))
+STRIKE_PROFILES = {
+    'unarmed_strike_normal': StrikeProfile('unarmed_striking', 'footwork', .95, .9, 'unarmed'),
+    'melee_weapon_strike': StrikeProfile('melee_weapons', 'footwork', .9, .9, 'melee_weapons'),
+    'grapple_unarmed_strike_normal': StrikeProfile('unarmed_striking', 'groundwork', .9, .9, 'unarmed'),
+    'grapple_melee_weapon_strike': StrikeProfile('melee_weapons', 'groundwork', .9, .9, 'melee_weapons'),
+}
+
+# the rules a simulation runs with. Defaults to the live rules.
+SimRules = namedtuple('SimRules', ('position_modifiers', 'takedown_bands', \
+                                   'improve_position_bands', 'escape_bands', \
+                                   'submission_bands', 'strike_profiles'), \
+                      defaults=(POSITION_MODIFIERS, TAKEDOWN_BANDS, \
+                                IMPROVE_POSITION_BANDS, ESCAPE_BANDS, \
+                                SUBMISSION_BANDS, STRIKE_PROFILES))
+
+# results of a matchup. wins is (first combatant, second combatant, draws),
+# rounds is a histogram of fight lengths and reasons counts the ways fights
+# ended (see END_REASONS)
+MatchupResult = namedtuple('MatchupResult', ('first', 'second', 'fights', 'wins', \
+                                             'rounds', 'reasons'))
+END_REASONS = ('time', 'fled', 'yielded')
+
+# curated actions, as codes
+(NOTHING, UNARMED, MELEE, TAKEDOWN, IMPROVE, G_UNARMED, G_MELEE, SUBMISSION, \
+ ESCAPE) = range(9)
+_STRIKE_CODES = {UNARMED: 'unarmed_strike_normal', MELEE: 'melee_weapon_strike', \
+                 G_UNARMED: 'grapple_unarmed_strike_normal', \
+                 G_MELEE: 'grapple_melee_weapon_strike'}
+# resolve_grappling_action's choices, as codes. Natural weapons have no
+# combat action object yet.
+_GRAPPLING_CODES = np.array([TAKEDOWN, IMPROVE, SUBMISSION, G_UNARMED, NOTHING, G_MELEE])
+
+# ranges, as codes
+GRAPPLE_RANGE, MELEE_RANGE, RANGED_RANGE, OUT_OF_RANGE = range(4)
+
+_STANDING = gr.POSITION_INDEX['standing']
+_BAD_POSITIONS = np.array([position in ('side controlled', 'mounted', 'prmounted', \
+                                        'standingbt') for position in gr.POSITIONS])
+_DOWN_POSITIONS = np.array([position in ('sitting', 'supine', 'prone', 'sleeping') \
+                            for position in gr.POSITIONS])
+_MIRRORS = np.array([gr.POSITION_INDEX.get(gr.mirror(position), -1) \
+                     for position in gr.POSITIONS])
+
+
+def _grappling_weight_table(natural_weapons):
+    """Cumulative grappling action weights for every position."""
+    table = np.array([GRAPPLING_ACTION_WEIGHTS.get(position, DEFAULT_GRAPPLING_WEIGHTS)[natural_weapons] \
+                      for position in gr.POSITIONS], dtype=float)
+    return np.cumsum(table, axis=1) / table.sum(axis=1, keepdims=True)
+
+
+_GRAPPLING_WEIGHTS = (_grappling_weight_table(False), _grappling_weight_table(True))
+
+
+def gauge_maximums(combatant):
+    """Returns the (hp, sp, cp) maximums of a combatant."""
+    return (combatant.Vit * 5 + combatant.Cha * 2, \
+            combatant.Vit * 3 + combatant.Str * 2 + combatant.Dex, \
+            combatant.Cha * 5 + combatant.Vit)
+
+
+def from_character(character, default_attack=None):
+    """
+    Builds a SimCombatant from a live character, with their current traits
+    and equipment.
+    """
+    character.calculate_equipment_bonuses()
+    scores = character.ability_scores
+    talents = character.talents
+    info = character.info
+    return SimCombatant(character.name, scores.Dex.actual, scores.Str.actual, \
+                        scores.Vit.actual, scores.Per.actual, scores.Cha.actual, \
+                        talents.unarmed_striking.actual, talents.melee_weapons.actual, \
+                        talents.grappling.actual, talents.footwork.actual, \
+                        character.traits.mass.actual, \
+                        character.mutations.sharp_claws.actual, 1, \
+                        character.combat_state.eq_damage, \
+                        character.combat_state.eq_phy_arm, \
+                        character.combat_state.eq_men_arm, \
+                        default_attack or info['Default Attack'], info['Wimpy'], \
+                        info['Yield'], info['Mercy'])
+
+
+class _Side(object):
+    """The state of one combatant across a batch of fights."""
+    def __init__(self, combatant, fights, rules):
+        self.spec = combatant
+        self.maximums = np.array(gauge_maximums(combatant), dtype=float)
+        # gauges, (fights, 3)
+        self.gauges = np.tile(self.maximums, (fights, 1))
+        # costs and damage for the round, committed at the end of it
+        self.pending = np.zeros((fights, len(GAUGES)))
+        self.position = np.full(fights, _STANDING)
+        start_range = MELEE_RANGE if combatant.default_attack in \
+                      ('unarmed_strike', 'melee_weapon_strike', 'bash', 'grapple') \
+                      else OUT_OF_RANGE
+        self.range = np.full(fights, start_range)
+        self.yielding = np.zeros(fights, dtype=bool)
+        self.fleeing = np.zeros(fights, dtype=bool)
+        self.footwork = np.ones(fights)
+        self.groundwork = np.ones(fights)
+        self.actions = np.ones(fights, dtype=int)
+        self.position_modifiers = np.array([rules.position_modifiers.get(position, 1) \
+                                            for position in gr.POSITIONS])
+
+    def refresh(self, rows, rng):
+        """
+        Refreshes the combat modifiers and number of actions for some fights,
+        like the combat handler does before a combatant's step.
+        """
+        spec = self.spec
+        status = np.prod((self.gauges[rows] / self.maximums) ** .15, axis=1) * \
+                 self.position_modifiers[self.position[rows]] * spec.enc_mod
+        self.groundwork[rows] = roll_many((spec.grappling + spec.mass) * status, \
+                                          'flat', rng=rng)[0] / 250
+        self.footwork[rows] = roll_many(spec.footwork * status, 'flat', rng=rng)[0] / 100
+        self.actions[rows] = np.round(roll_many(np.full(len(rows), (spec.Dex + spec.Vit) * \
+                                                        spec.enc_mod), \
+                                                'very flat', rng=rng)[0] / 100)
+
+    def spend(self, rows, amount):
+        """Charges stamina for the round."""
+        self.pending[rows, GAUGES.index('sp')] += amount / self.spec.enc_mod
+
+    def commit(self):
+        """Applies the round's costs and damage. Gauges can't go below 0."""
+        self.gauges = np.maximum(self.gauges - self.pending, 0)
+        self.pending[:] = 0
+
+
+def _pick_actions(side, rows, rng):
+    """
+    Picks the curated action of a combatant for some fights, the same way
+    combat_action_picker does for the combatant's default attack.
+    """
+    spec = side.spec
+    position = side.position[rows]
+    range_ = side.range[rows]
+    draws = rng.random(len(rows))
+    claws = spec.sharp_claws > 0
+    actions = np.full(len(rows), NOTHING)
+    if spec.default_attack == 'grapple':
+        choices = (draws[:, None] > _GRAPPLING_WEIGHTS[claws][position]).sum(axis=1)
+        actions = _GRAPPLING_CODES[np.minimum(choices, len(_GRAPPLING_CODES) - 1)]
+        return np.where(position == _STANDING, TAKEDOWN, actions)
+    if spec.default_attack not in ('unarmed_strike', 'melee_weapon_strike'):
+        return actions
+    melee = spec.default_attack == 'melee_weapon_strike'
+    # in melee range, strike unless down on the ground
+    strike = NOTHING if claws and not melee else (MELEE if melee else UNARMED)
+    actions = np.where((range_ == MELEE_RANGE) & ~_DOWN_POSITIONS[position], strike, actions)
+    # in grappling range, escape bad positions, otherwise strike some of the
+    # time and back away or escape the rest of the time
+    grapple_strike = G_MELEE if melee else (NOTHING if claws else G_UNARMED)
+    standing = position == _STANDING
+    strikes = draws < np.where(standing & melee, .3, .5)
+    grappling = np.where(strikes, grapple_strike, np.where(standing, NOTHING, ESCAPE))
+    grappling = np.where(_BAD_POSITIONS[position], ESCAPE, grappling)
+    return np.where(range_ == GRAPPLE_RANGE, grappling, actions)
+
+
+def _strikes(attacker, defender, rows, profile, rng, hits):
+    """Carries out a round of strikes for some fights."""
+    a_spec, d_spec = attacker.spec, defender.spec
+    a_mod = getattr(attacker, profile.mod)
+    d_mod = getattr(defender, profile.mod)
+    talent = getattr(a_spec, profile.talent)
+    for i in range(int(attacker.actions[rows].max(initial=0))):
+        rows = rows[attacker.actions[rows] > i]
+        if not len(rows):
+            break
+        attack = np.round(roll_many(talent * a_mod[rows], 'flat', rng=rng)[0])
+        attacker.spend(rows, 12)
+        dodge = np.round(roll_many(d_spec.Dex * d_mod[rows] * profile.dodge, 'flat', rng=rng)[0])
+        block = np.round(roll_many(d_spec.Str * d_mod[rows] * profile.block, 'flat', rng=rng)[0])
+        defender.spend(rows, 5)
+        landed = (dodge <= attack) & (block <= attack)
+        critical = attack > dodge + block
+        hits.append((profile.attack_type, rows[landed], critical[landed]))
+
+
+def _grappling_rolls(attacker, defender, rows, rng):
+    """Opposed grappling rolls, as used by improve position and submissions."""
+    attack = np.round(roll_many(attacker.spec.grappling * attacker.groundwork[rows], \
+                                'flat', rng=rng)[0])
+    block = np.round(roll_many(defender.spec.grappling * defender.groundwork[rows], \
+                               'flat', rng=rng)[0])
+    return attack, block
+
+
+def _take_step(attacker, defender, rows, rules, rng, hits, outcome):
+    """One combatant's step of a round, for the fights in `rows`."""
+    spec = attacker.spec
+    attacker.refresh(rows, rng)
+    # fleeing and yielding, like Character.check_wimpyield
+    hp = attacker.gauges[rows, 0]
+    sp = attacker.gauges[rows, 1]
+    flee = attacker.fleeing[rows] | (hp <= spec.wimpy) | ((hp > spec.yield_at) & (sp <= spec.wimpy))
+    attacker.yielding[rows] |= ~flee & ((hp <= spec.yield_at) | (sp <= spec.yield_at))
+    yields = ~flee & attacker.yielding[rows]
+    outcome[rows[flee]] = 1
+    if defender.spec.mercy:
+        outcome[rows[yields]] = 2
+    rows = rows[~flee & ~yields]
+    if not len(rows):
+        return
+    actions = _pick_actions(attacker, rows, rng)
+    for code, action in _STRIKE_CODES.items():
+        _strikes(attacker, defender, rows[actions == code], rules.strike_profiles[action], \
+                 rng, hits)
+    # takedowns re-use the groundwork rolls
+    takedown = rows[actions == TAKEDOWN]
+    if len(takedown):
+        attacker.spend(takedown, 20)
+        defender.spend(takedown, 12)
+        bands = opposed_check(attacker.groundwork[takedown], defender.groundwork[takedown], \
+                              rules.takedown_bands)
+        moved = takedown[bands != gr.FAILURE]
+        bands = bands[bands != gr.FAILURE]
+        attacker.position[moved], defender.position[moved] = \
+            gr.resolve(gr.TAKEDOWN, attacker.position[moved], defender.position[moved], bands)
+        attacker.range[moved] = defender.range[moved] = GRAPPLE_RANGE
+    # improving position only works if the combatants are grappling each other
+    improve = rows[actions == IMPROVE]
+    improve = improve[_MIRRORS[attacker.position[improve]] == defender.position[improve]]
+    if len(improve):
+        attacker.spend(improve, 18)
+        defender.spend(improve, 15)
+        bands = opposed_check(*_grappling_rolls(attacker, defender, improve, rng), \
+                              rules.improve_position_bands)
+        attacker.position[improve], defender.position[improve] = \
+            gr.resolve(gr.IMPROVE_POSITION, attacker.position[improve], \
+                       defender.position[improve], bands)
+    submission = rows[actions == SUBMISSION]
+    if len(submission):
+        attacker.spend(submission, 15)
+        defender.spend(submission, 12)
+        bands = opposed_check(*_grappling_rolls(attacker, defender, submission, rng), \
+                              rules.submission_bands)
+        landed = submission[bands == gr.SUCCESS]
+        hits.append(('submission', landed, np.zeros(len(landed), dtype=bool)))
+    escape = rows[actions == ESCAPE]
+    if len(escape):
+        escape_roll = np.round(roll_many(spec.grappling * attacker.groundwork[escape], \
+                                         'flat', rng=rng)[0])
+        escape_defense = np.round(roll_many(defender.groundwork[escape] * 100, 'flat', \
+                                            rng=rng)[0])
+        escaped = escape[opposed_check(escape_roll, escape_defense, rules.escape_bands) \
+                         == gr.SUCCESS]
+        attacker.position[escaped] = defender.position[escaped] = _STANDING
+        attacker.range[escaped] = MELEE_RANGE
+        defender.range[escaped] = np.where(defender.range[escaped] == GRAPPLE_RANGE, \
+                                           MELEE_RANGE, defender.range[escaped])
+
+
+def _apply_hits(attacker, defender, hits, rng):
+    """Rolls the damage of the attacker's hits and charges it to the defender."""
+    for attack_type, rows, critical in hits:
+        if not len(rows):
+            continue
+        damage_type = DAMAGE_TYPES[attack_type]
+        ability = getattr(attacker.spec, damage_type['ability'])
+        base = roll_many(np.full(len(rows), ability * damage_type['dice']), 'very flat', \
+                         rng=rng)[0]
+        weapon = attacker.spec.eq_damage if damage_type['weapon'] else 1
+        armor = getattr(defender.spec, damage_type['armor']) or 1
+        damage = scale_damage(base, np.full(len(rows), weapon), np.full(len(rows), armor), \
+                              critical, DAMAGE_SPLITS[attack_type], \
+                              DAMAGE_ARMORED[attack_type])
+        np.add.at(defender.pending, rows, damage)
+
+
+def simulate(first, second, fights=SIM_BATCH_SIZE, seed=None, rules=None, \
+             max_rounds=SIM_MAX_ROUNDS):
+    """
+    Simulates a batch of duels, with the first combatant starting the fight
+    (and stepping first every round) like the attacker in live combat.
+
+    Args:
+        first, second (SimCombatant): the combatants
+        fights (int): number of fights
+        seed (int or SeedSequence, optional): seed for the batch
+        rules (SimRules, optional): rules to simulate, the live ones if None
+        max_rounds (int): fights still going after this many rounds are draws
+
+    Returns:
+        MatchupResult for the batch
+    """
+    rules = rules or SimRules()
+    rng = np.random.default_rng(seed)
+    sides = (_Side(first, fights, rules), _Side(second, fights, rules))
+    # winner of each fight, -1 while still fighting or a draw
+    winners = np.full(fights, -1)
+    lengths = np.full(fights, max_rounds)
+    reasons = np.zeros(fights, dtype=int)
+    # the combat handler refreshes everyone when they join the fight
+    everyone = np.arange(fights)
+    for side in sides:
+        side.refresh(everyone, rng)
+    for round_count in range(1, max_rounds + 1):
+        going = np.flatnonzero(winners < 0)
+        if not len(going):
+            break
+        hits = ([], [])
+        for index, (attacker, defender) in enumerate((sides, sides[::-1])):
+            outcome = np.zeros(fights, dtype=int)
+            _take_step(attacker, defender, going, rules, rng, hits[index], outcome)
+            # the fight is over for anyone who fled or yielded
+            ended = np.flatnonzero(outcome)
+            winners[ended] = 1 - index
+            lengths[ended] = round_count
+            reasons[ended] = outcome[ended]
+            going = going[outcome[going] == 0]
+        for index, (attacker, defender) in enumerate((sides, sides[::-1])):
+            _apply_hits(attacker, defender, hits[index], rng)
+        for side in sides:
+            side.commit()
+            # fallen combatants flee at their next step
+            side.fleeing |= side.gauges[:, 0] < 1
+    wins = (int((winners == 0).sum()), int((winners == 1).sum()), \
+            int((winners < 0).sum()))
+    rounds = np.bincount(lengths, minlength=max_rounds + 1)
+    return MatchupResult(first.name, second.name, fights, wins, rounds, \
+                         np.bincount(reasons, minlength=len(END_REASONS)))
+
+
+def _simulate_batch(args):
+    """Runs a batch of simulate in a worker process."""
+    return simulate(*args)
+
+
+def _combine(results):
+    """Adds up the results of the batches of a matchup."""
+    first = results[0]
+    return MatchupResult(first.first, first.second, \
+                         sum(result.fights for result in results), \
+                         tuple(int(sum(wins)) for wins in zip(*(result.wins for result in results))), \
+                         sum(result.rounds for result in results), \
+                         sum(result.reasons for result in results))
+
+
+def run_matchups(combatants, fights=100000, seed=None, rules=None, workers=None, \
+                 batch_size=SIM_BATCH_SIZE, max_rounds=SIM_MAX_ROUNDS):
+    """
+    Simulates every ordered pair of combatants, fanning the fights out over a
+    process pool in batches of batch_size, each with its own seeded stream.
+
+    Args:
+        combatants (list of SimCombatant): the roster
+        fights (int): fights per matchup
+        seed (int, optional): seed for the whole run
+        rules (SimRules, optional): rules to simulate, the live ones if None
+        workers (int, optional): number of worker processes. 0 runs
+            everything in this process.
+        batch_size (int): fights per batch
+        max_rounds (int): fights still going after this many rounds are draws
+
+    Returns:
+        dict of (first name, second name): MatchupResult
+    """
+    rules = rules or SimRules()
+    matchups = [(first, second) for first in combatants for second in combatants \
+                if first is not second]
+    sizes = [batch_size] * (fights // batch_size)
+    if fights % batch_size:
+        sizes.append(fights % batch_size)
+    seeds = iter(np.random.SeedSequence(seed).spawn(len(matchups) * len(sizes)))
+    jobs = [(first, second, size, next(seeds), rules, max_rounds) \
+            for first, second in matchups for size in sizes]
+    if workers == 0:
+        batches = [_simulate_batch(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(_simulate_batch, jobs, chunksize=max(1, len(jobs) // 64)))
+    results = {}
+    for (first, second), start in zip(matchups, range(0, len(batches), len(sizes))):
+        results[(first.name, second.name)] = _combine(batches[start:start + len(sizes)])
+    return results
+
+
+def _names(results):
+    """Combatant names in the order they first show up in the results."""
+    names = []
+    for first, second in results:
+        for name in (first, second):
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def win_rate_table(results):
+    """
+    Returns a table of win rates as text. Each cell is how often the row's
+    combatant beat the column's, over the fights where either one started.
+    """
+    names = _names(results)
+    width = max(8, max(len(name) for name in names) + 1)
+    lines = [" " * width + "".join(f"{name:>{width}}" for name in names)]
+    for row in names:
+        cells = []
+        for column in names:
+            if row == column:
+                cells.append(f"{'-':>{width}}")
+                continue
+            started = results[(row, column)]
+            defended = results[(column, row)]
+            wins = started.wins[0] + defended.wins[1]
+            cells.append(f"{wins / (started.fights + defended.fights):>{width}.1%}")
+        lines.append(f"{row:<{width}}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def round_length_table(results):
+    """
+    Returns a table of fight lengths as text, one row per matchup, with the
+    first combatant starting the fights. Fights that ran out of time are draws.
+    """
+    lines = [f"{'matchup':<32}{'mean':>8}{'median':>8}{'p90':>8}" + \
+             "".join(f"{reason:>9}" for reason in END_REASONS)]
+    for (first, second), result in results.items():
+        rounds = result.rounds
+        cumulative = np.cumsum(rounds) / rounds.sum()
+        mean = (np.arange(len(rounds)) * rounds).sum() / rounds.sum()
+        median = int(np.searchsorted(cumulative, .5))
+        p90 = int(np.searchsorted(cumulative, .9))
+        reasons = "".join(f"{count / result.fights:>9.1%}" for count in result.reasons)
+        lines.append(f"{first + ' v ' + second:<32}{mean:>8.1f}{median:>8}{p90:>8}" + reasons)
+    return "\n".join(lines)
+
+
+def main(args=None):
+    """Runs the simulator from the command line."""
+    parser = argparse.ArgumentParser(description="Simulate duels between combatants.")
+    parser.add_argument('roster', help="json file with a list of SimCombatant fields")
+    parser.add_argument('--fights', type=int, default=100000, help="fights per matchup")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-rounds', type=int, default=SIM_MAX_ROUNDS)
+    options = parser.parse_args(args)
+    with open(options.roster) as roster_file:
+        combatants = [SimCombatant(**fields) for fields in json.load(roster_file)]
+    results = run_matchups(combatants, options.fights, options.seed, \
+                           workers=options.workers, max_rounds=options.max_rounds)
+    print(win_rate_table(results))
+    print()
+    print(round_length_table(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Per-round combat state of a combatant.
+
+Everything combat works out for a combatant each round (status and position
+modifiers, footwork and groundwork, range, number of actions, equipment
+multipliers) lives on one CombatantState instead of being scattered across
+ndb attributes. Reads are plain attribute hits on a slotted object, and the
+whole state goes back to its defaults with a single reset() when the
+combatant leaves a fight.
+
+Every character has a CombatantState as `character.combat_state`. The combat
+handler registers it when the character joins a fight (see
+CombatHandler.states) and resets it when they leave.
+
+**Use**
+    ```python
+    >>> state = character.combat_state
+    >>> state.range = 'melee'
+    >>> attack = character.talents.unarmed_striking.actual * state.footwork_mod
+    >>> state.reset()
+    ```
+"""
+
+# field: default value of every field of a CombatantState
+COMBATANT_STATE_DEFAULTS = {
+    'hp_mod': 1.0,
+    'sp_mod': 1.0,
+    'cp_mod': 1.0,
+    'enc_mod': 1.0,
+    'position_mod': 1.0,
+    'footwork_mod': 1.0,
+    'groundwork_mod': 1.0,
+    'range': None,
+    'num_of_actions': 0,
+    'eq_damage': 1.0,
+    'eq_phy_arm': 1.0,
+    'eq_men_arm': 1.0,
+}
+
+
+class CombatantState(object):
+    """Combat modifiers and state of one combatant.
+    Properties:
+        hp_mod, sp_mod, cp_mod (float): modifiers for health, stamina and
+            conviction, see Character.calc_status_modifiers
+        enc_mod (float): encumberance modifier
+        position_mod (float): modifier for the combatant's position
+        footwork_mod, groundwork_mod (float): footwork and groundwork rolled
+            for the round
+        range (str): 'grapple', 'melee', 'ranged', 'out_of_range' or None
+        num_of_actions (int): actions the combatant gets this round
+        eq_damage, eq_phy_arm, eq_men_arm (float): equipment damage, physical
+            armor and mental armor multipliers
+    Methods:
+        reset(): put every field back to its default
+        as_dict(): the fields and their values
+    """
+    __slots__ = tuple(COMBATANT_STATE_DEFAULTS)
+
+    def __init__(self, **fields):
+        self.reset()
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={value!r}" for field, value in self.as_dict().items())
+        return f"CombatantState({fields})"
+
+    def reset(self):
+        """Puts every field back to its default."""
+        for field, value in COMBATANT_STATE_DEFAULTS.items():
+            setattr(self, field, value)
+
+    def as_dict(self):
+        """Returns the fields and their values as a dict."""
+        return {field: getattr(self, field) for field in self.__slots__}
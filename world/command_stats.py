@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Per-command latency statistics.
+
+Every command built on the project's Command and MuxCommand classes (see
+commands/command.py) is timed from at_pre_cmd to at_post_cmd. Along with the
+wall time, each run records how many db queries it made and how many
+messages were sent to characters while it ran. The numbers are kept in memory
+per command key, in HDR-style histograms, so the p50/p95/p99 of any command
+can be read off at any time without keeping every sample.
+
+**Histograms**
+    Values are bucketed on a log-linear scale: every power of two is split
+    into SUB_BUCKETS linear buckets, so any recorded value is off by at most
+    half of 1 / SUB_BUCKETS of itself and a histogram never holds more than a few
+    hundred buckets no matter how many values go into it. Times are recorded
+    in microseconds.
+
+**Counting**
+    Db queries are counted with a django execute wrapper that stays installed
+    on the connection. Messages are counted by Character.msg calling
+    note_msg(). Both are plain running totals; a command's counts are the
+    difference between the totals when it started and when it finished, so
+    the counts of a command include any commands it ran itself.
+
+**Use**
+    ```python
+    >>> from world.command_stats import COMMAND_STATS
+    >>> COMMAND_STATS.summary()['score']['time']
+    {'count': 120, 'p50': 812.0, 'p95': 2048.0, 'p99': 3968.0, 'max': 4120}
+    >>> COMMAND_STATS.dump()
+    'server/logs/command_stats.json'
+    ```
+    or use the `cmdstats` command in game.
+"""
+import os
+import json
+import time
+from django.db import connection
+from evennia.utils.logger import log_file
+
+# set to False to stop timing commands
+COMMAND_STATS_ENABLED = True
+# where dump() writes the stats
+COMMAND_STATS_FILE = os.path.join('server', 'logs', 'command_stats.json')
+# linear buckets per power of two, as a power of two
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# percentiles reported for every histogram
+REPORTED_PERCENTILES = (50, 95, 99)
+# what gets recorded for every command
+COMMAND_METRICS = ('time', 'queries', 'msgs')
+
+# running totals of db queries and messages
+_totals = {'queries': 0, 'msgs': 0}
+
+
+def _count_query(execute, sql, params, many, context):
+    """Django execute wrapper that counts db queries."""
+    _totals['queries'] += 1
+    return execute(sql, params, many, context)
+
+
+def note_msg():
+    """Counts a message sent to a character."""
+    _totals['msgs'] += 1
+
+
+class LatencyHistogram(object):
+    """HDR-style histogram of non-negative integer values.
+    Properties:
+        buckets (dict): bucket index: number of values in the bucket
+        count (int): number of values recorded
+        total (int): sum of the values recorded
+        max (int): largest value recorded
+    Methods:
+        record(value): add a value
+        percentile(pct): the value below which pct percent of values fall
+        summary(): count, percentiles and max as a dict
+    """
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value):
+        """Returns the bucket a value falls into."""
+        if value < SUB_BUCKETS:
+            return value
+        # value >> shift is always between SUB_BUCKETS and 2 * SUB_BUCKETS - 1
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def bucket_value(index):
+        """Returns the value in the middle of a bucket."""
+        shift = (index >> SUB_BUCKET_BITS) - 1
+        if shift <= 0:
+            # values below 2 * SUB_BUCKETS have a bucket each
+            return index
+        low = ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << shift
+        return low + (1 << shift) // 2
+
+    def record(self, value):
+        """Adds a value to the histogram. Negative values count as 0."""
+        value = max(0, int(value))
+        index = self.bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        """
+        Returns the value below which `pct` percent of the recorded values
+        fall, or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        target = max(1, round(self.count * pct / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """Returns the count, reported percentiles and max as a dict."""
+        summary = {'count': self.count}
+        for pct in REPORTED_PERCENTILES:
+            summary[f"p{pct}"] = self.percentile(pct)
+        summary['max'] = self.max
+        return summary
+
+
+class _Sample(object):
+    """A command that is being timed."""
+    __slots__ = ('key', 'start', 'queries', 'msgs')
+
+    def __init__(self, key):
+        self.key = key
+        self.queries = _totals['queries']
+        self.msgs = _totals['msgs']
+        self.start = time.perf_counter()
+
+
+class CommandStats(object):
+    """Histograms of every command's time, queries and messages.
+    Properties:
+        histograms (dict): command key: {metric: LatencyHistogram}, see
+            COMMAND_METRICS
+        started (float): when recording started, as a unix time
+    Methods:
+        start(key): start timing a command, returns a sample
+        finish(sample): stop timing a command and record it
+        summary(): percentiles of every command
+        dump(path): write the summary out as json
+        reset(): forget everything recorded
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.started = time.time()
+
+    def start(self, key):
+        """Starts timing a command. Returns the sample to pass to finish."""
+        if _count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_query)
+        return _Sample(key)
+
+    def finish(self, sample):
+        """Stops timing a command and records it."""
+        elapsed = time.perf_counter() - sample.start
+        histograms = self.histograms.get(sample.key)
+        if histograms is None:
+            histograms = {metric: LatencyHistogram() for metric in COMMAND_METRICS}
+            self.histograms[sample.key] = histograms
+        histograms['time'].record(elapsed * 1000000)
+        histograms['queries'].record(_totals['queries'] - sample.queries)
+        histograms['msgs'].record(_totals['msgs'] - sample.msgs)
+
+    def summary(self):
+        """
+        Returns {command key: {metric: summary}} for every command, with
+        times in microseconds.
+        """
+        return {key: {metric: histogram.summary() for metric, histogram in histograms.items()} \
+                for key, histograms in self.histograms.items()}
+
+    def dump(self, path=COMMAND_STATS_FILE):
+        """
+        Writes the summary out as json. Returns the path, or None if it
+        couldn't be written.
+        """
+        data = {'since': self.started, 'dumped': time.time(), 'commands': self.summary()}
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as stats_file:
+                json.dump(data, stats_file, indent=2, sort_keys=True)
+        except OSError:
+            log_file(f"Could not write command stats to {path}.", filename='error.log')
+            return None
+        return path
+
+    def reset(self):
+        """Forgets everything recorded so far."""
+        self.histograms = {}
+        self.started = time.time()
+
+
+def format_summary(summary, sort_by='p99', limit=None):
+    """Returns a summary as text, slowest commands first."""
+    rows = sorted(summary.items(), key=lambda item: item[1]['time'][sort_by] or 0, reverse=True)
+    if limit:
+        rows = rows[:limit]
+    lines = [f"{'command':<20}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" \
+             f"{'max ms':>9}{'q p99':>7}{'msg p99':>9}"]
+    for key, metrics in rows:
+        times = metrics['time']
+        lines.append(f"{key:<20}{times['count']:>7}" + \
+                     "".join(f"{(times[stat] or 0) / 1000:>9.2f}" for stat in ('p50', 'p95', 'p99', 'max')) + \
+                     f"{metrics['queries']['p99'] or 0:>7}{metrics['msgs']['p99'] or 0:>9}")
+    return "\n".join(lines)
+
+
+COMMAND_STATS = CommandStats()
@@ -26,7 +26,34 @@ progression handler for more details.
 # import
 import numpy as np
 from evennia import logger
-from evennia.utils.logger import log_file
+from world.metrics import METRICS
+
+# standard deviation of each dist_shape, as a fraction of the mean
+_SCALE_DIVISORS = {
+    'normal': 10,
+    'flat': 7.5,
+    'very flat': 5,
+    'steep': 15,
+    'very steep': 20,
+}
+# rolls above this fraction of the mean are critical successes
+CRIT_SUCCESS_FRACTION = 1.2
+# final rolls below this fraction of the mean are critical failures
+CRIT_FAILURE_FRACTION = .8
+# number of rolls drawn at once for each mean by roll_many. Rows that are
+# still rolling criticals after a block get another block.
+ROLL_BLOCK_SIZE = 8
+# shared generator for all rolls. Swap it out with seed() for repeatable rolls
+_RNG = np.random.default_rng()
+
+
+def seed(seed=None):
+    """
+    Reseeds the generator shared by all rollers. Passing None goes back to
+    fresh entropy. Used by the dice checks in world/dice_roller_checks.py.
+    """
+    global _RNG
+    _RNG = np.random.default_rng(seed)
 
 # simpliest check, without criticals
 def return_a_roll_sans_crits(number, dist_shape='normal'):
@@ -58,15 +85,15 @@ def return_a_roll_sans_crits(number, dist_shape='normal'):
     """
     try:
         if dist_shape =='normal':
-            return  int(np.random.default_rng().normal(loc=number, scale=number/10))
+            return  int(_RNG.normal(loc=number, scale=number/10))
         elif dist_shape =='flat':
-            return  int(np.random.default_rng().normal(loc=number, scale=number/7.5))
+            return  int(_RNG.normal(loc=number, scale=number/7.5))
         elif dist_shape =='very flat':
-            return  int(np.random.default_rng().normal(loc=number, scale=number/5))
+            return  int(_RNG.normal(loc=number, scale=number/5))
         elif dist_shape =='steep':
-            return  int(np.random.default_rng().normal(loc=number, scale=number/15))
+            return  int(_RNG.normal(loc=number, scale=number/15))
         elif dist_shape =='very steep':
-            return  int(np.random.default_rng().normal(loc=number, scale=number/20))
+            return  int(_RNG.normal(loc=number, scale=number/20))
     except Exception:
         logger.log_trace("We produced an error with the return_a_roll_sans_crits \
                           function in world.dice_roller. Check your inputs and \
@@ -109,6 +136,7 @@ def return_a_roll(number, dist_shape='normal', *ability_skill_or_powers):
     # log_file(f"Calling dice roller for {ability_skill_or_powers}, which \
     #                  is type: {type(ability_skill_or_powers)}.", \
     #                  filename='dice_roller.log')
+    METRICS.incr('dice.rolls')
     # define variables we'll need
     total_roll = 0
     num_of_crits = 1
@@ -127,7 +155,7 @@ def return_a_roll(number, dist_shape='normal', *ability_skill_or_powers):
     abil_list = list(ability_skill_or_powers)
     # while loop for rolling until we stop rolling critical successes
     while True:
-        this_roll = np.random.default_rng().normal(loc=number, scale=scale)
+        this_roll = _RNG.normal(loc=number, scale=scale)
         total_roll += this_roll/num_of_crits
         # check for rolls that are not critical successes
         if this_roll <= number * 1.2: # TODO: tune this to fire less often
@@ -153,24 +181,87 @@ def return_a_roll(number, dist_shape='normal', *ability_skill_or_powers):
             logger.log_trace("We produced an error with the regular roller.")
 
 
+def roll_many(means, dist_shape='normal', learners=None, rng=None):
+    """
+    Batch version of return_a_roll. Rolls once for each mean in `means` in a
+    single call, following the same rules: critical successes add another
+    roll worth 1/n of the nth roll, and a final roll under 1 or below the
+    critical failure line is a critical failure.
+
+    Rather than rolling until a non-critical roll comes up, a block of
+    ROLL_BLOCK_SIZE rolls is drawn for every mean and everything after the
+    first non-critical roll is masked off. The results are statistically
+    identical to calling return_a_roll once per mean.
+
+    Args:
+        means (array of float): mean of each roll
+        dist_shape (str): same choices as return_a_roll
+        learners (list, optional): one list of abilities, skills or powers per
+            mean. Each gets a chance to learn from the criticals of its roll,
+            exactly like the *args of return_a_roll.
+        rng (numpy Generator, optional): generator to draw from, for seeded
+            rolls
+
+    Returns:
+        totals (array of int): the final roll for each mean
+        crits (array of int): number of critical successes for each mean
+        crit_fails (array of bool): True where the roll was a critical failure
+    """
+    if rng is None:
+        rng = _RNG
+    means = np.atleast_1d(np.asarray(means, dtype=float))
+    METRICS.incr('dice.rolls', len(means))
+    scales = means / _SCALE_DIVISORS[dist_shape]
+    totals = np.zeros(len(means))
+    crits = np.zeros(len(means), dtype=int)
+    last_rolls = np.zeros(len(means))
+    # rows that are still rolling criticals
+    rolling = np.arange(len(means))
+    while len(rolling):
+        mean = means[rolling, None]
+        rolls = rng.normal(loc=mean, scale=scales[rolling, None], \
+                           size=(len(rolling), ROLL_BLOCK_SIZE))
+        is_crit = rolls > mean * CRIT_SUCCESS_FRACTION
+        # index of the first non-critical roll, or the block size if none
+        done = ~is_crit.all(axis=1)
+        stop = np.where(done, np.argmax(~is_crit, axis=1), ROLL_BLOCK_SIZE)
+        # each roll is worth 1/n of itself, where n counts up across blocks
+        n = crits[rolling, None] + 1 + np.arange(ROLL_BLOCK_SIZE)
+        kept = np.arange(ROLL_BLOCK_SIZE) <= stop[:, None]
+        totals[rolling] += np.where(kept, rolls / n, 0).sum(axis=1)
+        crits[rolling] += np.minimum(stop, ROLL_BLOCK_SIZE)
+        finished = rolling[done]
+        last_rolls[finished] = rolls[done, stop[done]]
+        rolling = rolling[~done]
+    crit_fails = (totals < 1) | (last_rolls < means * CRIT_FAILURE_FRACTION)
+    totals = np.where(totals < 1, 1, np.trunc(totals)).astype(int)
+    if learners is not None:
+        for row, abil_list in enumerate(learners):
+            for _ in range(crits[row] + int(crit_fails[row])):
+                learned_something(list(abil_list))
+    return totals, crits, crit_fails
+
+
 def learned_something(abil_list):
     """
     Takes in a single ability, skill, or power. Adds one to the learn attribute
     for that ability score, skill, or power. This should only be called after
     a critical success on a roll, a critical failure on a roll, or after the
     completion of certain quests.
+
+    Traits only bump an in-memory counter on their TraitHandler. The counters
+    are saved once per combat round or heartbeat tick by
+    Character.flush_learning, and progression reads them with
+    TraitHandler.learn_total.
     """
     try:
         for ability_skill_or_power in abil_list:
-            log_file(f"Something was learned about {ability_skill_or_power}",  \
-                             filename='dice_roller.log')
-            log_file(f"Current learn value: {ability_skill_or_power.learn}",  \
-                             filename='dice_roller.log')
-            ability_skill_or_power.learn += 1
-            log_file(f"New learn value: {ability_skill_or_power.learn}",  \
-                             filename='dice_roller.log')
-
+            handler = getattr(ability_skill_or_power, '_handler', None)
+            if handler is not None:
+                handler.add_learn(ability_skill_or_power._key)
+            else:
+                ability_skill_or_power.learn += 1
     except Exception:
         logger.log_trace(f"We produced an error trying to increase the learning \
-                          value on {ability_skill_or_power_learn_attribute}")
+                          value on {ability_skill_or_power}")
     return
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Statistical checks and benchmarks for the dice roller.
+
+The distribution shapes and critical thresholds of world/dice_roller.py drive
+the balance of the whole game, so any change to the roller (especially one
+made to speed it up) needs to keep them intact. This module rolls a seeded
+batch of dice through every roller and compares the results against values
+worked out from the rules:
+
+- Every roll is normal with a standard deviation of mean/divisor for its
+  shape. A roll is a critical success above 1.2 * mean, so the chance of a
+  critical success is p = P(Z > .2 * divisor).
+- Critical successes chain, with the nth roll worth 1/n, so the expected
+  total is mean * -ln(1 - p) / p (before rounding down to an int).
+- The final roll is a critical failure below .8 * mean. Given that it was not
+  a critical success, that happens p / (1 - p) of the time, which is also the
+  expected number of critical successes per roll. Each critical success and
+  each critical failure triggers learning, so the learn rate is 2p / (1 - p).
+
+Everything is seeded, so the checks give the same answer every time they are
+run with the same seed and sample sizes. Tolerances are a few standard errors
+wide.
+
+**Use**
+    ```python
+    >>> from world import dice_roller_checks
+    >>> results = dice_roller_checks.run_checks(seed=1234)
+    >>> all(result.passed for result in results)
+    True
+    >>> dice_roller_checks.benchmark()
+    {'return_a_roll': 61234.0, 'return_a_roll_sans_crits': ..., 'roll_many': ...}
+    ```
+    or from the game directory:
+        python -m world.dice_roller_checks --seed 1234 --bench 100000
+    The checks roll a few million dice and take a few seconds, so they are
+    not run from inside the game. world/tests/test_dice_roller.py runs them
+    with the tests.
+"""
+import math
+import time
+import argparse
+from collections import namedtuple
+import numpy as np
+from world import dice_roller
+
+# chance of a single roll being a critical success for each shape
+REFERENCE_CRIT_RATES = {
+    'normal': .02275,
+    'flat': .0668,
+    'very flat': .1587,
+    'steep': .00135,
+    'very steep': 3.2e-5,
+}
+# mean used for the reference rolls
+CHECK_MEAN = 100
+# default number of rolls per shape for the scalar and batch rollers
+SCALAR_SAMPLES = 20000
+BATCH_SAMPLES = 200000
+# width of the tolerances in standard errors
+TOLERANCE_SES = 4
+# rounding rolls down to an int loses half a point on average
+TRUNCATION_BIAS = .5
+
+CheckResult = namedtuple('CheckResult', ('name', 'observed', 'expected', \
+                                         'tolerance', 'passed'))
+
+
+class _LearnCounter(object):
+    """Stands in for a trait to count the times a roll triggers learning."""
+    def __init__(self):
+        self.learn = 0
+
+
+def expected_mean(mean, dist_shape):
+    """Returns the expected total of return_a_roll before rounding down."""
+    p = REFERENCE_CRIT_RATES[dist_shape]
+    return mean * -math.log(1 - p) / p
+
+
+def expected_crit_fail_rate(dist_shape):
+    """Returns the chance of a roll ending in a critical failure."""
+    p = REFERENCE_CRIT_RATES[dist_shape]
+    return p / (1 - p)
+
+
+def expected_learn_rate(dist_shape):
+    """Returns the expected number of times a roll triggers learning."""
+    p = REFERENCE_CRIT_RATES[dist_shape]
+    return 2 * p / (1 - p)
+
+
+def _check(name, observed, expected, tolerance):
+    """Builds a CheckResult."""
+    return CheckResult(name, float(observed), float(expected), float(tolerance), \
+                       bool(abs(observed - expected) <= tolerance))
+
+
+def _check_rate(name, hits, trials, expected):
+    """Checks an observed rate against the expected rate."""
+    tolerance = TOLERANCE_SES * math.sqrt(max(expected, 1 / trials) / trials)
+    return _check(name, hits / trials, expected, tolerance)
+
+
+def _check_mean(name, values, expected):
+    """Checks the mean of some rolls against the expected mean."""
+    tolerance = TOLERANCE_SES * values.std() / math.sqrt(len(values)) + .05
+    return _check(name, values.mean(), expected, tolerance)
+
+
+def check_shape(dist_shape, mean=CHECK_MEAN, scalar_samples=SCALAR_SAMPLES, \
+                batch_samples=BATCH_SAMPLES):
+    """
+    Runs the checks for a single distribution shape against all rollers.
+    Returns a list of CheckResults.
+    """
+    results = []
+    divisor = dice_roller._SCALE_DIVISORS[dist_shape]
+    scale = mean / divisor
+
+    # rolls without crits
+    rolls = np.array([dice_roller.return_a_roll_sans_crits(mean, dist_shape) \
+                      for _ in range(scalar_samples)])
+    results.append(_check_mean(f"{dist_shape}: sans crits mean", rolls, \
+                               mean - TRUNCATION_BIAS))
+    var_tolerance = TOLERANCE_SES * scale ** 2 * math.sqrt(2 / (scalar_samples - 1)) + .1
+    results.append(_check(f"{dist_shape}: sans crits variance", rolls.var(), \
+                          scale ** 2, var_tolerance))
+
+    # scalar rolls with crits
+    counter = _LearnCounter()
+    rolls = np.array([dice_roller.return_a_roll(mean, dist_shape, counter) \
+                      for _ in range(scalar_samples)])
+    scalar_rolls = rolls
+    results.append(_check_mean(f"{dist_shape}: return_a_roll mean", rolls, \
+                               expected_mean(mean, dist_shape) - TRUNCATION_BIAS))
+    results.append(_check_rate(f"{dist_shape}: return_a_roll learn rate", \
+                               counter.learn, scalar_samples, \
+                               expected_learn_rate(dist_shape)))
+
+    # batched rolls
+    counters = [(_LearnCounter(),) for _ in range(batch_samples)]
+    totals, crits, crit_fails = dice_roller.roll_many(np.full(batch_samples, mean), \
+                                                      dist_shape, counters)
+    results.append(_check_mean(f"{dist_shape}: roll_many mean", totals, \
+                               expected_mean(mean, dist_shape) - TRUNCATION_BIAS))
+    draws = batch_samples + crits.sum()
+    results.append(_check_rate(f"{dist_shape}: roll_many crit rate", \
+                               crits.sum(), draws, REFERENCE_CRIT_RATES[dist_shape]))
+    results.append(_check_rate(f"{dist_shape}: roll_many crit fail rate", \
+                               crit_fails.sum(), batch_samples, \
+                               expected_crit_fail_rate(dist_shape)))
+    learned = sum(counter.learn for counter, in counters)
+    results.append(_check_rate(f"{dist_shape}: roll_many learn rate", \
+                               learned, batch_samples, expected_learn_rate(dist_shape)))
+    # the scalar and batched rollers have to agree with each other
+    se = math.sqrt(scalar_rolls.var() / scalar_samples + totals.var() / batch_samples)
+    results.append(_check(f"{dist_shape}: scalar vs batch mean", \
+                          totals.mean() - scalar_rolls.mean(), 0, TOLERANCE_SES * se))
+    var_tolerance = TOLERANCE_SES * 2 * scalar_rolls.var() * math.sqrt(2 / scalar_samples)
+    results.append(_check(f"{dist_shape}: scalar vs batch variance", \
+                          totals.var() - scalar_rolls.var(), 0, var_tolerance))
+    return results
+
+
+def run_checks(seed=1234, mean=CHECK_MEAN, scalar_samples=SCALAR_SAMPLES, \
+               batch_samples=BATCH_SAMPLES):
+    """
+    Runs the checks for every distribution shape with a seeded generator.
+    The roller goes back to fresh entropy afterwards. Returns a list of
+    CheckResults.
+    """
+    dice_roller.seed(seed)
+    try:
+        results = []
+        for dist_shape in REFERENCE_CRIT_RATES:
+            results.extend(check_shape(dist_shape, mean, scalar_samples, batch_samples))
+    finally:
+        dice_roller.seed(None)
+    return results
+
+
+def benchmark(samples=100000, mean=CHECK_MEAN, dist_shape='normal'):
+    """
+    Times every roller. Returns a dict of roller name: rolls per second.
+    """
+    rates = {}
+    start = time.perf_counter()
+    for _ in range(samples):
+        dice_roller.return_a_roll(mean, dist_shape)
+    rates['return_a_roll'] = samples / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(samples):
+        dice_roller.return_a_roll_sans_crits(mean, dist_shape)
+    rates['return_a_roll_sans_crits'] = samples / (time.perf_counter() - start)
+    start = time.perf_counter()
+    dice_roller.roll_many(np.full(samples, mean), dist_shape)
+    rates['roll_many'] = samples / (time.perf_counter() - start)
+    return rates
+
+
+def format_results(results, rates=None):
+    """Returns the check results (and benchmark rates) as text."""
+    lines = []
+    for result in results:
+        status = "PASS" if result.passed else "FAIL"
+        lines.append(f"{status} {result.name}: {result.observed:.6g} " \
+                     f"(expected {result.expected:.6g} +/- {result.tolerance:.3g})")
+    passed = sum(result.passed for result in results)
+    lines.append(f"{passed} of {len(results)} checks passed.")
+    if rates:
+        for roller, rate in rates.items():
+            lines.append(f"{roller}: {rate:,.0f} rolls/sec")
+    return "\n".join(lines)
+
+
+def main(args=None):
+    """Runs the checks, and optionally the benchmark, from the command line."""
+    parser = argparse.ArgumentParser(description="Check and time the dice roller.")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--bench', type=int, default=None, metavar='ROLLS', \
+                        help="also time the rollers over this many rolls")
+    options = parser.parse_args(args)
+    results = run_checks(seed=options.seed)
+    rates = benchmark(samples=options.bench) if options.bench else None
+    print(format_results(results, rates))
+    return 0 if all(result.passed for result in results) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Grappling rules for DOG.
+
+Grappling combatants are always on one of two position ladders. The ladders
+are ordered from the best position to the worst, and the defender's position
+is always the mirror of the attacker's position on the same ladder (if the
+attacker has mount, the defender is mounted).
+
+Ground ladder:
+    1: tbmount          8: prmounted
+    2: mount            7: mounted
+    3: side control     6: side controlled
+    4: top              5: in guard
+Standing ladder:
+    1: tbstanding       4: standingbt
+    2: clinching        3: clinched
+
+Grappling actions classify their opposed rolls into one of seven outcome
+bands (see combat_rules.opposed_check). The new positions for every possible
+(action, attacker position, defender position, outcome band) are worked out
+once, when this module is loaded, into the TRANSITIONS table. Resolving a
+grappling action is then a single lookup, and a whole brawl of grappling
+actions can be resolved in one call to `resolve` with arrays.
+
+**Use**
+    ```python
+    >>> from world import grappling_rules as gr
+    >>> gr.resolve_positions(gr.IMPROVE_POSITION, 'top', 'in guard', gr.SUCCESS)
+    ('side control', 'side controlled')
+    >>> gr.resolve(gr.TAKEDOWN, att_indices, def_indices, bands)   # arrays
+    ```
+"""
+import numpy as np
+
+# grappling position ladders, best position first
+GROUND_POSITIONS = ('tbmount', 'mount', 'side control', 'top', \
+                    'in guard', 'side controlled', 'mounted', 'prmounted')
+STANDING_POSITIONS = ('tbstanding', 'clinching', 'clinched', 'standingbt')
+# positions that are not part of a grapple
+NON_GRAPPLING_POSITIONS = ('standing', 'sitting', 'resting', 'supine', \
+                           'prone', 'sleeping')
+POSITIONS = GROUND_POSITIONS + STANDING_POSITIONS + NON_GRAPPLING_POSITIONS
+POSITION_INDEX = {position: i for i, position in enumerate(POSITIONS)}
+
+# outcome bands of an opposed check, worst for the attacker first
+MASSIVE_FAILURE = 0
+CRITICAL_FAILURE = 1
+FAILURE = 2
+SUCCESS = 3
+GREAT_SUCCESS = 4
+CRITICAL_SUCCESS = 5
+MASSIVE_SUCCESS = 6
+OUTCOME_BANDS = ('massive failure', 'critical failure', 'failure', 'success', \
+                 'great success', 'critical success', 'massive success')
+
+# grappling actions with a transition table
+TAKEDOWN = 0
+IMPROVE_POSITION = 1
+
+# where a takedown leaves the attacker for each band. None means no change.
+_TAKEDOWN_RESULTS = {
+    MASSIVE_FAILURE: 'mounted',
+    CRITICAL_FAILURE: 'side controlled',
+    FAILURE: None,
+    SUCCESS: 'clinching',
+    GREAT_SUCCESS: 'top',
+    CRITICAL_SUCCESS: 'side control',
+    MASSIVE_SUCCESS: 'mount',
+}
+# steps up (negative) or down (positive) the ladder when improving position
+_IMPROVE_POSITION_STEPS = {
+    MASSIVE_FAILURE: 2,
+    CRITICAL_FAILURE: 1,
+    FAILURE: 0,
+    SUCCESS: -1,
+    GREAT_SUCCESS: -1,
+    CRITICAL_SUCCESS: -2,
+    MASSIVE_SUCCESS: -3,
+}
+# a massive success from a standing grapple drags the defender to the ground
+_DRAGGED_TO_GROUND = 'side control'
+
+
+def mirror(position):
+    """Returns the position of the other grappler, or None if not grappling."""
+    for ladder in (GROUND_POSITIONS, STANDING_POSITIONS):
+        if position in ladder:
+            return ladder[len(ladder) - 1 - ladder.index(position)]
+    return None
+
+
+def is_grappling_position(position):
+    """Returns True if the position is on one of the grappling ladders."""
+    return position in GROUND_POSITIONS or position in STANDING_POSITIONS
+
+
+def _build_transitions():
+    """
+    Builds the transition table, indexed by [action, attacker position,
+    defender position, band] and holding (new attacker position, new
+    defender position) as indices into POSITIONS.
+    """
+    num_positions = len(POSITIONS)
+    num_bands = len(OUTCOME_BANDS)
+    table = np.empty((2, num_positions, num_positions, num_bands, 2), dtype=np.int8)
+    # default to nobody moving
+    table[..., 0] = np.arange(num_positions)[None, :, None, None]
+    table[..., 1] = np.arange(num_positions)[None, None, :, None]
+    # takedowns work from anywhere
+    for band, result in _TAKEDOWN_RESULTS.items():
+        if result is not None:
+            table[TAKEDOWN, :, :, band] = (POSITION_INDEX[result], POSITION_INDEX[mirror(result)])
+    # improving position only works for grapplers on the same ladder in
+    # mirrored positions
+    for ladder in (GROUND_POSITIONS, STANDING_POSITIONS):
+        for att_rank, att_position in enumerate(ladder):
+            att = POSITION_INDEX[att_position]
+            dfn = POSITION_INDEX[mirror(att_position)]
+            for band, step in _IMPROVE_POSITION_STEPS.items():
+                if ladder is STANDING_POSITIONS and band == MASSIVE_SUCCESS:
+                    new_position = _DRAGGED_TO_GROUND
+                else:
+                    new_rank = min(len(ladder) - 1, max(0, att_rank + step))
+                    new_position = ladder[new_rank]
+                table[IMPROVE_POSITION, att, dfn, band] = \
+                    (POSITION_INDEX[new_position], POSITION_INDEX[mirror(new_position)])
+    table.setflags(write=False)
+    return table
+
+
+TRANSITIONS = _build_transitions()
+
+
+def resolve(action, att_positions, def_positions, bands):
+    """
+    Resolves a batch of grappling actions of the same kind.
+    Args:
+        action (int): TAKEDOWN or IMPROVE_POSITION
+        att_positions (array of int): attacker positions, indices into POSITIONS
+        def_positions (array of int): defender positions, indices into POSITIONS
+        bands (array of int): outcome band of each action
+    Returns:
+        new_att_positions, new_def_positions (arrays of int)
+    """
+    result = TRANSITIONS[action, att_positions, def_positions, bands]
+    return result[..., 0], result[..., 1]
+
+
+def resolve_positions(action, att_position, def_position, band):
+    """
+    Resolves a single grappling action using position names.
+    Returns the new (attacker position, defender position). Positions that
+    are not known are left alone.
+    """
+    att = POSITION_INDEX.get(att_position)
+    dfn = POSITION_INDEX.get(def_position)
+    if att is None or dfn is None:
+        return att_position, def_position
+    new_att, new_def = TRANSITIONS[action, att, dfn, band]
+    return POSITIONS[new_att], POSITIONS[new_def]
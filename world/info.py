@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+"""
+Info handler module.
+
+The `InfoHandler` holds the odds and ends about a character that combat and
+commands need all the time: their position, target, whether they're in
+combat, their default attack, wimpy and yield thresholds and so on. These used
+to live in a single `db.info` dict, so every read went through the attribute
+handler and every write (like a position change mid-grapple) saved the whole
+dict again.
+
+Each field is now its own Attribute in the INFO_CATEGORY category. The
+handler reads them all once, serves reads from a plain dict, and writes a
+single field through to its Attribute when it changes. Characters with an
+old `db.info` dict are moved over to per-field Attributes the first time the
+handler is created.
+
+Setup:
+    ```python
+    from world.info import InfoHandler
+      ...
+    @lazy_property
+    def info(self):
+        return InfoHandler(self)
+    ```
+Use:
+    The handler works like the old dict:
+    ```python
+    > character.info['Position']
+    'standing'
+    > character.info['Position'] = 'prone'   # saves only 'Position'
+    > character.info.get('Title')
+    None
+    ```
+"""
+
+# Attribute category the fields are stored in
+INFO_CATEGORY = 'info'
+# every field a character starts with, and its starting value
+INFO_DEFAULTS = {'Target': None, 'Mercy': True, 'Default Attack': 'unarmed_strike', \
+                 'In Combat': False, 'Position': 'standing', 'Sneaking': False, \
+                 'Wimpy': 100, 'Yield': 200, 'Title': None}
+# name of the old Attribute that held every field in one dict
+LEGACY_INFO_ATTRIBUTE = 'info'
+
+
+class InfoHandler(object):
+    """Handler for a character's info fields.
+    Args:
+        obj (Character): parent character object
+    Properties:
+        cache (dict): field: value of every field, read from the db once
+        version (int): in-memory counter that goes up every time a field
+            changes. Used by render caches such as the character sheet.
+    Methods:
+        get(key, default): the value of a field, or `default`
+        update(fields): set several fields at once
+        reset(): set every field back to INFO_DEFAULTS
+        as_dict(): copy of every field and its value
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        self.version = 0
+        self.cache = dict(INFO_DEFAULTS)
+        stored = {attr.key: attr.value for attr in obj.attributes.all() \
+                  if attr.category == INFO_CATEGORY}
+        if not stored and obj.attributes.has(LEGACY_INFO_ATTRIBUTE):
+            stored = self._migrate()
+        self.cache.update(stored)
+
+    def _migrate(self):
+        """Moves the fields of an old `db.info` dict to their own Attributes."""
+        legacy = dict(self.obj.attributes.get(LEGACY_INFO_ATTRIBUTE) or {})
+        for key, value in legacy.items():
+            self.obj.attributes.add(key, value, category=INFO_CATEGORY)
+        self.obj.attributes.remove(LEGACY_INFO_ATTRIBUTE)
+        return legacy
+
+    def __len__(self):
+        """Return number of fields."""
+        return len(self.cache)
+
+    def __iter__(self):
+        """Iterate over the field names."""
+        return iter(self.cache)
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def __getitem__(self, key):
+        """Returns the value of a field from the cache."""
+        return self.cache[key]
+
+    def __setitem__(self, key, value):
+        """Sets a field, saving it to the db if it changed."""
+        if key in self.cache and self.cache[key] == value:
+            return
+        self.cache[key] = value
+        self.obj.attributes.add(key, value, category=INFO_CATEGORY)
+        self.version += 1
+
+    def get(self, key, default=None):
+        """Returns the value of a field, or `default` if there is no such field."""
+        return self.cache.get(key, default)
+
+    def update(self, fields):
+        """Sets several fields at once. Only the ones that changed are saved."""
+        for key, value in fields.items():
+            self[key] = value
+
+    def reset(self):
+        """Sets every field back to INFO_DEFAULTS, saving all of them."""
+        for key, value in INFO_DEFAULTS.items():
+            self.cache[key] = value
+            self.obj.attributes.add(key, value, category=INFO_CATEGORY)
+        self.version += 1
+
+    def as_dict(self):
+        """Returns a copy of every field and its value."""
+        return dict(self.cache)
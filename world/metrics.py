@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Game-wide metrics.
+
+A small registry of counters, gauges and timers for the hot paths of the game:
+combat rounds, combat action scripts, dice rolls, combat messages and the
+heartbeat ticks that run regen and progression. It answers the question the
+logs can't: how often do these things happen, and where does server time go?
+
+**Counters** count things that happen (`incr`). **Gauges** hold the latest
+value of something (`gauge`). **Timers** count calls and add up the time they
+take (`timer` as a context manager or `timed` as a decorator).
+
+Counters and timers are added up per second of wall time: increments go into
+plain dicts for the current second, and when the second changes those dicts
+are pushed onto a short history of METRICS_WINDOW seconds and fresh ones are
+started. An increment is a clock read and a dict update, so it's cheap enough
+to put in front of every dice roll. Totals since the registry started are
+kept as well.
+
+Timers measure wall time, including anything the timed code calls, so nested
+timers overlap: the time of `combat.round` includes `combat.spawn_action`.
+A timer's busy % is the share of the last N seconds spent inside it.
+
+**Use**
+    ```python
+    >>> from world.metrics import METRICS
+    >>> METRICS.incr('dice.rolls')
+    >>> METRICS.gauge('combat.fights', 3)
+    >>> with METRICS.timer('combat.round'):
+    ...     do_round()
+    >>> @METRICS.timed('heartbeat.character')
+    ... def at_repeat(self):
+    ...     ...
+    >>> print(format_snapshot(METRICS.snapshot(10)))
+    ```
+    or use the `metrics` command in game.
+"""
+import time
+from collections import deque, namedtuple
+from functools import wraps
+
+# set to False to stop recording metrics
+METRICS_ENABLED = True
+# seconds of per-second history kept
+METRICS_WINDOW = 300
+# seconds reported by a snapshot when none are given
+DEFAULT_SNAPSHOT_SECONDS = 10
+# seconds between updates of the live view, and how many updates it sends
+METRICS_WATCH_INTERVAL = 5
+METRICS_WATCH_UPDATES = 12
+
+# one second of counters and timers
+MetricsSecond = namedtuple('MetricsSecond', 'second counters timers')
+
+
+class _Timer(object):
+    """Context manager that records the time spent in a block."""
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.record_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry(object):
+    """Registry of counters, gauges and timers, added up per second.
+    Args:
+        window (int): seconds of per-second history to keep
+    Properties:
+        second (int): the second being recorded, as a unix time
+        counters (dict): counter: count in the current second
+        timers (dict): timer: [calls, seconds, longest call] in the current
+            second
+        gauges (dict): gauge: latest value
+        history (deque): MetricsSecond of each of the last `window` seconds
+        totals (dict): counter or timer: count or calls since the start
+        started (float): when recording started, as a unix time
+    Methods:
+        incr(name, amount): add to a counter
+        gauge(name, value): set a gauge
+        record_time(name, seconds): record one timed call
+        timer(name): context manager that times a block
+        timed(name): decorator that times every call of a function
+        snapshot(seconds): rates and timings over the last seconds
+        reset(): forget everything recorded
+    """
+    def __init__(self, window=METRICS_WINDOW):
+        self.history = deque(maxlen=window)
+        self.reset()
+
+    def _roll(self, now):
+        """Pushes the current second onto the history and starts a new one."""
+        if self.counters or self.timers:
+            self.history.append(MetricsSecond(self.second, self.counters, self.timers))
+        self.second = now
+        self.counters = {}
+        self.timers = {}
+
+    def incr(self, name, amount=1):
+        """Adds `amount` to a counter."""
+        if not METRICS_ENABLED:
+            return
+        now = int(time.time())
+        if now != self.second:
+            self._roll(now)
+        self.counters[name] = self.counters.get(name, 0) + amount
+        self.totals[name] = self.totals.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        """Sets a gauge to its latest value."""
+        if METRICS_ENABLED:
+            self.gauges[name] = value
+
+    def record_time(self, name, seconds):
+        """Records one call of a timer that took `seconds`."""
+        if not METRICS_ENABLED:
+            return
+        now = int(time.time())
+        if now != self.second:
+            self._roll(now)
+        timing = self.timers.get(name)
+        if timing is None:
+            self.timers[name] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            if seconds > timing[2]:
+                timing[2] = seconds
+        self.totals[name] = self.totals.get(name, 0) + 1
+
+    def timer(self, name):
+        """Returns a context manager that records the time spent in it."""
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator that records the time of every call of a function."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not METRICS_ENABLED:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record_time(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self, seconds=DEFAULT_SNAPSHOT_SECONDS):
+        """
+        Returns the counters and timers over the last `seconds` full seconds
+        along with every gauge and the totals, as a dict:
+            {'seconds': int,
+             'counters': {name: {'count', 'per_sec'}},
+             'timers': {name: {'calls', 'per_sec', 'avg_ms', 'max_ms', 'busy_pct'}},
+             'gauges': {name: value},
+             'totals': {name: count}}
+        The second still being recorded is left out.
+        """
+        seconds = max(1, min(int(seconds), self.history.maxlen))
+        now = int(time.time())
+        if now != self.second:
+            self._roll(now)
+        counters = {}
+        timers = {}
+        for record in self.history:
+            if record.second < now - seconds:
+                continue
+            for name, count in record.counters.items():
+                counters[name] = counters.get(name, 0) + count
+            for name, (calls, spent, longest) in record.timers.items():
+                timing = timers.setdefault(name, [0, 0.0, 0.0])
+                timing[0] += calls
+                timing[1] += spent
+                timing[2] = max(timing[2], longest)
+        return {
+            'seconds': seconds,
+            'counters': {name: {'count': count, 'per_sec': count / seconds} \
+                         for name, count in counters.items()},
+            'timers': {name: {'calls': calls, 'per_sec': calls / seconds, \
+                              'avg_ms': spent / calls * 1000, 'max_ms': longest * 1000, \
+                              'busy_pct': spent / seconds * 100} \
+                       for name, (calls, spent, longest) in timers.items()},
+            'gauges': dict(self.gauges),
+            'totals': dict(self.totals),
+        }
+
+    def reset(self):
+        """Forgets everything recorded so far."""
+        self.second = int(time.time())
+        self.counters = {}
+        self.timers = {}
+        self.gauges = {}
+        self.totals = {}
+        self.history.clear()
+        self.started = time.time()
+
+
+def format_snapshot(snapshot):
+    """Returns a snapshot as text, the timers that take the most time first."""
+    lines = [f"Last {snapshot['seconds']} seconds:"]
+    if snapshot['timers']:
+        lines.append(f"{'timer':<28}{'calls/s':>9}{'avg ms':>9}{'max ms':>9}{'busy %':>8}")
+        for name, timing in sorted(snapshot['timers'].items(), \
+                                   key=lambda item: item[1]['busy_pct'], reverse=True):
+            lines.append(f"{name:<28}{timing['per_sec']:>9.2f}{timing['avg_ms']:>9.2f}" \
+                         f"{timing['max_ms']:>9.2f}{timing['busy_pct']:>8.2f}")
+    if snapshot['counters']:
+        lines.append(f"{'counter':<28}{'per sec':>9}{'total':>9}")
+        for name, counter in sorted(snapshot['counters'].items()):
+            lines.append(f"{name:<28}{counter['per_sec']:>9.2f}" \
+                         f"{snapshot['totals'].get(name, 0):>9}")
+    if snapshot['gauges']:
+        lines.append(f"{'gauge':<28}{'value':>9}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{name:<28}{value:>9}")
+    if len(lines) == 1:
+        lines.append("Nothing recorded.")
+    return "\n".join(lines)
+
+
+METRICS = MetricsRegistry()
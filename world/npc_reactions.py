@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+NPC reactions module.
+
+NPCs react to things happening around them (a character walking into the
+room, someone attacking a friend, etc). Towns can hold a lot of NPCs, so
+reactions are not scheduled with one timer each. All pending reactions live
+on a single timer wheel that is driven by one looping timer, which only runs
+while there is something on the wheel.
+
+The scheduler also keeps NPCs from spamming:
+- Dedupe - An NPC with a reaction of the same kind already pending merges
+           new targets into it, so a party walking in gets one greeting.
+- Cooldown - An NPC will not react to the same target with the same kind of
+             reaction again until the cooldown has passed.
+- Rate limit - An NPC fires at most REACTION_RATE_LIMIT reactions every
+               REACTION_RATE_WINDOW seconds. Anything over is dropped.
+
+NPC speech and emotes are sent straight to the listeners in the NPC's room
+through the room's occupant index (see world.occupants) rather than going
+through the command parser with execute_cmd.
+
+**Use**
+    ```python
+    >>> from world.npc_reactions import REACTION_SCHEDULER, npc_say
+    >>> REACTION_SCHEDULER.schedule(npc, 'greet', character, npc.greetings)
+    >>> npc_say(npc, "Welcome to Hightown.")
+    ```
+"""
+import time
+from collections import deque
+from twisted.internet import task
+from evennia.utils import logger
+
+# seconds between turns of the timer wheel
+WHEEL_RESOLUTION = 0.5
+# number of slots on the wheel. Reactions can be scheduled at most
+# WHEEL_RESOLUTION * (WHEEL_SLOTS - 1) seconds out
+WHEEL_SLOTS = 64
+# seconds before an NPC will react to the same target the same way again
+REACTION_COOLDOWN = 60
+# max number of reactions an NPC can fire per rate window
+REACTION_RATE_LIMIT = 3
+# length of the rate window in seconds
+REACTION_RATE_WINDOW = 30
+
+
+class Reaction(object):
+    """A pending reaction of an NPC to one or more targets."""
+    __slots__ = ('npc', 'kind', 'targets', 'callback')
+
+    def __init__(self, npc, kind, callback):
+        self.npc = npc
+        self.kind = kind
+        self.targets = []
+        self.callback = callback
+
+
+class ReactionScheduler(object):
+    """Timer wheel for NPC reactions.
+    Args:
+        resolution (float): seconds between turns of the wheel
+        slots (int): number of slots on the wheel
+    Methods:
+        schedule(npc, kind, target, callback, delay): queue up a reaction
+        cancel(npc): drop all pending reactions of an NPC
+        tick(now): turn the wheel one slot and fire the reactions in it
+    """
+    def __init__(self, resolution=WHEEL_RESOLUTION, slots=WHEEL_SLOTS):
+        self.resolution = resolution
+        self.slots = slots
+        # each slot maps (npc id, kind): Reaction
+        self.wheel = [{} for _ in range(slots)]
+        self.position = 0
+        # (npc id, kind): slot, for every reaction on the wheel
+        self.pending = {}
+        # (npc id, kind, target id): time the cooldown runs out
+        self.cooldowns = {}
+        # npc id: deque of the times the npc's recent reactions fired
+        self.history = {}
+        self.timer = None
+
+    def __len__(self):
+        """Return number of pending reactions."""
+        return len(self.pending)
+
+    def _on_cooldown(self, key, target, now):
+        """Returns True if the NPC reacted to the target too recently."""
+        cooldown_key = key + (target.id,)
+        expires = self.cooldowns.get(cooldown_key)
+        if expires is None:
+            return False
+        if expires <= now:
+            del self.cooldowns[cooldown_key]
+            return False
+        return True
+
+    def _rate_limited(self, npc_id, now):
+        """Returns True if the NPC has used up its reactions for the window."""
+        fired = self.history.get(npc_id)
+        if not fired:
+            return False
+        while fired and fired[0] <= now - REACTION_RATE_WINDOW:
+            fired.popleft()
+        if not fired:
+            del self.history[npc_id]
+            return False
+        return len(fired) >= REACTION_RATE_LIMIT
+
+    def _start(self):
+        """Start the wheel turning if it is not already."""
+        if self.timer is None or not self.timer.running:
+            self.timer = task.LoopingCall(self.tick)
+            self.timer.start(self.resolution, now=False)
+
+    def _stop(self):
+        """Stop the wheel once nothing is left on it."""
+        if self.timer is not None and self.timer.running:
+            self.timer.stop()
+        self.timer = None
+
+    def schedule(self, npc, kind, target, callback, delay=WHEEL_RESOLUTION, now=None):
+        """Queue up a reaction of `npc` to `target`.
+        Args:
+            npc (NPC): the NPC reacting
+            kind (str): kind of reaction, e.g. 'greet'
+            target (Object): what the NPC is reacting to
+            callback (callable): called as callback(targets) when the reaction
+                fires, with every target merged into the reaction
+            delay (float): seconds until the reaction fires
+        Returns True if the reaction was queued or merged.
+        """
+        if now is None:
+            now = time.time()
+        key = (npc.id, kind)
+        if self._on_cooldown(key, target, now) or self._rate_limited(npc.id, now):
+            return False
+        slot = self.pending.get(key)
+        if slot is None or key not in self.wheel[slot]:
+            turns = min(self.slots - 1, max(1, int(round(delay / self.resolution))))
+            slot = (self.position + turns) % self.slots
+            self.wheel[slot][key] = Reaction(npc, kind, callback)
+            self.pending[key] = slot
+            self._start()
+        reaction = self.wheel[slot][key]
+        if target not in reaction.targets:
+            reaction.targets.append(target)
+        return True
+
+    def cancel(self, npc):
+        """Drop all pending reactions of an NPC."""
+        for key in [key for key in self.pending if key[0] == npc.id]:
+            self.wheel[self.pending.pop(key)].pop(key, None)
+        if not self.pending:
+            self._stop()
+
+    def tick(self, now=None):
+        """Turn the wheel one slot and fire every reaction in it."""
+        if now is None:
+            now = time.time()
+        self.position = (self.position + 1) % self.slots
+        due = self.wheel[self.position]
+        self.wheel[self.position] = {}
+        # take every due reaction off the wheel before any of them fires,
+        # so a callback that raises can't leave the others half-removed
+        for key in due:
+            self.pending.pop(key, None)
+        for key, reaction in due.items():
+            try:
+                self._fire(key, reaction, now)
+            except Exception:
+                logger.log_trace(f"Reaction {reaction.kind} of {reaction.npc} failed.")
+        if not self.pending:
+            # nothing left to do, drop expired cooldowns while we are idle
+            self.cooldowns = {cooldown_key: expires for cooldown_key, expires \
+                              in self.cooldowns.items() if expires > now}
+            self._stop()
+
+    def _fire(self, key, reaction, now):
+        """Fire a reaction at the targets still in the NPC's room."""
+        npc = reaction.npc
+        if not npc.pk or npc.location is None or self._rate_limited(npc.id, now):
+            return
+        targets = [target for target in reaction.targets \
+                   if target.location == npc.location]
+        if not targets:
+            return
+        for target in targets:
+            self.cooldowns[key + (target.id,)] = now + REACTION_COOLDOWN
+        self.history.setdefault(npc.id, deque()).append(now)
+        reaction.callback(targets)
+
+
+# the scheduler for all NPCs on the server
+REACTION_SCHEDULER = ReactionScheduler()
+
+
+def npc_say(npc, speech):
+    """Have an NPC say something to the room without the command parser."""
+    if npc.location is not None:
+        npc.location.occupants.msg_listeners(f'{npc} says, "{speech}"', \
+                                             exclude=npc)
+
+
+def npc_emote(npc, emote):
+    """Have an NPC emote to the room without the command parser."""
+    if npc.location is not None:
+        npc.location.occupants.msg_listeners(f"{npc} {emote}", exclude=npc)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Occupants module.
+
+Rooms keep an in-memory index of the characters and NPCs inside them so that
+room events (someone entering, an NPC greeting, etc) only reach the objects
+that can do something with them. Items, exits and other props sitting in a
+room are never messaged.
+
+The index is not persistent. It is built from the room's contents the first
+time it is used after a server start or reload and is then kept up to date by
+the room's at_object_receive and at_object_leave hooks.
+
+**Setup**
+    ```python
+    from evennia.utils import lazy_property
+    from world.occupants import OccupantHandler
+        ...
+    class Room(DefaultRoom):
+        ...
+        @lazy_property
+        def occupants(self):
+            return OccupantHandler(self)
+    ```
+
+**Use**
+    ```python
+    >>> room.occupants.add(character)
+    >>> room.occupants.listeners()              # characters with sessions
+    >>> room.occupants.npcs()
+    >>> room.occupants.msg_listeners("A bell rings.", exclude=character)
+    >>> room.occupants.remove(character)
+    ```
+"""
+from world.capabilities import is_combatant, is_npc
+
+
+class OccupantHandler(object):
+    """Handler for the characters and NPCs in a room.
+    Args:
+        obj (Room): parent room for this OccupantHandler
+    Methods:
+        add(obj): add a character or NPC to the index
+        remove(obj): remove an object from the index
+        characters(): all characters and NPCs in the room
+        npcs(): all NPCs in the room
+        listeners(): all session-bearing characters in the room
+        msg_listeners(text, exclude): message the session-bearing characters
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        # dbref: object, for every character and NPC in the room
+        self.occupants = {}
+        # dbref: object, for the NPCs only
+        self.npc_index = {}
+        self.rebuild()
+
+    def __len__(self):
+        """Return number of characters and NPCs in the room."""
+        return len(self.occupants)
+
+    def __contains__(self, obj):
+        """Support `obj in room.occupants` syntax."""
+        return getattr(obj, 'id', None) in self.occupants
+
+    def __iter__(self):
+        """Iterate through the characters and NPCs in the room."""
+        return iter(list(self.occupants.values()))
+
+    def rebuild(self):
+        """Rebuild the index from the room's contents."""
+        self.occupants.clear()
+        self.npc_index.clear()
+        for item in self.obj.contents:
+            self.add(item)
+
+    def add(self, obj):
+        """Add an object to the index. Returns True if it was indexed."""
+        if not is_combatant(obj):
+            return False
+        self.occupants[obj.id] = obj
+        if is_npc(obj):
+            self.npc_index[obj.id] = obj
+        return True
+
+    def remove(self, obj):
+        """Remove an object from the index."""
+        dbref = getattr(obj, 'id', None)
+        self.occupants.pop(dbref, None)
+        self.npc_index.pop(dbref, None)
+
+    def characters(self, exclude=None):
+        """Returns all characters and NPCs in the room."""
+        return [occupant for occupant in self.occupants.values() if occupant != exclude]
+
+    def npcs(self, exclude=None):
+        """Returns all NPCs in the room."""
+        return [npc for npc in self.npc_index.values() if npc != exclude]
+
+    def listeners(self, exclude=None):
+        """Returns all characters in the room that have a session to message."""
+        return [occupant for occupant in self.occupants.values() \
+                if occupant != exclude and occupant.sessions.count()]
+
+    def msg_listeners(self, text, exclude=None, **kwargs):
+        """Sends a message to every session-bearing character in the room."""
+        for listener in self.listeners(exclude=exclude):
+            listener.msg(text, **kwargs)
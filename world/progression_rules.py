@@ -9,8 +9,10 @@ import random
 from evennia.utils.logger import log_file
 from world.dice_roller import return_a_roll as roll
 from world import talents, mutations
+from world.metrics import METRICS
 
 # controller for progression functions
+@METRICS.timed('progression.checks')
 def control_progression_funcs(character):
     """
     Call all of the progression functions as needed, in the right order.
@@ -35,7 +37,7 @@ def check_ability_score_progression(character):
     for ability_score in ability_scores:
         # log_file(f"Checking progression for {character.name} - {ability_score.name}", \
         #          filename='progression.log')
-        if ability_score.learn >= ability_score.actual:
+        if character.ability_scores.learn_total(ability_score._key) >= ability_score.actual:
             # we have a chance to learn something
             # set the threshold for gaining points and make it harder as the
             # score gets higher
@@ -49,7 +51,7 @@ def check_ability_score_progression(character):
                 ability_score.mod += 1
                 character.msg(f"|GYou've learned something about |h{ability_score.name}|n.")
                 # reset the learn counter
-                ability_score.learn = 0
+                character.ability_scores.reset_learn(ability_score._key)
                 # check if we mutated
                 check_mutation_progression(character, ability_score)
 
@@ -66,7 +68,7 @@ def check_trait_progression(character):
     for trait in progressable_traits:
         # log_file(f"Checking progression for {character.name} - {trait.name}", \
         #          filename='progression.log')
-        if trait.learn >= trait.actual:
+        if character.traits.learn_total(trait._key) >= trait.actual:
             # we have a chance to learn something
             # set the threshold for gaining points and make it harder as the
             # score gets higher
@@ -78,7 +80,7 @@ def check_trait_progression(character):
                 trait.mod += 1
                 character.msg(f"|GYou've learned something about |h{trait.name}|n.")
                 # reset the learn counter
-                trait.learn = 0
+                character.traits.reset_learn(trait._key)
 
 
 # progress talents
@@ -114,7 +116,7 @@ def check_talent_progression(character):
     for talent in ALL_TALENTS:
         # log_file(f"Checking progression for {character.name} - {talent.name}", \
         #          filename='progression.log')
-        if talent.learn >= talent.actual and talent.actual != 0:
+        if character.talents.learn_total(talent._key) >= talent.actual and talent.actual != 0:
             # we have a chance to learn something
             # set the threshold for gaining points and make it harder as the
             # score gets higher
@@ -126,7 +128,7 @@ def check_talent_progression(character):
                 talent.mod += 1
                 character.msg(f"|GYou've learned something about |h{talent.name}|n.")
                 # reset the learn counter
-                talent.learn = 0
+                character.talents.reset_learn(talent._key)
 
 
 # progress mutations
@@ -175,7 +177,7 @@ def check_mutation_progression(character, ability_score):
                 # now that we've filtered out the non-zero mutations and the
                 # mutations not of thios ability score type, we can check if
                 # the learn counter is high enough to progress this mutation
-                if mutation.learn >= mutation.actual:
+                if character.mutations.learn_total(mutation._key) >= mutation.actual:
                     # we have a chance to learn something
                     # set the threshold for gaining points and make it harder as the
                     # score gets higher
@@ -196,7 +198,7 @@ def check_mutation_progression(character, ability_score):
                                 character.msg(f"|GYou've mutated! |h{mutation.name}|n. has regressed.")
                         change_character_description_for_progression(character, mutation)
                         # reset the learn counter
-                        mutation.learn = 0
+                        character.mutations.reset_learn(mutation._key)
 
 
 # learn new talents
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Resource ledger module.
+
+Every strike, block and grapple in combat costs the combatants some stamina
+and every hit costs the defender some health. Writing each cost to the gauge
+right away saves the character's traits attribute every time, so a round of
+five strikes costs at least ten saves per pair of combatants.
+
+Instead, the combat handler keeps a ResourceLedger for the round. Costs for
+hp, sp and cp are added up per character as the round plays out and
+committed at the end of the round with one write per character (see
+TraitHandler.apply_current_deltas).
+
+**Use**
+    ```python
+    >>> from world.resource_ledger import ResourceLedger
+    >>> ledger = ResourceLedger()
+    >>> ledger.charge(character, 'sp', 12 / character.combat_state.enc_mod)
+    >>> ledger.charge(defender, 'hp', 7)
+    >>> ledger.commit()
+    ```
+"""
+from evennia.utils.logger import log_file
+
+# gauges that can be charged
+LEDGER_GAUGES = ('hp', 'sp', 'cp')
+
+
+class ResourceLedger(object):
+    """Round-scoped accumulator of gauge costs.
+    Methods:
+        charge(character, gauge, amount): add a cost to a character's gauge
+        pending(character, gauge): cost not yet committed for a gauge
+        commit(): apply every cost with one write per character
+    """
+    def __init__(self):
+        # character id: (character, {gauge: total cost})
+        self.entries = {}
+
+    def __len__(self):
+        """Return number of characters with pending costs."""
+        return len(self.entries)
+
+    def charge(self, character, gauge, amount):
+        """Add `amount` to the cost of one of the character's gauges."""
+        if gauge not in LEDGER_GAUGES:
+            raise ValueError(f"Unknown gauge for resource ledger: {gauge}")
+        if not amount:
+            return
+        costs = self.entries.setdefault(character.id, (character, {}))[1]
+        # python floats, the trait setters ignore numpy numbers
+        costs[gauge] = costs.get(gauge, 0) + float(amount)
+
+    def pending(self, character, gauge):
+        """Returns the cost of a gauge that has not been committed yet."""
+        entry = self.entries.get(character.id)
+        if entry is None:
+            return 0
+        return entry[1].get(gauge, 0)
+
+    def commit(self):
+        """Apply every pending cost, one write per character, and clear."""
+        entries = self.entries
+        self.entries = {}
+        for character, costs in entries.values():
+            if not character.pk:
+                # deleted while the round was playing out
+                continue
+            character.traits.apply_current_deltas( \
+                {gauge: -float(cost) for gauge, cost in costs.items()})
+            log_file(f"{character.name} spent {costs}.", filename='combat.log')
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded random streams for fights.
+
+Combat draws random numbers from two places: the numpy generator shared by
+the dice roller (world/dice_roller.py) and the `random` module, which combat
+rules and descriptions use for random.choice/random.choices. Neither is
+seeded, so a fight can never be played out the same way twice.
+
+Every fight gets a FightRandom with its own seed. While a combatant's action
+(or the damage batch at the end of a round) runs, `active(round, step)` swaps
+both sources for streams derived from (seed, round, step) and puts the shared
+ones back afterwards. Deriving a fresh stream for every step means a single
+step can be replayed from the fight's seed and the step's recorded inputs
+(see world/combat_recorder.py) without replaying everything that came before.
+
+**Use**
+    ```python
+    >>> from world.rng import FightRandom
+    >>> fight_random = FightRandom()
+    >>> with fight_random.active(round_count, step):
+    ...     action = combat_action_picker(character, round_action)
+    ```
+"""
+import random
+from contextlib import contextmanager
+import numpy as np
+from world import dice_roller
+
+# step number used for the damage batch at the end of a round
+RESOLVE_STEP = 255
+
+
+class FightRandom(object):
+    """Random streams for one fight.
+    Args:
+        seed (int, optional): seed for the fight, picked at random if None
+    Methods:
+        streams(round_count, step): numpy and python generators for a step
+        active(round_count, step): context manager that makes combat use the
+            streams for a step
+    """
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1, dtype=np.uint64)[0])
+        self.seed = seed
+
+    def streams(self, round_count, step):
+        """Returns the (numpy Generator, random.Random) for a step."""
+        sequence = np.random.SeedSequence([self.seed, round_count, step])
+        python_seed = int(sequence.generate_state(1, dtype=np.uint64)[0])
+        return np.random.default_rng(sequence), random.Random(python_seed)
+
+    @contextmanager
+    def active(self, round_count, step):
+        """
+        Makes the dice roller and the random module draw from this fight's
+        streams for a step, then puts the shared ones back.
+        """
+        generator, python_random = self.streams(round_count, step)
+        shared_generator = dice_roller._RNG
+        shared_state = random.getstate()
+        dice_roller._RNG = generator
+        random.setstate(python_random.getstate())
+        try:
+            yield self
+        finally:
+            dice_roller._RNG = shared_generator
+            random.setstate(shared_state)
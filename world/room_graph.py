@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Room graph module.
+
+An in-memory index of which rooms lead to which, for anything that needs to
+find its way around: fleeing combatants, and later NPCs that wander or hunt.
+Without it, every question about the map means going through the exits of
+every room on the way.
+
+Rooms are indexed the first time they are asked about, from their exits, and
+their neighbors are indexed as searches reach them, so the server never has
+to load the whole map at once. From then on the index is kept up to date by
+the exits themselves (see typeclasses/exits.py) as they are created, deleted,
+moved or relinked, and by rooms when they are deleted.
+
+Whether a room is safe from combat is read from its 'Non-Combat Room' info
+every time it's asked, not indexed, since builders can change it with @set
+without the graph hearing about it.
+
+Every exit is one step, so paths are found breadth-first, which gives the
+shortest path. Paths between two rooms are kept in a small LRU cache that is
+cleared whenever the graph changes. Searches for the nearest safe room aren't
+cached, as their answer changes with the info of the rooms on the way.
+
+**Use**
+    ```python
+    >>> from world.room_graph import ROOM_GRAPH
+    >>> ROOM_GRAPH.neighbors(room)
+    (RoomExit(key='north', destination=<Road>), RoomExit(key='east', destination=<Gate>))
+    >>> ROOM_GRAPH.find_path(room, temple)
+    ['north', 'north', 'east']
+    >>> ROOM_GRAPH.nearest_safe_room(room)
+    Route(room=<Temple>, path=['north', 'north', 'east'])
+    ```
+"""
+from collections import OrderedDict, deque, namedtuple
+
+# info field of rooms that are safe from combat
+SAFE_ROOM_INFO = 'Non-Combat Room'
+# number of paths kept in the path cache
+PATH_CACHE_SIZE = 512
+# how many steps away searches look by default
+PATH_MAX_DEPTH = 20
+
+# an exit out of a room and the room it leads to
+RoomExit = namedtuple('RoomExit', ('key', 'destination'))
+# the room a search found and the exit keys to walk to get there
+Route = namedtuple('Route', ('room', 'path'))
+
+
+class RoomGraph(object):
+    """In-memory index of rooms and the exits between them.
+    Args:
+        cache_size (int): number of paths to keep in the path cache
+    Properties:
+        exits (dict): room id: {exit id: RoomExit} of every indexed room
+        exit_rooms (dict): exit id: id of the room the exit is in
+        paths (OrderedDict): (start id, goal id or None, max depth): Route,
+            the path cache, least recently used first
+        version (int): goes up every time the graph changes
+    Methods:
+        neighbors(room): the exits out of a room
+        find_path(start, goal, max_depth): exit keys from start to goal
+        nearest_safe_room(start, max_depth): route to the closest safe room
+        is_safe(room): whether a room is a non-combat room
+        add_exit(exit): index a new, moved or relinked exit
+        remove_exit(exit): forget a deleted exit
+        remove_room(room): forget a deleted room
+        clear(): forget everything, rooms are indexed again as needed
+    """
+    def __init__(self, cache_size=PATH_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.clear()
+
+    def clear(self):
+        """Forgets every room and path."""
+        self.exits = {}
+        self.exit_rooms = {}
+        self.paths = OrderedDict()
+        self.version = 0
+
+    def _changed(self):
+        """Drops the cached paths after a change to the graph."""
+        self.paths.clear()
+        self.version += 1
+
+    def _index_room(self, room):
+        """Reads the exits of a room into the index. Returns them."""
+        room_exits = {}
+        for exit in room.exits:
+            if exit.destination is not None:
+                room_exits[exit.id] = RoomExit(exit.key, exit.destination)
+                self.exit_rooms[exit.id] = room.id
+        self.exits[room.id] = room_exits
+        return room_exits
+
+    def _room_exits(self, room):
+        """Returns {exit id: RoomExit} of a room, indexing it if needed."""
+        room_exits = self.exits.get(room.id)
+        if room_exits is None:
+            room_exits = self._index_room(room)
+        return room_exits
+
+    def neighbors(self, room):
+        """Returns the exits out of a room as a tuple of RoomExits."""
+        return tuple(self._room_exits(room).values())
+
+    def is_safe(self, room):
+        """Returns True if the room is a non-combat room."""
+        info = room.db.info or {}
+        return bool(info.get(SAFE_ROOM_INFO, False))
+
+    def _search(self, start, is_goal, max_depth):
+        """
+        Breadth-first search from `start` for a room that `is_goal(room)`
+        accepts. Returns a Route, or None if there's none within max_depth
+        steps.
+        """
+        if is_goal(start):
+            return Route(start, [])
+        # room id: (room it was reached from, exit key taken)
+        came_from = {start.id: None}
+        frontier = deque([(start, 0)])
+        while frontier:
+            room, depth = frontier.popleft()
+            if depth >= max_depth:
+                continue
+            for room_exit in self._room_exits(room).values():
+                destination = room_exit.destination
+                if destination.id in came_from:
+                    continue
+                came_from[destination.id] = (room, room_exit.key)
+                if is_goal(destination):
+                    path = []
+                    step = came_from[destination.id]
+                    while step is not None:
+                        previous, key = step
+                        path.append(key)
+                        step = came_from[previous.id]
+                    path.reverse()
+                    return Route(destination, path)
+                frontier.append((destination, depth + 1))
+        return None
+
+    def _cached_search(self, cache_key, start, is_goal, max_depth):
+        """Runs a search through the LRU path cache."""
+        if cache_key in self.paths:
+            self.paths.move_to_end(cache_key)
+            return self.paths[cache_key]
+        route = self._search(start, is_goal, max_depth)
+        self.paths[cache_key] = route
+        if len(self.paths) > self.cache_size:
+            self.paths.popitem(last=False)
+        return route
+
+    def find_path(self, start, goal, max_depth=PATH_MAX_DEPTH):
+        """
+        Returns the exit keys to walk from the start room to the goal room,
+        or None if the goal can't be reached within max_depth steps.
+        """
+        route = self._cached_search((start.id, goal.id, max_depth), start, \
+                                    lambda room: room.id == goal.id, max_depth)
+        return list(route.path) if route else None
+
+    def nearest_safe_room(self, start, max_depth=PATH_MAX_DEPTH):
+        """
+        Returns a Route to the closest non-combat room, or None if there's
+        none within max_depth steps. If the start room is safe, the route's
+        path is empty.
+        """
+        return self._search(start, self.is_safe, max_depth)
+
+    def add_exit(self, exit):
+        """
+        Indexes an exit that was created, moved or relinked. Exits of rooms
+        that aren't indexed yet are picked up when the room is.
+        """
+        if not exit.id:
+            # not saved yet, at_object_creation will add it
+            return
+        self.remove_exit(exit)
+        location = exit.location
+        if location is None or location.id not in self.exits or exit.destination is None:
+            return
+        self.exits[location.id][exit.id] = RoomExit(exit.key, exit.destination)
+        self.exit_rooms[exit.id] = location.id
+        self._changed()
+
+    def remove_exit(self, exit):
+        """Forgets an exit that was deleted or is about to be changed."""
+        room_id = self.exit_rooms.pop(exit.id, None)
+        if room_id is not None:
+            self.exits.get(room_id, {}).pop(exit.id, None)
+            self._changed()
+
+    def remove_room(self, room):
+        """Forgets a deleted room and the exits out of it."""
+        for exit_id in self.exits.pop(room.id, {}):
+            self.exit_rooms.pop(exit_id, None)
+        self._changed()
+
+
+ROOM_GRAPH = RoomGraph()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Stats index module.
+
+Ranking characters by their ability scores, talents or mutations would mean
+loading every character and all of their trait handlers. Instead, the server
+keeps a denormalized, in-memory columnar index of character stats:
+
+- One row per character, keyed by the character's id.
+- One numpy column per stat, named '<handler>.<trait key>', e.g.
+  'ability_scores.Str', 'talents.sneak' or 'mutations.wings'. The value is
+  the trait's `base`+`mod`. Characters without a trait hold NaN.
+
+Characters are indexed when they are loaded (Character.at_init), so the
+index fills up as characters come into the cache rather than with a scan of
+every character. Single stats are updated through the trait handlers'
+change hook (Character.at_trait_changed) whenever a trait is added, removed
+or changed, whether by progression, a reroll or a builder command.
+`rebuild()` indexes every character in the game from scratch; it is only
+run when an admin asks for it. Until then, results only cover the characters
+loaded since the server started; `coverage()` tells how many that is.
+
+**Use**
+    ```python
+    >>> from world.stats_index import STATS_INDEX
+    >>> STATS_INDEX.top_k('talents.sneak', 10)
+    [('Meirok', 12, 54.0), ...]
+    >>> STATS_INDEX.percentile('ability_scores.Str', [25, 50, 75])
+    >>> STATS_INDEX.histogram('ability_scores.Str', bins=10)
+    ```
+"""
+import numpy as np
+from evennia.utils.logger import log_file
+from world.capabilities import is_npc
+
+# trait handlers of a character that get indexed
+INDEXED_HANDLERS = ('ability_scores', 'traits', 'talents', 'mutations')
+# rows to allocate when the index is created
+_INITIAL_CAPACITY = 64
+
+
+def stat_name(handler_name, trait_key):
+    """Returns the column name for a trait."""
+    return f"{handler_name}.{trait_key}"
+
+
+class StatsIndex(object):
+    """Columnar in-memory index of character stats.
+    Methods:
+        index_character(character): (re)index all stats of a character
+        update(character, handler_name, key): update a single stat
+        remove(character): drop a character from the index
+        reset(): empty the index
+        rebuild(): index every character from scratch
+        coverage(): number of indexed characters and of all characters
+        stats(): names of all indexed stats
+        top_k(stat, k): the k characters with the highest value of a stat
+        percentile(stat, q): percentile(s) of a stat across characters
+        histogram(stat, bins): histogram of a stat across characters
+    """
+    def __init__(self, capacity=_INITIAL_CAPACITY):
+        self.reset(capacity)
+
+    def reset(self, capacity=None):
+        """Empties the index, keeping its capacity unless given a new one."""
+        if capacity is not None:
+            self.capacity = capacity
+        capacity = self.capacity
+        # character id: row
+        self.rows = {}
+        # per row details, rows of removed characters are reused
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.names = [None] * capacity
+        self.is_npc = np.zeros(capacity, dtype=bool)
+        self.free_rows = []
+        # number of rows handed out so far
+        self.used_rows = 0
+        # stat name: column of values
+        self.columns = {}
+
+    def __len__(self):
+        """Return number of indexed characters."""
+        return len(self.rows)
+
+    def _grow(self):
+        """Double the number of rows in the index."""
+        extra = self.capacity
+        self.ids = np.concatenate((self.ids, np.full(extra, -1, dtype=np.int64)))
+        self.names.extend([None] * extra)
+        self.is_npc = np.concatenate((self.is_npc, np.zeros(extra, dtype=bool)))
+        for stat, column in self.columns.items():
+            self.columns[stat] = np.concatenate((column, np.full(extra, np.nan)))
+        self.capacity += extra
+
+    def _row(self, character):
+        """Returns the row of a character, adding it if needed."""
+        row = self.rows.get(character.id)
+        if row is not None:
+            return row
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            if self.used_rows >= self.capacity:
+                self._grow()
+            row = self.used_rows
+            self.used_rows += 1
+        self.rows[character.id] = row
+        self.ids[row] = character.id
+        self.names[row] = character.key
+        self.is_npc[row] = is_npc(character)
+        return row
+
+    def _set(self, row, stat, value):
+        """Set a single value, adding the column if needed."""
+        column = self.columns.get(stat)
+        if column is None:
+            column = self.columns[stat] = np.full(self.capacity, np.nan)
+        column[row] = value
+
+    def index_character(self, character):
+        """(Re)index every stat of a character."""
+        row = self._row(character)
+        for column in self.columns.values():
+            column[row] = np.nan
+        for handler_name in INDEXED_HANDLERS:
+            handler = getattr(character, handler_name, None)
+            if handler is None:
+                continue
+            for key, data in handler.attr_dict.items():
+                self._set(row, stat_name(handler_name, key), data['base'] + data['mod'])
+
+    def update(self, character, handler_name, key):
+        """Update a single stat of a character from one of its traits."""
+        if handler_name not in INDEXED_HANDLERS:
+            return
+        row = self.rows.get(character.id)
+        if row is None:
+            # not indexed yet, pick up everything
+            self.index_character(character)
+            return
+        data = getattr(character, handler_name).attr_dict.get(key)
+        value = np.nan if data is None else data['base'] + data['mod']
+        self._set(row, stat_name(handler_name, key), value)
+
+    def remove(self, character):
+        """Drop a character from the index."""
+        row = self.rows.pop(character.id, None)
+        if row is None:
+            return
+        self.ids[row] = -1
+        self.names[row] = None
+        self.is_npc[row] = False
+        for column in self.columns.values():
+            column[row] = np.nan
+        self.free_rows.append(row)
+
+    def rebuild(self):
+        """Index every character in the game from scratch."""
+        from typeclasses.characters import Character
+        self.reset()
+        for character in Character.objects.all_family():
+            self.index_character(character)
+        log_file(f"Rebuilt stats index: {len(self.rows)} characters, {len(self.columns)} stats.", \
+                 filename='stats_index.log')
+
+    def coverage(self):
+        """
+        Returns (indexed, total): the number of characters in the index and
+        the number of characters in the game. Counting them is one query,
+        nothing is loaded.
+        """
+        from typeclasses.characters import Character
+        return len(self.rows), Character.objects.all_family().count()
+
+    def stats(self):
+        """Returns the names of all indexed stats."""
+        return sorted(self.columns.keys())
+
+    def _values(self, stat, include_npcs=False):
+        """Returns the rows and values of a stat for the indexed characters."""
+        column = self.columns.get(stat)
+        if column is None:
+            return np.array([], dtype=np.int64), np.array([])
+        mask = ~np.isnan(column)
+        if not include_npcs:
+            mask &= ~self.is_npc
+        rows = np.flatnonzero(mask)
+        return rows, column[rows]
+
+    def top_k(self, stat, k=10, include_npcs=False):
+        """Returns the k highest (name, id, value) tuples for a stat."""
+        rows, values = self._values(stat, include_npcs)
+        if not len(values) or k <= 0:
+            return []
+        if k < len(values):
+            # partition out the top k, then only sort those
+            top = np.argpartition(values, -k)[-k:]
+        else:
+            top = np.arange(len(values))
+        top = top[np.argsort(values[top])[::-1]]
+        return [(self.names[rows[i]], int(self.ids[rows[i]]), float(values[i])) \
+                for i in top]
+
+    def percentile(self, stat, q, include_npcs=False):
+        """Returns the q-th percentile(s) of a stat, or None if no data."""
+        rows, values = self._values(stat, include_npcs)
+        if not len(values):
+            return None
+        return np.percentile(values, q)
+
+    def percentile_rank(self, stat, value, include_npcs=False):
+        """Returns the percentage of characters with a stat below `value`."""
+        rows, values = self._values(stat, include_npcs)
+        if not len(values):
+            return None
+        return 100.0 * np.count_nonzero(values < value) / len(values)
+
+    def histogram(self, stat, bins=10, include_npcs=False):
+        """Returns (counts, bin_edges) of a stat, or None if no data."""
+        rows, values = self._values(stat, include_npcs)
+        if not len(values):
+            return None
+        return np.histogram(values, bins=bins)
+
+
+# the index for the whole server
+STATS_INDEX = StatsIndex()
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the fight recordings in world/combat_recorder.py.
+
+Run with `evennia test world.tests`.
+"""
+from unittest import TestCase
+from world.combat_recorder import CombatRecorder, read_records, REC_STEP
+
+
+class TestCombatRecorder(TestCase):
+
+    def test_long_strings_are_cut_on_a_character_boundary(self):
+        recorder = CombatRecorder(seed=1)
+        # 'é' is two bytes, so 255 bytes ends halfway through one
+        action = 'é' * 200
+        recorder.record_step(1, 0, None, action, [])
+        seed, records = read_records(recorder.getvalue())
+        self.assertEqual(seed, 1)
+        rec_type, fields = records[0]
+        self.assertEqual(rec_type, REC_STEP)
+        self.assertEqual(fields[3], 'é' * 127)
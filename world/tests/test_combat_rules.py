@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the damage pipeline in world/combat_rules.py.
+
+Run with `evennia test world.tests`.
+"""
+from unittest import TestCase
+import numpy as np
+from world import dice_roller
+from world.combat_rules import Hit, apply_damage_batch
+from world.combatant_state import CombatantState
+from world.resource_ledger import ResourceLedger
+from world.traits import TraitHandler
+
+
+class _Attributes(dict):
+    """Stands in for an object's attribute handler."""
+    def has(self, key):
+        return key in self
+
+    def add(self, key, value):
+        self[key] = value
+
+    def get(self, key, default=None):
+        return dict.get(self, key, default)
+
+
+class _Combatant(object):
+    """A combatant with real trait handlers and no db."""
+    def __init__(self, dbref, name):
+        self.id = self.pk = dbref
+        self.key = self.name = name
+        self.attributes = _Attributes()
+        self.combat_state = CombatantState()
+        self.traits = TraitHandler(self)
+        self.ability_scores = TraitHandler(self, db_attribute='ability_scores')
+        for gauge in ('hp', 'sp', 'cp'):
+            self.traits.add(key=gauge, name=gauge, type='gauge', base=1000, min=0)
+        for ability in ('Str', 'Dex', 'Vit', 'Per', 'Cha'):
+            self.ability_scores.add(key=ability, name=ability, base=100)
+
+
+class TestApplyDamageBatch(TestCase):
+
+    def setUp(self):
+        dice_roller.seed(36)
+        self.attacker = _Combatant(1, "Ann")
+        self.defender = _Combatant(2, "Bob")
+
+    def tearDown(self):
+        dice_roller.seed()
+
+    def test_defender_hp_goes_down(self):
+        damage = apply_damage_batch([Hit(self.attacker, self.defender, 'unarmed', False)], \
+                                    check_health=False)
+        self.assertGreater(damage[0], 0)
+        self.assertEqual(self.defender.traits.hp.current, 1000 - damage[0])
+        self.assertEqual(self.attacker.traits.hp.current, 1000)
+
+    def test_ledger_damage_is_committed(self):
+        ledger = ResourceLedger()
+        damage = apply_damage_batch([Hit(self.attacker, self.defender, 'unarmed', False)], \
+                                    ledger=ledger)
+        self.assertEqual(self.defender.traits.hp.current, 1000)
+        ledger.commit()
+        self.assertEqual(self.defender.traits.hp.current, 1000 - damage[0])
+
+    def test_gauges_stay_writable_after_a_batch(self):
+        apply_damage_batch([Hit(self.attacker, self.defender, 'unarmed', False)], \
+                           check_health=False)
+        hp = self.defender.traits.hp.current
+        self.assertIs(type(hp), float)
+        self.defender.traits.hp.current -= 5
+        self.assertEqual(self.defender.traits.hp.current, hp - 5)
+
+
+class TestApplyCurrentDeltas(TestCase):
+
+    def setUp(self):
+        self.character = _Combatant(1, "Ann")
+
+    def test_numpy_deltas_are_stored_as_floats(self):
+        self.character.traits.apply_current_deltas({'sp': -np.float64(10)})
+        self.assertIs(type(self.character.traits.sp.current), float)
+        self.character.traits.sp.current -= 5
+        self.assertEqual(self.character.traits.sp.current, 985)
+
+    def test_ledger_costs_are_stored_as_floats(self):
+        ledger = ResourceLedger()
+        ledger.charge(self.character, 'sp', np.float64(10))
+        ledger.commit()
+        self.character.traits.sp.current -= 5
+        self.assertEqual(self.character.traits.sp.current, 985)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the latency histograms in world/command_stats.py.
+
+Run with `evennia test world.tests`.
+"""
+from unittest import TestCase
+from world.command_stats import LatencyHistogram, SUB_BUCKETS
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_small_values_are_exact(self):
+        for value in range(2 * SUB_BUCKETS):
+            index = LatencyHistogram.bucket_index(value)
+            self.assertEqual(LatencyHistogram.bucket_value(index), value)
+
+    def test_sub_buckets_per_power_of_two(self):
+        for bits in range(7, 20):
+            indices = {LatencyHistogram.bucket_index(value) \
+                       for value in range(1 << (bits - 1), 1 << bits)}
+            self.assertEqual(len(indices), SUB_BUCKETS)
+
+    def test_bucket_values_are_close(self):
+        for value in range(1, 200000, 7):
+            middle = LatencyHistogram.bucket_value(LatencyHistogram.bucket_index(value))
+            self.assertLessEqual(abs(middle - value) / value, .5 / SUB_BUCKETS)
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 1001):
+            histogram.record(value * 10)
+        self.assertAlmostEqual(histogram.percentile(50), 5000, delta=5000 / SUB_BUCKETS)
+        self.assertAlmostEqual(histogram.percentile(99), 9900, delta=9900 / SUB_BUCKETS)
+        self.assertEqual(histogram.percentile(100), 10000)
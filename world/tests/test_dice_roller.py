@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for world/dice_roller.py, through the seeded checks in
+world/dice_roller_checks.py.
+
+Run with `evennia test world.tests`.
+"""
+from unittest import TestCase
+from world import dice_roller
+from world import dice_roller_checks
+
+# smaller batches than the full checks, to keep the tests quick
+TEST_SCALAR_SAMPLES = 5000
+TEST_BATCH_SAMPLES = 50000
+
+
+class TestDiceRollerChecks(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = dice_roller_checks.run_checks(seed=1234, \
+                                                    scalar_samples=TEST_SCALAR_SAMPLES, \
+                                                    batch_samples=TEST_BATCH_SAMPLES)
+
+    def test_every_check_passes(self):
+        failed = [result.name for result in self.results if not result.passed]
+        self.assertEqual(failed, [])
+
+    def test_every_shape_is_checked(self):
+        for dist_shape in dice_roller_checks.REFERENCE_CRIT_RATES:
+            self.assertTrue(any(result.name.startswith(f"{dist_shape}:") \
+                                for result in self.results), dist_shape)
+
+    def test_same_seed_same_results(self):
+        results = dice_roller_checks.run_checks(seed=1234, \
+                                                scalar_samples=TEST_SCALAR_SAMPLES, \
+                                                batch_samples=TEST_BATCH_SAMPLES)
+        self.assertEqual(results, self.results)
+
+    def test_roller_is_unseeded_afterwards(self):
+        dice_roller_checks.run_checks(seed=1234, scalar_samples=10, batch_samples=10)
+        after = [dice_roller.return_a_roll_sans_crits(100) for _ in range(20)]
+        dice_roller.seed(1234)
+        seeded = [dice_roller.return_a_roll_sans_crits(100) for _ in range(20)]
+        dice_roller.seed()
+        self.assertNotEqual(after, seeded)
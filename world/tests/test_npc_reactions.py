@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the NPC reaction scheduler in world/npc_reactions.py.
+
+Run with `evennia test world.tests`.
+"""
+from unittest import TestCase
+from unittest.mock import patch
+from world.npc_reactions import ReactionScheduler
+
+
+class _Thing(object):
+    """An NPC or character with an id and a location."""
+    def __init__(self, dbref, location):
+        self.id = self.pk = dbref
+        self.location = location
+
+
+class TestReactionScheduler(TestCase):
+
+    def setUp(self):
+        self.scheduler = ReactionScheduler()
+        # no timer, the tests turn the wheel themselves
+        self.scheduler._start = lambda: None
+        self.scheduler._stop = lambda: None
+        self.npcs = [_Thing(dbref, 'room') for dbref in (1, 2)]
+        self.target = _Thing(3, 'room')
+        self.fired = []
+
+    def _raise(self, targets):
+        raise RuntimeError("reaction failed")
+
+    def test_failing_reaction_does_not_stop_the_others(self):
+        self.scheduler.schedule(self.npcs[0], 'greet', self.target, self._raise, now=0)
+        self.scheduler.schedule(self.npcs[1], 'greet', self.target, self.fired.append, now=0)
+        with patch('world.npc_reactions.logger'):
+            self.scheduler.tick(now=1)
+        self.assertEqual(self.fired, [[self.target]])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_npcs_can_react_again_after_a_failure(self):
+        self.scheduler.schedule(self.npcs[0], 'greet', self.target, self._raise, now=0)
+        self.scheduler.schedule(self.npcs[1], 'greet', self.target, self.fired.append, now=0)
+        with patch('world.npc_reactions.logger'):
+            self.scheduler.tick(now=1)
+        other = _Thing(4, 'room')
+        for npc in self.npcs:
+            self.assertTrue(self.scheduler.schedule(npc, 'greet', other, self.fired.append, now=1))
+        self.scheduler.tick(now=2)
+        self.assertEqual(self.fired[1:], [[other], [other]])
+
+    def test_stale_pending_entry_is_rescheduled(self):
+        self.scheduler.pending[(1, 'greet')] = 5
+        self.assertTrue(self.scheduler.schedule(self.npcs[0], 'greet', self.target, \
+                                                self.fired.append, now=0))
+        self.scheduler.tick(now=1)
+        self.assertEqual(self.fired, [[self.target]])
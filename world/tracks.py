@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Tracks module.
+
+Rooms remember who has moved through them so that characters and NPCs with
+the tracking talent can follow a trail. Busy rooms write a track on every
+step of every character passing through, so the tracks are held in memory in
+a bounded ring buffer and only written back to the room's `db.tracks`
+attribute in batches.
+
+**Setup**
+    Add a `TrackHandler` to a room typeclass as a lazy property:
+    ```python
+    from evennia.utils import lazy_property
+    from world.tracks import TrackHandler
+        ...
+    class Room(DefaultRoom):
+        ...
+        @lazy_property
+        def tracks(self):
+            return TrackHandler(self)
+    ```
+    The handler reads the `trackmax` trait of the room (if it has one) to
+    decide how many tracks the ring buffer can hold.
+
+**Use**
+    ```python
+    >>> room.tracks.add(character, destination, 100)
+    >>> room.tracks.recent(limit=3)             # newest first
+    [Track(timestamp=..., trackee=<Meirok>, destination=<Road>, depth=100)]
+    >>> room.tracks.for_trackee(character)      # newest first
+    >>> room.tracks.readable(track_roll, limit=2)   # newest readable first
+    [ReadableTrack(track=Track(...), age=0.4, difficulty=104.0), ...]
+    >>> room.tracks.age_out()                   # drop tracks that are too old
+    >>> room.tracks.flush()                     # write pending tracks to the db
+    ```
+
+Tracks are stored in the db as a list of `(timestamp, trackee, destination,
+depth)` tuples, oldest first. Rooms created before the ring buffer existed
+stored a dict keyed by timestamp; that format is converted when first loaded.
+"""
+import time
+from collections import deque, namedtuple
+import numpy as np
+
+# a single set of tracks left in a room
+Track = namedtuple('Track', ('timestamp', 'trackee', 'destination', 'depth'))
+# a track along with its age in game days and how hard it is to read
+ReadableTrack = namedtuple('ReadableTrack', ('track', 'age', 'difficulty'))
+
+# number of tracks to hold if the room has no trackmax trait
+DEFAULT_TRACK_MAX = 20
+# tracks older than this (in real seconds) are aged out. Game time runs twice
+# as fast as real time, so this is about two weeks of game time.
+TRACK_MAX_AGE = 60 * 60 * 24 * 7
+# number of new tracks to collect before writing the buffer to the db
+TRACK_FLUSH_BATCH = 10
+# length of a game day in real seconds. game time is twice as fast as real time
+SECONDS_PER_GAME_DAY = 60 * 60 * 12
+# how much harder a track gets to read for every game day it ages
+DIFFICULTY_PER_DAY = 10
+
+
+def _track_key(trackee):
+    """Returns the key used for the per-trackee index."""
+    return getattr(trackee, 'id', trackee)
+
+
+def _insert_index(tracks, timestamp):
+    """Returns where a track with `timestamp` goes in a time ordered deque."""
+    index = len(tracks)
+    while index and tracks[index - 1].timestamp > timestamp:
+        index -= 1
+    return index
+
+
+class TrackHandler(object):
+    """Handler for the tracks left in a room.
+    Args:
+        obj (Room): parent room for this TrackHandler
+        db_attribute (str): name of the DB attribute for track storage
+    Properties:
+        maxlen (int): maximum number of tracks held by the ring buffer
+        dirty (int): number of changes not yet written to the db
+    Methods:
+        add(trackee, destination, depth): store a new set of tracks
+        recent(limit): newest tracks first
+        for_trackee(trackee, limit): newest tracks of a single trackee first
+        readable(track_roll, limit, trackee): newest tracks readable with
+            `track_roll` first, with their age and difficulty
+        age_out(now, max_age): drop tracks older than `max_age` seconds
+        remove_where(predicate): drop all tracks matching `predicate`
+        replace(tracks): replace all tracks, e.g. after weathering them
+        flush(): write the ring buffer back to the db
+    """
+    def __init__(self, obj, db_attribute='tracks'):
+        self.obj = obj
+        self.db_attribute = db_attribute
+        self.maxlen = self._get_maxlen()
+        # ring buffer of tracks, oldest on the left
+        self.buffer = deque()
+        # per-trackee index, each one also ordered oldest on the left
+        self.by_trackee = {}
+        # cached (timestamps, depths) arrays of the buffer, see _columns
+        self.columns = None
+        self.dirty = 0
+        self._load()
+
+    def __len__(self):
+        """Return number of tracks currently held."""
+        return len(self.buffer)
+
+    def __iter__(self):
+        """Iterate through the tracks, oldest first."""
+        return iter(self.buffer)
+
+    def _get_maxlen(self):
+        """Determine the ring buffer size from the room's trackmax trait."""
+        traits = getattr(self.obj, 'traits', None)
+        trackmax = traits.trackmax if traits is not None else None
+        if trackmax is None:
+            return DEFAULT_TRACK_MAX
+        return max(1, int(trackmax.actual))
+
+    def _load(self):
+        """Load tracks from the db, converting the old dict format."""
+        stored = self.obj.attributes.get(self.db_attribute, default=None)
+        if not stored:
+            return
+        if hasattr(stored, 'items'):
+            # old format: {timestamp: (trackee, destination, depth)}
+            rows = [(timestamp,) + tuple(info) for timestamp, info in stored.items()]
+            self.dirty += 1
+        else:
+            rows = [tuple(row) for row in stored]
+        rows.sort(key=lambda row: row[0])
+        for row in rows[-self.maxlen:]:
+            self._append(Track(*row))
+        if self.dirty:
+            self.flush()
+
+    def _append(self, track):
+        """Push a track onto the ring buffer, evicting the oldest if full."""
+        if len(self.buffer) >= self.maxlen:
+            self._evict_oldest()
+        self.buffer.append(track)
+        self.columns = None
+        self.by_trackee.setdefault(_track_key(track.trackee), deque()).append(track)
+
+    def _insert(self, track):
+        """
+        Put a track that is older than the newest one into the ring buffer
+        in time order. Returns False if the buffer is full of newer tracks.
+        """
+        if len(self.buffer) >= self.maxlen:
+            if track.timestamp < self.buffer[0].timestamp:
+                return False
+            self._evict_oldest()
+        self.buffer.insert(_insert_index(self.buffer, track.timestamp), track)
+        self.columns = None
+        trackee_tracks = self.by_trackee.setdefault(_track_key(track.trackee), deque())
+        trackee_tracks.insert(_insert_index(trackee_tracks, track.timestamp), track)
+        return True
+
+    def _evict_oldest(self):
+        """Remove the oldest track from the buffer and the trackee index."""
+        oldest = self.buffer.popleft()
+        self.columns = None
+        key = _track_key(oldest.trackee)
+        trackee_tracks = self.by_trackee[key]
+        # the oldest track in the room is also the oldest for its trackee
+        trackee_tracks.popleft()
+        if not trackee_tracks:
+            del self.by_trackee[key]
+        return oldest
+
+    def _mark_dirty(self, changes=1):
+        """Count changes and flush once a full batch has built up."""
+        self.dirty += changes
+        if self.dirty >= TRACK_FLUSH_BATCH:
+            self.flush()
+
+    def add(self, trackee, destination, depth, timestamp=None):
+        """Store a new set of tracks and return it.
+        Args:
+            trackee (Object): character or NPC leaving the tracks
+            destination (Object): where the trackee was heading
+            depth (int): how hard the tracks are to read; higher is deeper
+            timestamp (float, optional): defaults to now. Tracks older than
+                the newest one are put in time order; if the buffer is full
+                of newer tracks they are dropped.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        track = Track(timestamp, trackee, destination, depth)
+        if self.buffer and timestamp < self.buffer[-1].timestamp:
+            if not self._insert(track):
+                return track
+            self.age_out(now=self.buffer[-1].timestamp)
+        else:
+            self.age_out(now=timestamp)
+            self._append(track)
+        self._mark_dirty()
+        return track
+
+    def recent(self, limit=None, now=None):
+        """Return tracks newest first, at most `limit` of them."""
+        self.age_out(now=now)
+        if limit is None:
+            return list(reversed(self.buffer))
+        tracks = []
+        for track in reversed(self.buffer):
+            if len(tracks) >= limit:
+                break
+            tracks.append(track)
+        return tracks
+
+    def for_trackee(self, trackee, limit=None, now=None):
+        """Return the tracks of a single trackee newest first."""
+        self.age_out(now=now)
+        trackee_tracks = self.by_trackee.get(_track_key(trackee))
+        if not trackee_tracks:
+            return []
+        if limit is None:
+            return list(reversed(trackee_tracks))
+        return [trackee_tracks[-i] for i in range(1, min(limit, len(trackee_tracks)) + 1)]
+
+    def _columns(self):
+        """Return the timestamps and depths of the buffer as arrays."""
+        if self.columns is None:
+            self.columns = (np.fromiter((track.timestamp for track in self.buffer), \
+                                        dtype=float, count=len(self.buffer)),
+                            np.fromiter((track.depth for track in self.buffer), \
+                                        dtype=float, count=len(self.buffer)))
+        return self.columns
+
+    def readable(self, track_roll, limit=None, trackee=None, now=None):
+        """Return the tracks that can be read with `track_roll`, newest first.
+        Args:
+            track_roll (int): result of the tracker's tracking roll
+            limit (int, optional): return at most this many tracks
+            trackee (Object, optional): only look at this trackee's tracks
+            now (float, optional): defaults to now
+        Returns a list of ReadableTrack. A track is readable if the roll beats
+        its difficulty, which is its depth plus DIFFICULTY_PER_DAY for every
+        game day of age.
+        """
+        if now is None:
+            now = time.time()
+        self.age_out(now=now)
+        if trackee is None:
+            tracks = self.buffer
+            timestamps, depths = self._columns()
+        else:
+            tracks = self.by_trackee.get(_track_key(trackee))
+            if not tracks:
+                return []
+            timestamps = np.fromiter((track.timestamp for track in tracks), \
+                                     dtype=float, count=len(tracks))
+            depths = np.fromiter((track.depth for track in tracks), \
+                                 dtype=float, count=len(tracks))
+        if limit == 0 or not len(tracks):
+            return []
+        ages = (now - timestamps) / SECONDS_PER_GAME_DAY
+        difficulties = depths + ages * DIFFICULTY_PER_DAY
+        # indices of the readable tracks, newest first
+        found = np.flatnonzero(track_roll > difficulties)[::-1]
+        if limit is not None:
+            found = found[:limit]
+        return [ReadableTrack(tracks[i], float(ages[i]), float(difficulties[i])) \
+                for i in found]
+
+    def age_out(self, now=None, max_age=TRACK_MAX_AGE):
+        """Drop tracks older than `max_age` seconds. Returns number dropped."""
+        if now is None:
+            now = time.time()
+        cutoff = now - max_age
+        dropped = 0
+        while self.buffer and self.buffer[0].timestamp < cutoff:
+            self._evict_oldest()
+            dropped += 1
+        if dropped:
+            self._mark_dirty(dropped)
+        return dropped
+
+    def remove_where(self, predicate):
+        """Drop every track for which `predicate(track)` is True.
+        Returns the number of tracks removed.
+        """
+        kept = [track for track in self.buffer if not predicate(track)]
+        if len(kept) == len(self.buffer):
+            return 0
+        return self.replace(kept)
+
+    def replace(self, tracks):
+        """Replace the room's tracks with `tracks`, given oldest first.
+        Used by weather and other effects that rewrite tracks in bulk.
+        Returns the number of tracks removed.
+        """
+        removed = max(0, len(self.buffer) - len(tracks))
+        self.buffer.clear()
+        self.by_trackee.clear()
+        self.columns = None
+        for track in tracks:
+            self._append(track)
+        self._mark_dirty(max(1, removed))
+        return removed
+
+    def clear(self):
+        """Remove all tracks from the room."""
+        self.buffer.clear()
+        self.by_trackee.clear()
+        self.columns = None
+        self.dirty += 1
+        self.flush()
+
+    def flush(self):
+        """Write the ring buffer to the db if anything changed."""
+        if not self.dirty:
+            return
+        self.obj.attributes.add(self.db_attribute, [tuple(track) for track in self.buffer])
+        self.dirty = 0
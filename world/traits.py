@@ -209,6 +209,7 @@ Example:
 from evennia.utils.dbserialize import _SaverDict
 from evennia.utils import logger, lazy_property
 from functools import total_ordering, reduce
+from bisect import bisect_left, insort
 
 TRAIT_TYPES = ('static', 'counter', 'gauge')
 RANGE_TRAITS = ('counter', 'gauge')
@@ -228,13 +229,42 @@ class TraitHandler(object):
     Args:
         obj (Object): parent Object typeclass for this TraitHandler
         db_attribute (str): name of the DB attribute for trait data storage
+    Properties:
+        version (int): in-memory counter that goes up every time a trait is
+            added, removed or has its `base`, `mod`, `current`, `min` or
+            `max` changed. Used by render caches such as the character sheet
+            to tell if anything changed since they last looked.
+    Methods:
+        top(n): the `n` highest scoring traits as (key, score) tuples, where
+            score is `base`+`mod`. Served from a ranking that is kept sorted
+            as traits change rather than sorting every time.
+        apply_current_deltas(deltas): add to the `current` values of several
+            traits with a single save of the db attribute.
+        add_learn(key, amount): add to a trait's learn counter in memory
+        learn_total(key): a trait's saved plus pending learn counter
+        reset_learn(key): zero a trait's learn counter
+        flush_learn(): save every pending learn counter at once
+    Hooks:
+        If the parent object has an `at_trait_changed(handler_name, key)`
+        method, it is called whenever a trait is added, removed or changed,
+        with the handler's db_attribute as the handler name.
     """
     def __init__(self, obj, db_attribute='traits'):
         if not obj.attributes.has(db_attribute):
             obj.attributes.add(db_attribute, {})
 
+        self.obj = obj
+        self.db_attribute = db_attribute
+
         self.attr_dict = obj.attributes.get(db_attribute)
         self.cache = {}
+        self.version = 0
+        # sorted list of (-score, key), built the first time it is needed
+        self.ranking = None
+        # key: score, for every trait in the ranking
+        self.ranked_scores = {}
+        # key: learn counter increments not saved to the db yet
+        self.pending_learn = {}
 
     def __len__(self):
         """Return number of Traits in 'attr_dict'."""
@@ -242,7 +272,8 @@ class TraitHandler(object):
 
     def __setattr__(self, key, value):
         """Returns error message if trait objects are assigned directly."""
-        if key in ('attr_dict', 'cache'):
+        if key in ('obj', 'db_attribute', 'attr_dict', 'cache', 'version', 'ranking', \
+                   'ranked_scores', 'pending_learn'):
             super(TraitHandler, self).__setattr__(key, value)
         else:
             raise TraitException(
@@ -276,9 +307,128 @@ class TraitHandler(object):
             if trait not in self.attr_dict:
                 return None
             data = self.attr_dict[trait]
-            self.cache[trait] = Trait(data)
+            self.cache[trait] = Trait(data, handler=self, key=trait)
         return self.cache[trait]
 
+    def at_trait_changed(self, trait):
+        """Called by a Trait of this handler whenever its values change."""
+        self.version += 1
+        if self.ranking is not None:
+            self._rerank(trait._key)
+        self._notify(trait._key)
+
+    def _notify(self, key):
+        """Calls the parent object's at_trait_changed hook, if it has one."""
+        hook = getattr(self.obj, 'at_trait_changed', None)
+        if hook is not None:
+            hook(self.db_attribute, key)
+
+    def _score(self, key):
+        """Ranking score of a trait."""
+        data = self.attr_dict[key]
+        return data['base'] + data['mod']
+
+    def _build_ranking(self):
+        """Sort all of the traits into the ranking."""
+        self.ranked_scores = {key: self._score(key) for key in self.attr_dict}
+        self.ranking = sorted((-score, key) for key, score in self.ranked_scores.items())
+
+    def _unrank(self, key):
+        """Take a trait out of the ranking."""
+        score = self.ranked_scores.pop(key, None)
+        if score is None:
+            return
+        index = bisect_left(self.ranking, (-score, key))
+        if index < len(self.ranking) and self.ranking[index] == (-score, key):
+            del self.ranking[index]
+
+    def _rerank(self, key):
+        """Move a trait to its new spot in the ranking."""
+        if key is None:
+            return
+        score = self._score(key) if key in self.attr_dict else None
+        if score == self.ranked_scores.get(key):
+            return
+        self._unrank(key)
+        if score is not None:
+            self.ranked_scores[key] = score
+            insort(self.ranking, (-score, key))
+
+    def apply_current_deltas(self, deltas):
+        """
+        Adds to the `current` values of several traits, saving the db
+        attribute once rather than once per trait.
+        Args:
+            deltas (dict): trait key: amount to add to `current`
+        """
+        saver = None
+        for key, delta in deltas.items():
+            trait = self.get(key)
+            if trait is None or not delta or trait._type not in RANGE_TRAITS:
+                continue
+            # python float, the current setter ignores numpy numbers
+            value = float(trait._enforce_bounds(trait.current + delta))
+            if isinstance(trait._data, _SaverDict):
+                # write past the saver dict, the whole tree is saved below
+                trait._data._data['current'] = value
+                saver = trait._data
+            else:
+                trait._data['current'] = value
+            trait._changed()
+        if saver is not None:
+            saver._save_tree()
+
+    def add_learn(self, key, amount=1):
+        """
+        Adds to a trait's learn counter. The increments are held in memory
+        until flush_learn is called, so a round full of critical rolls does
+        not save the db attribute for every one of them.
+        """
+        self.pending_learn[key] = self.pending_learn.get(key, 0) + amount
+
+    def learn_total(self, key):
+        """Returns a trait's learn counter, including any pending increments."""
+        data = self.attr_dict.get(key)
+        if data is None:
+            return 0
+        return data['extra'].get('learn', 0) + self.pending_learn.get(key, 0)
+
+    def reset_learn(self, key):
+        """Zeroes a trait's learn counter, dropping any pending increments."""
+        self.pending_learn.pop(key, None)
+        trait = self.get(key)
+        if trait is not None:
+            trait.learn = 0
+
+    def flush_learn(self):
+        """Saves every pending learn counter increment in one write."""
+        pending = self.pending_learn
+        if not pending:
+            return
+        self.pending_learn = {}
+        saver = None
+        for key, amount in pending.items():
+            data = self.attr_dict.get(key)
+            if data is None:
+                continue
+            extra = data['extra']
+            learn = extra.get('learn', 0) + amount
+            if isinstance(extra, _SaverDict):
+                # write past the saver dict, the whole tree is saved below
+                extra._data['learn'] = learn
+                saver = extra
+            else:
+                extra['learn'] = learn
+        if saver is not None:
+            saver._save_tree()
+
+    def top(self, n=None):
+        """Return the `n` highest scoring traits as (key, score) tuples."""
+        if self.ranking is None:
+            self._build_ranking()
+        ranking = self.ranking if n is None else self.ranking[:n]
+        return [(key, -neg_score) for neg_score, key in ranking]
+
     def add(self, key, name, type='static',
             base=0, mod=0, min=None, max=None,
             extra={}):
@@ -298,6 +448,10 @@ class TraitHandler(object):
                 trait.update(dict(max=max))
 
             self.attr_dict[key] = trait
+            self.version += 1
+            if self.ranking is not None:
+                self._rerank(key)
+            self._notify(key)
         else:
             raise TraitException("Invalid trait type specified.")
 
@@ -309,6 +463,10 @@ class TraitHandler(object):
         if trait in self.cache:
             del self.cache[trait]
         del self.attr_dict[trait]
+        self.version += 1
+        if self.ranking is not None:
+            self._unrank(trait)
+        self._notify(trait)
 
     def clear(self):
         """Remove all Traits from the handler's parent object."""
@@ -323,16 +481,20 @@ class TraitHandler(object):
     @property
     def all_dict(self):
         """Return a dict of all traits in this TraitHandler."""
-        return {k: v for k, v in sorted(self.attr_dict.items(), key=lambda item: (item[1]['base'] + item[1]['mod']), reverse=True)}
+        return {key: self.attr_dict[key] for key, score in self.top()}
 
 
 @total_ordering
 class Trait(object):
     """Represents an object or Character trait.
+    Args:
+        data (dict): the trait's persistent data
+        handler (TraitHandler, optional): handler to tell about changes
+        key (str, optional): key of the trait in its handler
     Note:
         See module docstring for configuration details.
     """
-    def __init__(self, data):
+    def __init__(self, data, handler=None, key=None):
         if not 'name' in data:
             raise TraitException(
                 "Required key not found in trait data: 'name'")
@@ -352,6 +514,8 @@ class Trait(object):
             data['max'] = 'base' if self._type == 'gauge' else None
 
         self._data = data
+        self._handler = handler
+        self._key = key
         self._keys = ('name', 'type', 'base', 'mod',
                       'current', 'min', 'max', 'extra')
         self._locked = True
@@ -557,6 +721,7 @@ class Trait(object):
             self._data['base'] = amount
         if type(amount) in (int, float):
             self._data['base'] = self._enforce_bounds(amount)
+        self._changed()
 
     @property
     def mod(self):
@@ -575,6 +740,7 @@ class Trait(object):
                 else:
                     # but not decreases, unless current goes out of range
                     self.current = self._enforce_bounds(self.current)
+            self._changed()
 
     @property
     def min(self):
@@ -591,6 +757,7 @@ class Trait(object):
             if amount is None: self._data['min'] = amount
             elif type(amount) in (int, float):
                 self._data['min'] = amount if amount < self.base else self.base
+            self._changed()
         else:
             raise AttributeError(
                 "static 'Trait' object has no attribute 'min'.")
@@ -619,6 +786,7 @@ class Trait(object):
                 self._data['max'] = value
             elif type(value) in (int, float):
                 self._data['max'] = value if value > self.base else self.base
+            self._changed()
         else:
             raise AttributeError(
                 "static 'Trait' object has no attribute 'max'.")
@@ -636,6 +804,7 @@ class Trait(object):
         if self._type in RANGE_TRAITS:
             if type(value) in (int, float):
                 self._data['current'] = self._enforce_bounds(value)
+                self._changed()
         else:
             raise AttributeError(
                 "'current' property is read-only on static 'Trait'.")
@@ -723,6 +892,11 @@ class Trait(object):
 
     # Private members
 
+    def _changed(self):
+        """Tell the handler that this trait's values changed."""
+        if self._handler is not None:
+            self._handler.at_trait_changed(self)
+
     def _mod_base(self):
         return self._enforce_bounds(self.mod + self.base)
 
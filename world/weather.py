@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Weather rules for DOG.
+
+Weather is handled per zone rather than per room. Each zone with weather has
+a single MovingSpotlightTickZone script (see typeclasses.moving_spotlight)
+that picks the zone's weather on every heartbeat tick and then applies the
+environmental effects of that weather to every room in the zone in one pass.
+We expect thousands of rooms, so there are no per-room weather timers.
+
+Rooms are found by zone through a tag in the 'zone' category. Use
+`Room.set_zone()` to move a room into a zone so that the tag and the room's
+`db.info['Zone']` stay in sync.
+
+Current effects:
+- Track decay - Weather washes out tracks. Outdoor rooms, rugged terrain and
+                older tracks are hit the hardest. Tracks that survive are
+                weathered and get harder to read.
+"""
+import time
+import numpy as np
+from evennia import search_tag
+from evennia.utils.logger import log_file
+from world.tracks import Track, SECONDS_PER_GAME_DAY
+
+# tag category used to index rooms by zone
+ZONE_TAG_CATEGORY = 'zone'
+
+# weather types, the chance per tick that they wash out a fresh outdoor track
+# and how much harder they make the tracks they don't wash out to read
+_WEATHER_DATA = {
+    'clear': {'track_decay': 0.0, 'track_weathering': 0},
+    'overcast': {'track_decay': 0.001, 'track_weathering': 0},
+    'windy': {'track_decay': 0.005, 'track_weathering': 0.2},
+    'rain': {'track_decay': 0.02, 'track_weathering': 0.5},
+    'snow': {'track_decay': 0.015, 'track_weathering': 0.5},
+    'heavy rain': {'track_decay': 0.05, 'track_weathering': 1},
+    'storm': {'track_decay': 0.1, 'track_weathering': 2},
+}
+
+# chance of the weather changing to each other type of weather on a tick
+_WEATHER_TRANSITIONS = {
+    'clear': {'clear': 80, 'overcast': 15, 'windy': 5},
+    'overcast': {'clear': 20, 'overcast': 55, 'windy': 10, 'rain': 10, 'snow': 5},
+    'windy': {'clear': 20, 'overcast': 20, 'windy': 50, 'rain': 5, 'storm': 5},
+    'rain': {'overcast': 25, 'rain': 55, 'heavy rain': 15, 'storm': 5},
+    'snow': {'overcast': 30, 'snow': 70},
+    'heavy rain': {'rain': 40, 'heavy rain': 45, 'storm': 15},
+    'storm': {'heavy rain': 40, 'rain': 20, 'storm': 40},
+}
+
+# indoor rooms are mostly sheltered from the weather
+INDOOR_EXPOSURE = 0.1
+
+
+def next_weather(current, rng=None):
+    """
+    Returns the weather for the next tick given the current weather.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    transitions = _WEATHER_TRANSITIONS.get(current, _WEATHER_TRANSITIONS['clear'])
+    choices = list(transitions.keys())
+    weights = np.array(list(transitions.values()), dtype=float)
+    return str(rng.choice(choices, p=weights / weights.sum()))
+
+
+def zone_rooms(zone):
+    """
+    Returns all of the rooms tagged as part of a zone.
+    """
+    return search_tag(zone, category=ZONE_TAG_CATEGORY)
+
+
+def apply_weather_to_rooms(rooms, weather, now=None, rng=None):
+    """
+    Applies the environmental effects of the weather to a batch of rooms. All
+    tracks in all of the rooms are decayed together as one set of arrays.
+
+    Returns the number of tracks washed out.
+    """
+    weather_data = _WEATHER_DATA.get(weather)
+    if not weather_data or not weather_data['track_decay']:
+        return 0
+    if now is None:
+        now = time.time()
+    if rng is None:
+        rng = np.random.default_rng()
+    # gather the tracks of every room into flat lists
+    rooms_with_tracks = []
+    room_index = []
+    timestamps = []
+    depths = []
+    exposure = []
+    ruggedness = []
+    for room in rooms:
+        tracks = getattr(room, 'tracks', None)
+        if not tracks:
+            continue
+        idx = len(rooms_with_tracks)
+        rooms_with_tracks.append(room)
+        info = room.db.info or {}
+        exposure.append(1.0 if info.get('Outdoor Room', True) else INDOOR_EXPOSURE)
+        ruggedness.append(room.traits.rot.actual if room.traits.rot is not None else 0)
+        for track in tracks:
+            room_index.append(idx)
+            timestamps.append(track.timestamp)
+            depths.append(track.depth)
+    if not room_index:
+        return 0
+    room_index = np.array(room_index)
+    depths = np.array(depths, dtype=float)
+    # age of each track in game days
+    ages = (now - np.array(timestamps, dtype=float)) / SECONDS_PER_GAME_DAY
+    # per track exposure to the weather from the room it is in
+    track_exposure = np.array(exposure)[room_index] * (1 + np.array(ruggedness)[room_index])
+    decay_chance = np.clip(weather_data['track_decay'] * track_exposure * (1 + ages), 0, 1)
+    washed_out = rng.random(len(decay_chance)) < decay_chance
+    new_depths = np.round(depths + weather_data['track_weathering'] * track_exposure, 1)
+    # write the results back one room at a time
+    total_removed = 0
+    start = 0
+    for room in rooms_with_tracks:
+        end = start + len(room.tracks)
+        if weather_data['track_weathering'] or washed_out[start:end].any():
+            kept = [Track(track.timestamp, track.trackee, track.destination, \
+                          float(new_depths[i]))
+                    for i, track in enumerate(room.tracks, start) if not washed_out[i]]
+            total_removed += room.tracks.replace(kept)
+        start = end
+    return total_removed
+
+
+def do_zone_weather_tick(zone, weather, now=None, rng=None):
+    """
+    Applies the weather to every room in the zone. Called by the zone's
+    heartbeat script.
+    """
+    rooms = zone_rooms(zone)
+    removed = apply_weather_to_rooms(rooms, weather, now=now, rng=rng)
+    log_file(f"Zone: {zone} Weather: {weather} Rooms: {len(rooms)} Tracks washed out: {removed}", \
+             filename='weather.log')
+    return removed